@@ -1,8 +1,11 @@
 import flet as ft
 from ui.main_page import create_main_page_content
-from ui.view_page import create_view_page_content, process_on_tab_change
-from ui.auto_page import create_auto_page_content
-from ui.state.app_state import AppState
+from ui.state.app_state import AppState, STORAGE_ROOT
+from core.warmup import HEAVY_MODULES, start_warmup
+
+# cv2, scipy и страница выравнивания не импортируются при запуске: они нужны
+# только после загрузки изображения и подгружаются в фоне (см. core/warmup.py)
+WARMUP_MODULES = HEAVY_MODULES + ("ui.view_page",)
 
 def main(page: ft.Page):
     # Настройка страницы
@@ -17,8 +20,11 @@ def main(page: ft.Page):
     image_stack_left = ft.Stack([ft.Image()], height=STACK_IMAGE_HEIGHT)
     image_stack_right = ft.Stack([ft.Image()], height=STACK_IMAGE_HEIGHT)
     
-    # Инициализируем состояние
-    state = AppState()
+    # Инициализируем состояние: у каждой сессии свое состояние и свой каталог в storage/
+    state = AppState(session_id=page.session_id)
+    
+    # При закрытии сессии освобождаем ее память и удаляем каталог сессии
+    page.on_close = lambda _: state.release()
     
     # Создаем контейнеры для содержимого режимов
     input_container = ft.Container(expand=True)
@@ -47,7 +53,7 @@ def main(page: ft.Page):
                 page.update()
                 return
             
-            if not state.check_points():
+            if not state.can_align():
                 e.control.selected_index = 0
                 dialog = ft.AlertDialog(
                     title=ft.Text("Недостаточно точек"),
@@ -61,7 +67,25 @@ def main(page: ft.Page):
                 page.open(dialog)
                 page.update()
                 return
-    
+
+            # Быстрая проверка сетки выбранной модели до полного преобразования
+            issues = state.mesh_issues()
+            if issues:
+                e.control.selected_index = 0
+                dialog = ft.AlertDialog(
+                    title=ft.Text("Некорректная разметка"),
+                    content=ft.Text("\n".join(issues)),
+                    actions=[
+                        ft.TextButton("OK", on_click=lambda _: page.close(dialog))
+                    ],
+                    actions_alignment=ft.MainAxisAlignment.END
+                )
+                page.open(dialog)
+                page.update()
+                return
+
+            from ui.view_page import process_on_tab_change
+            ensure_view_content()
             input_container.visible = False
             view_container.visible = True
             process_on_tab_change(page, image_stack_left, image_stack_right, state) # TODO
@@ -83,6 +107,7 @@ def main(page: ft.Page):
                 input_container.visible = False
                 view_container.visible = True
         else:  # Выбран режим "Auto"
+            ensure_auto_content()
             auto_container.visible = True
             input_container.visible = False
             view_container.visible = False
@@ -111,15 +136,18 @@ def main(page: ft.Page):
         on_change=switch_hand_auto_mode
     )
     
-    # Создаем содержимое для всех режимов
-    editor_content = create_main_page_content(page, state)
-    view_content = create_view_page_content(page, image_stack_left, image_stack_right, state)
-    auto_content = create_auto_page_content(page)
+    # Сразу создается только страница ввода границ, остальные - при первом переходе
+    input_container.content = create_main_page_content(page, state)
     
-    # Помещаем содержимое в контейнеры
-    input_container.content = editor_content
-    view_container.content = view_content
-    auto_container.content = auto_content
+    def ensure_view_content():
+        if view_container.content is None:
+            from ui.view_page import create_view_page_content
+            view_container.content = create_view_page_content(page, image_stack_left, image_stack_right, state)
+    
+    def ensure_auto_content():
+        if auto_container.content is None:
+            from ui.auto_page import create_auto_page_content
+            auto_container.content = create_auto_page_content(page)
     
     # Создаем верхний ряд с переключателем режимов слева
     top_row = ft.Row([
@@ -140,6 +168,9 @@ def main(page: ft.Page):
     
     # Устанавливаем основной макет на страницу
     page.add(main_layout)
+    
+    # Пока пользователь выбирает файл, тяжелые модули импортируются в фоне
+    start_warmup(WARMUP_MODULES)
 
 if __name__ == "__main__":
-    ft.app(target=main)
\ No newline at end of file
+    ft.app(target=main, upload_dir=STORAGE_ROOT)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Генератор обучающих данных: изгиб плоских страниц случайными границами.
+
+Каждое изображение - случайная плоская страница из --input (или одна из
+--bases страниц, нарисованных synthesis.render_text_page), изогнутая по
+случайным границам обращением отображения Кунса на грубой решетке. Изгиб
+выполняется в пуле потоков (core.workers), все случайные величины зависят
+только от --seed и номера изображения. Выводится скорость в изображениях
+в минуту.
+
+Файлы изображения N в выходном каталоге (если задан --out):
+    aug_NNNNNN.png   - изогнутое изображение
+    aug_NNNNNN.json  - разметка границ в формате points.json
+
+Запуск:
+    python -m benchmarks.augment --count 2000 --workers 4 --size 800x1000
+    python -m benchmarks.augment --input flat_pages --out augmented --count 10000
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import cv2
+import numpy as np
+from core.synthesis import render_text_page, iter_curved_pages
+from core.image_io import write_image
+from core.workers import BoundedExecutor
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+
+def load_flats(input_dir, bases, width, height, seed=0):
+    """
+    Плоские страницы: изображения из input_dir или bases нарисованных страниц.
+
+    Returns:
+        flats: Список изображений
+    """
+    if input_dir:
+        # Расширение сравнивается без учета регистра: сканы часто называются *.PNG, *.JPG
+        paths = sorted(path for path in glob.glob(os.path.join(input_dir, "*"))
+                       if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+        if not paths:
+            raise FileNotFoundError(f"В каталоге {input_dir} нет изображений")
+        flats = []
+        for path in paths:
+            image = cv2.imread(path)
+            if image is None:
+                raise ValueError(f"Не удалось прочитать изображение: {path}")
+            flats.append(image)
+        return flats
+    rng = np.random.default_rng(seed)
+    return [render_text_page(rng, width, height) for _ in range(bases)]
+
+
+def run(flats, count, workers, seed=0, size=None, out_dir=None):
+    """
+    Генерирует count изображений и, если задан out_dir, записывает их.
+
+    Returns:
+        report: Словарь с результатами бенчмарка
+    """
+    from ui.utils.file_utils import save_points_to_json
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    executor = BoundedExecutor(workers)
+    start = time.perf_counter()
+    try:
+        for index, warped, edges in iter_curved_pages(flats, count, seed, size, executor):
+            if out_dir:
+                image_path = os.path.join(out_dir, f"aug_{index:06d}.png")
+                write_image(image_path, warped, png_compression=1)
+                save_points_to_json(edges, image_path, image_path[:-4] + ".json")
+    finally:
+        executor.shutdown()
+    elapsed = time.perf_counter() - start
+    return {
+        "count": count,
+        "workers": workers,
+        "flats": len(flats),
+        "elapsed_s": elapsed,
+        "images_per_minute": count / elapsed * 60 if elapsed > 0 else float("inf"),
+        "written": bool(out_dir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=None, help="Каталог плоских страниц")
+    parser.add_argument("--bases", type=int, default=8, help="Количество рисуемых страниц, если --input не задан")
+    parser.add_argument("--out", default=None, help="Выходной каталог (без него изображения только генерируются)")
+    parser.add_argument("--count", type=int, default=1000, help="Количество изображений")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Количество потоков")
+    parser.add_argument("--size", default=None, help="Размер изображений ШxВ (по умолчанию 800x1000, для --input - размер страницы)")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--json", default=None, help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+    size = tuple(map(int, args.size.lower().split("x"))) if args.size else None
+
+    flats = load_flats(args.input, args.bases, *(size or (800, 1000)), args.seed)
+    report = run(flats, max(1, args.count), max(1, args.workers), args.seed, size, args.out)
+    print(f"Изображений: {report['count']} за {report['elapsed_s']:.1f} с, "
+          f"{report['images_per_minute']:.0f} в минуту ({report['workers']} потоков)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
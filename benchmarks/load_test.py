@@ -0,0 +1,167 @@
+"""
+Нагрузочный тест многопользовательского режима.
+
+Моделирует N одновременных сессий: у каждой свое состояние AppState и свой
+каталог в storage/, выравнивание выполняется в общем ограниченном пуле.
+Выравнивание идет тем же путем, что и на вкладке "Выравнивание": граф этапов
+с бюджетом памяти сессии (высота полос подбирается по memory_limit), превью
+для интерфейса и общее для всех сессий хранилище результатов.
+
+Изоляция сессий: сессии получают только --inputs разных входов, поэтому
+одинаковые изображения и разметка обрабатываются несколькими сессиями
+одновременно, а в следующих циклах берутся из общего хранилища. Результат
+каждой сессии сравнивается с эталоном, вычисленным заранее одной сессией без
+хранилища: чужой результат из хранилища или перезаписанный другой сессией
+вход дают ошибку. Выводятся пропускная способность и задержки.
+
+Запуск:
+    python -m benchmarks.load_test --users 16 --rounds 3 --size 1600x1200
+    python -m benchmarks.load_test --users 16 --inputs 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from core.image_io import write_image
+from core.pipeline import build_alignment_graph
+from core.result_store import get_result_store
+from core.workers import get_shared_executor, WORKERS_ENV
+from ui.state.app_state import AppState
+
+# Высота превью, как у панелей вкладки "Выравнивание"
+DISPLAY_HEIGHT = 600
+
+
+def make_session_input(seed, width, height):
+    """Создает изображение и случайную разметку для одной сессии"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    margin = 0.05
+    x0, x1 = width * margin, width * (1 - margin)
+    y0, y1 = height * margin, height * (1 - margin)
+    bend = rng.uniform(-0.03, 0.03) * height
+    xs = np.linspace(x0, x1, 5)
+    ys = np.linspace(y1, y0, 5)
+    arc = np.sin(np.linspace(0, np.pi, 5)) * bend
+    edges = {
+        "edge_top": [(int(x), int(y0 + a)) for x, a in zip(xs, arc)],
+        "edge_bottom": [(int(x), int(y1 + a)) for x, a in zip(xs, arc)],
+        "edge_left": [(int(x0), int(y)) for y in ys[1:-1]],
+        "edge_right": [(int(x1), int(y)) for y in ys[1:-1]],
+    }
+    return image, edges
+
+
+def input_seed(index, round_index, inputs):
+    """
+    Зерно входа сессии index в цикле round_index.
+
+    Сессии index и index + inputs получают один вход одновременно, а в
+    следующих циклах - входы, уже обработанные соседними сессиями (результат
+    берется из общего хранилища).
+    """
+    return (index + round_index) % inputs
+
+
+def compute_references(args, memory_limit):
+    """
+    Эталонные результаты всех входов, вычисленные последовательно одной сессией без хранилища.
+
+    Returns:
+        references: Словарь зерно входа -> результат
+    """
+    graph = build_alignment_graph(memory_budget=memory_limit)
+    references = {}
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp_dir:
+        input_path = os.path.join(tmp_dir, "input.png")
+        for seed in range(args.inputs):
+            image, edges = make_session_input(seed, args.width, args.height)
+            write_image(input_path, image)
+            references[seed] = graph.run({"image_path": input_path, "edge_points": edges},
+                                         targets=["result"])["result"]
+    return references
+
+
+def run_session(index, args, store, references, latencies, errors):
+    """Один пользователь: несколько циклов загрузка -> выравнивание со сравнением с эталоном"""
+    state = AppState(session_id=f"load-test-{index}")
+    # Как в ui/view_page.py: полосы по бюджету сессии, выравнивание в общем пуле,
+    # общее хранилище результатов
+    graph = build_alignment_graph(
+        display_height=DISPLAY_HEIGHT,
+        memory_budget=state.memory_limit,
+        warp_executor=get_shared_executor(),
+        warp_timeout=60,
+        store=store,
+    )
+    try:
+        for round_index in range(args.rounds):
+            seed = input_seed(index, round_index, args.inputs)
+            image, edges = make_session_input(seed, args.width, args.height)
+            input_path = os.path.join(state.storage_dir, "input.png")
+            write_image(input_path, image)
+
+            start = time.perf_counter()
+            result = graph.run({"image_path": input_path, "edge_points": edges})["result"]
+            latencies.append(time.perf_counter() - start)
+
+            # Изоляция: результат должен совпадать с эталоном своего входа
+            if not np.array_equal(result, references[seed]):
+                errors.append(f"сессия {index}, цикл {round_index}: результат не совпадает с эталоном "
+                              f"(чужой результат из хранилища или вход другой сессии)")
+    except Exception as ex:
+        errors.append(f"сессия {index}: {ex!r}")
+    finally:
+        state.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="Количество одновременных сессий")
+    parser.add_argument("--rounds", type=int, default=2, help="Количество выравниваний на сессию")
+    parser.add_argument("--size", default="1600x1200", help="Размер изображения ШxВ")
+    parser.add_argument("--inputs", type=int, default=None,
+                        help="Количество разных входов (по умолчанию половина сессий)")
+    parser.add_argument("--workers", type=int, default=None, help="Размер общего пула")
+    args = parser.parse_args()
+    args.width, args.height = map(int, args.size.lower().split("x"))
+    args.inputs = max(1, min(args.inputs or args.users // 2, args.users))
+
+    if args.workers is not None:
+        os.environ[WORKERS_ENV] = str(args.workers)
+
+    references = compute_references(args, AppState(session_id="load-test-reference").memory_limit)
+
+    latencies = []
+    errors = []
+    with tempfile.TemporaryDirectory(prefix="load-test-store-") as store_dir:
+        store = get_result_store(store_dir)
+        threads = [
+            threading.Thread(target=run_session, args=(i, args, store, references, latencies, errors))
+            for i in range(args.users)
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        # Результаты записываются в хранилище в фоне; каталог удаляется после записи
+        store.flush()
+
+    total = len(latencies)
+    print(f"Сессий: {args.users}, выравниваний: {total}, пул: {get_shared_executor().max_workers} потоков")
+    print(f"Время: {elapsed:.2f} с, пропускная способность: {total / elapsed:.2f} изобр./с")
+    if latencies:
+        print(f"Задержка p50: {np.percentile(latencies, 50) * 1000:.0f} мс, "
+              f"p99: {np.percentile(latencies, 99) * 1000:.0f} мс")
+    for error in errors:
+        print(f" !! {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+"""
+Масштабирование выравнивания по числу процессов (core.shared_arrays).
+
+Страницы синтетического корпуса загружаются в память заранее, после чего
+каждая выравнивается на пуле DewarpProcessPool из N процессов (полосы одной
+страницы обрабатываются параллельно через разделяемую память). Для каждого N
+выводятся пропускная способность, ускорение и эффективность относительно
+выравнивания в одном процессе (dewarp_image / dewarp_for_ocr). Результаты пула
+сверяются с однопроцессными побайтно.
+
+Если корпус не задан, он генерируется во временный каталог с тем же зерном,
+поэтому запуски с одинаковыми параметрами сравнимы.
+
+Запуск:
+    python -m benchmarks.process_scaling --count 8 --size 2400x3200 --processes 1,2,4,8
+    python -m benchmarks.process_scaling --corpus corpus --mode binary --json scaling.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import cv2
+from core.grid_utils import build_fast_mesh_function, preprocess_edges, dewarp_image
+from core.ocr_output import dewarp_for_ocr
+from core.shared_arrays import DewarpProcessPool
+from ui.utils.file_utils import load_points_from_json
+from benchmarks.synthetic_corpus import generate_corpus
+from benchmarks.throughput import find_pages
+
+
+def load_pages(pages):
+    """Загружает изображения и предобработанную разметку страниц"""
+    loaded = []
+    for image_path, points_path, _ in pages:
+        image = cv2.imread(image_path)
+        edges = preprocess_edges(**load_points_from_json(points_path)["points"])
+        loaded.append((image, edges))
+    return loaded
+
+
+def run_single(pages, mode):
+    """
+    Выравнивает страницы в текущем процессе.
+
+    Returns:
+        elapsed, results: Время в секундах и результаты для сверки
+    """
+    results = []
+    start = time.perf_counter()
+    for image, edges in pages:
+        mesh_func = build_fast_mesh_function(*edges)
+        if mode == "color":
+            results.append(dewarp_image(image, mesh_func))
+        else:
+            results.append(dewarp_for_ocr(image, mesh_func, mode=mode))
+    return time.perf_counter() - start, results
+
+
+def run_pool(pages, processes, mode, references):
+    """
+    Выравнивает страницы на пуле из processes процессов.
+
+    Returns:
+        elapsed, mismatches: Время в секундах (без запуска пула) и число
+            страниц, отличающихся от однопроцессного результата
+    """
+    with DewarpProcessPool(processes) as pool:
+        mismatches = 0
+        start = time.perf_counter()
+        for (image, edges), reference in zip(pages, references):
+            result = pool.dewarp(image, edges, mesh_func=build_fast_mesh_function(*edges), mode=mode)
+            mismatches += not np.array_equal(result, reference)
+        return time.perf_counter() - start, mismatches
+
+
+def run(pages, process_counts, mode="color"):
+    """
+    Сравнивает выравнивание в одном процессе с пулами разного размера.
+
+    Returns:
+        report: Словарь с результатами бенчмарка
+    """
+    # Прогрев: первый вызов OpenCV не должен попадать в замер однопроцессного варианта
+    run_single(pages[:1], mode)
+    baseline, references = run_single(pages, mode)
+    rows = []
+    for processes in process_counts:
+        elapsed, mismatches = run_pool(pages, processes, mode, references)
+        speedup = baseline / elapsed
+        rows.append({
+            "processes": processes,
+            "elapsed_s": elapsed,
+            "pages_per_s": len(pages) / elapsed,
+            "speedup": speedup,
+            "efficiency": speedup / processes,
+            "mismatches": mismatches,
+        })
+    return {
+        "pages": len(pages),
+        "mode": mode,
+        "cpus": os.cpu_count(),
+        "single_elapsed_s": baseline,
+        "single_pages_per_s": len(pages) / baseline,
+        "pools": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=None, help="Каталог готового корпуса (по умолчанию - сгенерировать)")
+    parser.add_argument("--count", type=int, default=6, help="Количество страниц генерируемого корпуса")
+    parser.add_argument("--size", default="2400x3200", help="Размер страницы ШxВ генерируемого корпуса")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора корпуса")
+    parser.add_argument("--processes", default=None,
+                        help="Размеры пула через запятую (по умолчанию 1, 2, 4... до числа CPU)")
+    parser.add_argument("--mode", default="color", choices=["color", "gray", "binary"],
+                        help="Режим результата (gray/binary - подготовка для OCR)")
+    parser.add_argument("--json", default=None, help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+    if args.processes:
+        process_counts = [max(1, int(n)) for n in args.processes.split(",")]
+    else:
+        cpus = os.cpu_count() or 1
+        process_counts = [1 << i for i in range(cpus.bit_length()) if 1 << i < cpus] + [cpus]
+
+    with tempfile.TemporaryDirectory(prefix="corpus-") as tmp_dir:
+        if args.corpus:
+            pages = find_pages(args.corpus)
+        else:
+            width, height = map(int, args.size.lower().split("x"))
+            pages = generate_corpus(tmp_dir, args.count, width, height, args.seed)
+        if not pages:
+            print(f"Страницы не найдены: {args.corpus}")
+            return 1
+        report = run(load_pages(pages), process_counts, args.mode)
+
+    print(f"Страниц: {report['pages']}, режим: {report['mode']}, CPU: {report['cpus']}")
+    print(f"Один процесс: {report['single_pages_per_s']:.2f} стр./с")
+    print(f"{'процессов':>10} {'стр./с':>8} {'ускорение':>10} {'эффективность':>14} {'расхождений':>12}")
+    for row in report["pools"]:
+        print(f"{row['processes']:>10} {row['pages_per_s']:>8.2f} {row['speedup']:>9.2f}x "
+              f"{row['efficiency']:>13.0%} {row['mismatches']:>12}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if all(row["mismatches"] == 0 for row in report["pools"]) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
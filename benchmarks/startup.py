@@ -0,0 +1,92 @@
+"""
+Замер времени запуска приложения.
+
+В отдельном процессе измеряется время импорта app.py (до появления первого
+окна) и проверяется, что тяжелые модули (cv2, scipy, NumPy, ядро выравнивания)
+при этом не импортированы. Затем измеряется время фонового прогрева
+(core/warmup.py). Если медиана времени запуска превышает бюджет или тяжелые
+модули импортируются при запуске, код возврата - 1.
+
+Запуск:
+    python -m benchmarks.startup --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+
+# Код, выполняемый в чистом процессе: импорт app, затем прогрев
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+startup = time.perf_counter() - start
+loaded = [name for name in app.WARMUP_MODULES if name in sys.modules]
+from core.warmup import warm_up
+start = time.perf_counter()
+warm_up(app.WARMUP_MODULES)
+warmup = time.perf_counter() - start
+print(json.dumps({"startup_s": startup, "warmup_s": warmup, "loaded": loaded}))
+"""
+
+
+def measure_once():
+    """Один запуск в отдельном процессе, чтобы кэш модулей был пуст"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=root, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    """
+    Выполняет runs замеров.
+
+    Returns:
+        report: Словарь с результатами бенчмарка
+    """
+    samples = [measure_once() for _ in range(runs)]
+    startup = np.array([sample["startup_s"] for sample in samples]) * 1000
+    warmup = np.array([sample["warmup_s"] for sample in samples]) * 1000
+    loaded = sorted({name for sample in samples for name in sample["loaded"]})
+    return {
+        "runs": runs,
+        "startup_p50_ms": float(np.median(startup)),
+        "startup_max_ms": float(startup.max()),
+        "warmup_p50_ms": float(np.median(warmup)),
+        "heavy_modules_at_startup": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Количество запусков")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Бюджет времени запуска (медиана), мс")
+    parser.add_argument("--json", default=None, help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+
+    report = run(max(1, args.runs))
+    report["budget_ms"] = args.budget_ms
+    print(f"Запуск (импорт app): p50 {report['startup_p50_ms']:.0f} мс, макс. {report['startup_max_ms']:.0f} мс, "
+          f"бюджет {args.budget_ms:.0f} мс")
+    print(f"Фоновый прогрев: p50 {report['warmup_p50_ms']:.0f} мс")
+
+    ok = True
+    if report["heavy_modules_at_startup"]:
+        print("Тяжелые модули импортируются при запуске: " + ", ".join(report["heavy_modules_at_startup"]))
+        ok = False
+    if report["startup_p50_ms"] > args.budget_ms:
+        print("Бюджет времени запуска превышен")
+        ok = False
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
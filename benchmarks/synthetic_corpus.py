@@ -0,0 +1,80 @@
+"""
+Генератор синтетического корпуса изогнутых страниц.
+
+Для каждой страницы рисуется плоский текст (OpenCV), случайные изогнутые
+границы и изогнутое изображение, полученное обратным отображением Кунса.
+Рядом сохраняются разметка в формате points.json редактора и плоская
+страница - эталон для оценки точности выравнивания. Все случайные величины
+зависят только от --seed и номера страницы, поэтому корпус воспроизводим.
+
+Файлы страницы N в выходном каталоге:
+    page_NNNN.png       - изогнутое изображение (вход конвейера)
+    page_NNNN.json      - разметка границ
+    page_NNNN_flat.png  - эталонная плоская страница
+
+Запуск:
+    python -m benchmarks.synthetic_corpus --out corpus --count 50 --size 1200x1600 --seed 0
+"""
+import argparse
+import os
+import numpy as np
+from core.synthesis import render_text_page, random_edges, warp_page
+from core.image_io import write_image
+from ui.utils.file_utils import save_points_to_json
+
+
+def generate_page(seed, index, width, height):
+    """
+    Генерирует одну страницу корпуса.
+
+    Returns:
+        flat, warped, edges: Эталонная страница, изогнутое изображение и разметка
+    """
+    rng = np.random.default_rng([seed, index])
+    flat = render_text_page(rng, width, height)
+    edges = random_edges(rng, width, height)
+    warped = warp_page(flat, edges)
+    return flat, warped, edges
+
+
+def page_paths(out_dir, index):
+    """Пути к изображению, разметке и эталону страницы"""
+    base = os.path.join(out_dir, f"page_{index:04d}")
+    return base + ".png", base + ".json", base + "_flat.png"
+
+
+def generate_corpus(out_dir, count, width, height, seed=0):
+    """
+    Записывает корпус из count страниц в out_dir.
+
+    Returns:
+        pages: Список кортежей путей (изображение, разметка, эталон)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    pages = []
+    for index in range(count):
+        image_path, points_path, flat_path = page_paths(out_dir, index)
+        flat, warped, edges = generate_page(seed, index, width, height)
+        write_image(image_path, warped, png_compression=1)
+        write_image(flat_path, flat, png_compression=1)
+        save_points_to_json(edges, image_path, points_path)
+        pages.append((image_path, points_path, flat_path))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="corpus", help="Выходной каталог")
+    parser.add_argument("--count", type=int, default=20, help="Количество страниц")
+    parser.add_argument("--size", default="1200x1600", help="Размер страницы ШxВ")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    args = parser.parse_args()
+    width, height = map(int, args.size.lower().split("x"))
+
+    pages = generate_corpus(args.out, args.count, width, height, args.seed)
+    print(f"Создано страниц: {len(pages)} в {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,223 @@
+"""
+Сквозной бенчмарк конвейера выравнивания на синтетическом корпусе.
+
+Для каждой страницы выполняется полный путь загрузка -> меш -> remap ->
+кодирование и измеряется время каждого этапа. Результат выравнивания
+сравнивается с эталонной плоской страницей. Выводятся пропускная способность,
+задержки p50/p99, пиковое потребление памяти (RSS) и точность (MAE, PSNR).
+
+Если корпус не задан, он генерируется во временный каталог с тем же зерном,
+поэтому запуски с одинаковыми параметрами сравнимы. Генерация выполняется в
+отдельном процессе, чтобы ее память не входила в пиковый RSS бенчмарка.
+
+Запуск:
+    python -m benchmarks.throughput --count 20 --size 1200x1600 --seed 0 --workers 4
+    python -m benchmarks.throughput --corpus corpus --format .jpg
+    python -m benchmarks.throughput --corpus corpus --dpi 300 --source-dpi 600
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from core.grid_utils import build_fast_mesh_function, preprocess_edges, dewarp_image, resolve_output_size
+from core.image_io import encode_export
+from core.memory import rss_bytes
+from core.workers import BoundedExecutor
+from core.ocr_output import dewarp_for_ocr, to_grayscale, DEFAULT_BLOCK_SIZE, DEFAULT_THRESHOLD_C
+from ui.utils.file_utils import load_points_from_json
+from benchmarks.synthetic_corpus import generate_corpus
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Этапы конвейера в порядке выполнения
+STAGES = ("load", "mesh", "remap", "encode")
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если недоступно на платформе)"""
+    if resource is None:
+        return None
+    # В Linux ru_maxrss в КБ, в macOS - в байтах
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if os.uname().sysname == "Darwin" else maxrss / 1024
+
+
+def dewarp_accuracy(result, flat, border=0.01):
+    """
+    Сравнивает результат выравнивания с эталонной страницей.
+
+    Args:
+        result: Выровненное изображение
+        flat: Эталонная плоская страница того же размера
+        border: Доля размера, исключаемая по краям
+
+    Returns:
+        mae, psnr: Средняя абсолютная ошибка яркости и PSNR в дБ
+    """
+    height, width = flat.shape[:2]
+    by, bx = int(height * border), int(width * border)
+    a = to_grayscale(result)[by:height - by, bx:width - bx].astype(np.float32)
+    b = to_grayscale(flat)[by:height - by, bx:width - bx].astype(np.float32)
+    diff = a - b
+    mse = float(np.mean(diff ** 2))
+    psnr = float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+    return float(np.mean(np.abs(diff))), psnr
+
+
+def process_page(image_path, points_path, flat_path, ext, scale=1.0, mode="color"):
+    """Полный путь обработки одной страницы с замером времени этапов"""
+    timings = {}
+
+    start = time.perf_counter()
+    image = cv2.imread(image_path)
+    edges = load_points_from_json(points_path)["points"]
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mesh_func = build_fast_mesh_function(*preprocess_edges(**edges))
+    timings["mesh"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    height, width = image.shape[:2]
+    output_size = resolve_output_size(width, height, scale=scale)
+    if mode == "color":
+        result = dewarp_image(image, mesh_func, output_size=output_size)
+    else:
+        result = dewarp_for_ocr(image, mesh_func, mode=mode, output_size=output_size)
+    timings["remap"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_export(result, ext, png_bilevel=mode == "binary")
+    timings["encode"] = time.perf_counter() - start
+
+    # Сравнение с эталоном не входит в замеры; эталон приводится к размеру результата
+    flat = cv2.imread(flat_path)
+    if flat.shape[:2] != result.shape[:2]:
+        flat = cv2.resize(flat, result.shape[1::-1], interpolation=cv2.INTER_AREA)
+    if mode == "binary":
+        # Бинарный результат сравнивается с бинаризованным эталоном
+        flat = cv2.adaptiveThreshold(to_grayscale(flat), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                     cv2.THRESH_BINARY, DEFAULT_BLOCK_SIZE, DEFAULT_THRESHOLD_C)
+    mae, psnr = dewarp_accuracy(result, flat)
+    return timings, mae, psnr
+
+
+def find_pages(corpus_dir):
+    """Находит страницы корпуса, созданного benchmarks.synthetic_corpus"""
+    pages = []
+    for flat_path in sorted(glob.glob(os.path.join(corpus_dir, "page_*_flat.png"))):
+        base = flat_path[:-len("_flat.png")]
+        pages.append((base + ".png", base + ".json", flat_path))
+    return pages
+
+
+def run(pages, workers, ext, scale=1.0, mode="color"):
+    """
+    Обрабатывает страницы в пуле из workers потоков.
+
+    Returns:
+        report: Словарь с результатами бенчмарка
+    """
+    baseline = rss_bytes()
+    executor = BoundedExecutor(workers)
+    latencies, accuracy = [], []
+    stage_times = {stage: [] for stage in STAGES}
+    try:
+        start = time.perf_counter()
+        futures = [executor.submit(process_page, *page, ext, scale, mode) for page in pages]
+        for future in futures:
+            timings, mae, psnr = future.result()
+            latencies.append(sum(timings.values()))
+            accuracy.append((mae, psnr))
+            for stage in STAGES:
+                stage_times[stage].append(timings[stage])
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+
+    mae, psnr = np.array(accuracy).T
+    return {
+        "pages": len(pages),
+        "workers": workers,
+        "format": ext,
+        "scale": scale,
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "pages_per_s": len(pages) / elapsed,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "stage_mean_ms": {stage: float(np.mean(times) * 1000) for stage, times in stage_times.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline / 1024 ** 2 if baseline is not None else None,
+        "mae": float(mae.mean()),
+        "psnr_db": float(psnr.mean()),
+        "psnr_min_db": float(psnr.min()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=None, help="Каталог готового корпуса (по умолчанию - сгенерировать)")
+    parser.add_argument("--count", type=int, default=10, help="Количество страниц генерируемого корпуса")
+    parser.add_argument("--size", default="1200x1600", help="Размер страницы ШxВ генерируемого корпуса")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора корпуса")
+    parser.add_argument("--workers", type=int, default=1, help="Количество потоков обработки")
+    parser.add_argument("--format", default=".png", help="Формат кодирования результата")
+    parser.add_argument("--scale", type=float, default=None, help="Масштаб результата относительно входа")
+    parser.add_argument("--dpi", type=float, default=None, help="Разрешение результата в dpi (нужен --source-dpi)")
+    parser.add_argument("--source-dpi", type=float, default=None, help="Разрешение входных изображений в dpi")
+    parser.add_argument("--mode", default="color", choices=["color", "gray", "binary"],
+                        help="Режим результата (gray/binary - подготовка для OCR)")
+    parser.add_argument("--json", default=None, help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+    if args.dpi is not None:
+        if not args.source_dpi:
+            parser.error("--dpi требует --source-dpi")
+        scale = args.dpi / args.source_dpi
+    else:
+        scale = args.scale or 1.0
+
+    with tempfile.TemporaryDirectory(prefix="corpus-") as tmp_dir:
+        if args.corpus:
+            pages = find_pages(args.corpus)
+        else:
+            width, height = map(int, args.size.lower().split("x"))
+            # ru_maxrss не сбрасывается, поэтому корпус генерируется в дочернем процессе
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                pages = executor.submit(generate_corpus, tmp_dir, args.count, width, height, args.seed).result()
+        if not pages:
+            print(f"Страницы не найдены: {args.corpus}")
+            return 1
+        report = run(pages, max(1, args.workers), args.format, scale, args.mode)
+
+    print(f"Страниц: {report['pages']}, потоков: {report['workers']}, формат: {report['format']}, "
+          f"масштаб: {report['scale']:g}, режим: {report['mode']}")
+    print(f"Пропускная способность: {report['pages_per_s']:.2f} стр./с")
+    print(f"Задержка p50: {report['latency_p50_ms']:.0f} мс, p99: {report['latency_p99_ms']:.0f} мс")
+    print("Этапы (среднее): " + ", ".join(f"{stage} {ms:.0f} мс" for stage, ms in report["stage_mean_ms"].items()))
+    rss, baseline = report["peak_rss_mb"], report["baseline_rss_mb"]
+    if rss is None:
+        print("Пиковый RSS: н/д")
+    elif baseline is None:
+        print(f"Пиковый RSS: {rss:.0f} МБ")
+    else:
+        print(f"Пиковый RSS: {rss:.0f} МБ (до обработки {baseline:.0f} МБ, прирост {rss - baseline:.0f} МБ)")
+    print(f"Точность: MAE {report['mae']:.2f}, PSNR {report['psnr_db']:.1f} дБ (мин. {report['psnr_min_db']:.1f} дБ)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
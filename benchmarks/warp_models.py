@@ -0,0 +1,119 @@
+"""
+Сравнение моделей деформации по скорости, памяти и точности выравнивания.
+
+Для каждой страницы рисуется плоский текст и случайные изогнутые границы
+(core.synthesis); изогнутое изображение строится обращением модели --truth.
+Затем страница выравнивается каждой моделью из --models по тем же границам,
+и результат сравнивается с эталонной плоской страницей. Для каждой модели
+измеряются время построения модели (fit), вычисления полноразмерных карт
+(maps) и remap, прирост памяти при построении карт (tracemalloc) и точность
+(MAE, PSNR).
+
+Все модели проходят через одни и те же граничные кривые и отличаются только
+внутри области, поэтому на страницах, изогнутых моделью Кунса, она точна по
+построению; --truth tps или rbf моделируют страницы с иной деформацией.
+
+Запуск:
+    python -m benchmarks.warp_models --count 5 --size 800x1000
+    python -m benchmarks.warp_models --truth tps --models coons tps piecewise_affine --json models.json
+"""
+import argparse
+import json
+import time
+import numpy as np
+from core.grid_utils import preprocess_edges, compute_remap_maps_region, apply_remap
+from core.memory import MemoryProfiler
+from core.synthesis import render_text_page, random_edges, warp_page
+from core.warp_models import WARP_MODELS, build_warp_model
+from benchmarks.throughput import dewarp_accuracy
+
+
+def generate_pages(count, width, height, seed=0, truth="coons"):
+    """
+    Генерирует страницы: эталон, изогнутое изображение и границы.
+
+    Returns:
+        pages: Список кортежей (flat, warped, edges)
+    """
+    pages = []
+    for index in range(count):
+        rng = np.random.default_rng([seed, index])
+        flat = render_text_page(rng, width, height)
+        edges = random_edges(rng, width, height)
+        pages.append((flat, warp_page(flat, edges, model=truth), edges))
+    return pages
+
+
+def measure_model(model, pages):
+    """
+    Выравнивает страницы моделью model.
+
+    Returns:
+        row: Словарь с временем этапов, памятью и точностью
+    """
+    timings = {"fit": [], "maps": [], "remap": []}
+    accuracy = []
+    for flat, warped, edges in pages:
+        height, width = warped.shape[:2]
+        start = time.perf_counter()
+        mesh_func = build_warp_model(model, *preprocess_edges(**edges))
+        timings["fit"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        map_x, map_y = compute_remap_maps_region(mesh_func, width, height)
+        timings["maps"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = apply_remap(warped, map_x, map_y)
+        timings["remap"].append(time.perf_counter() - start)
+        accuracy.append(dewarp_accuracy(result, flat))
+
+    # Память замеряется отдельным проходом: tracemalloc замедляет код на Python
+    flat, warped, edges = pages[0]
+    with MemoryProfiler() as profiler:
+        with profiler.stage("maps"):
+            mesh_func = build_warp_model(model, *preprocess_edges(**edges))
+            compute_remap_maps_region(mesh_func, warped.shape[1], warped.shape[0])
+    maps_memory = profiler.report()[0]["traced_peak_mb"]
+
+    mae, psnr = np.array(accuracy).T
+    return {
+        "model": model,
+        **{f"{stage}_ms": float(np.mean(times) * 1000) for stage, times in timings.items()},
+        "maps_peak_mb": maps_memory,
+        "mae": float(mae.mean()),
+        "psnr_db": float(psnr.mean()),
+        "psnr_min_db": float(psnr.min()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5, help="Количество страниц")
+    parser.add_argument("--size", default="800x1000", help="Размер страницы ШxВ")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--truth", default="coons", choices=WARP_MODELS, help="Модель, изгибающая страницы")
+    parser.add_argument("--models", nargs="+", default=list(WARP_MODELS), choices=WARP_MODELS,
+                        help="Сравниваемые модели")
+    parser.add_argument("--json", default=None, help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+    width, height = map(int, args.size.lower().split("x"))
+
+    pages = generate_pages(max(1, args.count), width, height, args.seed, args.truth)
+    rows = [measure_model(model, pages) for model in args.models]
+
+    print(f"Страниц: {len(pages)}, размер {width}x{height}, изгиб моделью {args.truth}")
+    print(f"{'модель':<18}{'fit, мс':>9}{'карты, мс':>11}{'remap, мс':>11}{'память, МБ':>12}{'MAE':>7}{'PSNR, дБ':>10}")
+    for row in rows:
+        print(f"{row['model']:<18}{row['fit_ms']:>9.1f}{row['maps_ms']:>11.1f}{row['remap_ms']:>11.1f}"
+              f"{row['maps_peak_mb']:>12.1f}{row['mae']:>7.2f}{row['psnr_db']:>10.1f}")
+
+    if args.json:
+        report = {"pages": len(pages), "size": [width, height], "truth": args.truth, "models": rows}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
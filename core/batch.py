@@ -0,0 +1,394 @@
+"""
+Инкрементальная пакетная обработка каталога с манифестом.
+
+Для каждой страницы - изображения с разметкой <имя>.json рядом - в манифест
+записываются хэши изображения и разметки, параметры обработки и пути
+результатов. При повторном запуске страницы с неизмененными изображением,
+разметкой и параметрами и существующими результатами пропускаются, поэтому
+ночная переобработка архива затрагивает только новые и отредактированные
+страницы, а прерванный запуск продолжается с места остановки. Манифест и
+результаты записываются атомарно (временный файл и переименование).
+
+Запуск:
+    python -m core.batch archive/ results/ --mode binary --scale 0.5 --workers 4
+    python -m core.batch archive/ results/ --workers 2 --processes 32
+    python -m core.batch archive/ results/ --retry-failed
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from .grid_utils import preprocess_edges
+from .image_io import EXPORT_EXTENSIONS, encode_export, write_atomic
+from .mesh_validation import ensure_valid_mesh
+from .pipeline import run_alignment, run_regions
+from .regions import REGION_LAYOUTS, regions_from_data, regions_to_data
+from .result_store import hash_file
+from .shared_arrays import DewarpProcessPool
+from .warp_models import DEFAULT_WARP_MODEL, WARP_MODELS
+
+
+# Версия формата манифеста
+MANIFEST_VERSION = 1
+
+# Имя файла манифеста в выходном каталоге
+MANIFEST_NAME = "manifest.json"
+
+# Расширения входных изображений
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+# Интервал записи манифеста во время обработки, секунд
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+def points_hash(data):
+    """
+    Hash of the regions of a points.json file.
+
+    Only the edge points count: re-saving an unchanged annotation rewrites
+    its timestamp, which must not trigger reprocessing.
+    """
+    regions = [(name, {edge: [list(map(float, p)) for p in points] for edge, points in region.items()})
+               for name, region in regions_from_data(data)]
+    payload = json.dumps(regions_to_data(regions), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def find_pages(input_dir):
+    """
+    Finds the annotated pages of a directory tree.
+
+    Returns:
+        pages: Sorted list of (page id, image path, points path); the page id
+            is the image path relative to input_dir
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(input_dir, "**", "*"), recursive=True)):
+        stem, ext = os.path.splitext(path)
+        if ext.lower() in IMAGE_EXTENSIONS and os.path.isfile(stem + ".json"):
+            pages.append((os.path.relpath(path, input_dir).replace(os.sep, "/"), path, stem + ".json"))
+    return pages
+
+
+class Manifest:
+    """
+    Per-page record of a batch run, kept in <out_dir>/manifest.json.
+
+    Every entry stores the hashes of the image and of the annotation, the
+    size and mtime of both files (an unchanged stat skips hashing), the
+    processing parameters, the output paths relative to the output
+    directory, the status ("done" or "failed") and the error of a failed page.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.pages = data.get("pages", {})
+
+    def get(self, page_id):
+        with self._lock:
+            return self.pages.get(page_id)
+
+    def set(self, page_id, entry):
+        with self._lock:
+            self.pages[page_id] = entry
+            self._dirty = True
+
+    def remove_missing(self, page_ids):
+        """Drops entries of pages that are no longer in the input; their outputs are kept."""
+        with self._lock:
+            missing = [page_id for page_id in self.pages if page_id not in page_ids]
+            for page_id in missing:
+                del self.pages[page_id]
+            self._dirty = self._dirty or bool(missing)
+            return missing
+
+    def save(self, force=False):
+        """Writes the manifest atomically (only if it changed, unless force)."""
+        with self._lock:
+            if not (self._dirty or force):
+                return
+            data = json.dumps({"version": MANIFEST_VERSION, "updated": datetime.now().isoformat(),
+                               "pages": self.pages}, indent=2, ensure_ascii=False, sort_keys=True)
+            self._dirty = False
+        write_atomic(self.path, data.encode("utf-8"))
+
+
+def _stat(path):
+    """[size, mtime_ns] of a file, as stored in the manifest."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _file_state(path, previous_stat=None, previous_hash=None):
+    """(size, mtime_ns) and the content hash of a file; the hash is reused if the stat is unchanged."""
+    current = _stat(path)
+    if previous_hash is not None and previous_stat == current:
+        return current, previous_hash
+    return current, hash_file(path)
+
+
+class BatchProcessor:
+    """
+    Incremental batch alignment of a directory of annotated pages.
+
+    A page is processed when it is new, its image or annotation changed, the
+    parameters changed or one of its outputs is missing; a failed page is
+    retried only when its inputs changed or with retry_failed. The manifest
+    is saved every flush_interval seconds and at the end, so an interrupted
+    run loses at most the pages of the last interval.
+    """
+
+    def __init__(self, input_dir, out_dir, mode="color", scale=1.0, model=DEFAULT_WARP_MODEL,
+                 layout="horizontal", ext=".png", export_options=None, store_dir=None, memory_budget=None,
+                 workers=1, processes=None, retry_failed=False, force=False, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """
+        Args:
+            input_dir: Directory of images with <name>.json annotations next to them
+            out_dir: Output directory; results keep the relative paths of the inputs
+            mode, scale, model: Processing parameters (see core.pipeline.run_alignment())
+            layout: Layout of pages with several regions (see core.regions.compose_regions())
+            ext: Output format extension
+            export_options: Format options for export_params()
+            store_dir: Directory of the result store shared with the UI (None - do not use)
+            memory_budget: Memory budget of one page in bytes
+            workers: Number of pages processed at once
+            processes: Dewarp every page on a pool of this many processes through
+                shared memory (core.shared_arrays.DewarpProcessPool); the pages
+                are still loaded and encoded on `workers` threads
+            retry_failed: Process failed pages again even if their inputs did not change
+            force: Process all pages
+            flush_interval: Interval of manifest writes in seconds
+        """
+        if ext.lower() not in EXPORT_EXTENSIONS:
+            raise ValueError(f"Неподдерживаемый формат сохранения: {ext}")
+        self.input_dir = input_dir
+        self.out_dir = out_dir
+        self.mode = mode
+        self.scale = scale
+        self.model = model
+        self.layout = layout
+        self.ext = ext.lower()
+        self.export_options = dict(export_options or {})
+        if mode == "binary":
+            self.export_options.setdefault("png_bilevel", True)
+        self.store_dir = store_dir
+        self.memory_budget = memory_budget
+        self.workers = max(1, workers)
+        self.processes = processes
+        self._process_pool = None
+        self.retry_failed = retry_failed
+        self.force = force
+        self.flush_interval = flush_interval
+        self.manifest = Manifest(os.path.join(out_dir, MANIFEST_NAME))
+
+    @property
+    def params(self):
+        """Parameters that change the outputs; a page is reprocessed when they differ from its entry."""
+        return {"mode": self.mode, "scale": self.scale, "model": self.model, "layout": self.layout,
+                "ext": self.ext, "export": self.export_options}
+
+    def _inputs(self, page_id, image_path, points_path):
+        """Current input state of a page, reusing the hashes of the manifest entry for unchanged files."""
+        entry = self.manifest.get(page_id) or {}
+        image_stat, image_hash = _file_state(image_path, entry.get("image_stat"), entry.get("image_hash"))
+        # Хэш разметки считается по точкам областей, а не по содержимому файла
+        points_stat = _stat(points_path)
+        if entry.get("points_stat") == points_stat and entry.get("points_hash"):
+            annotation_hash = entry["points_hash"]
+        else:
+            with open(points_path, "r", encoding="utf-8") as f:
+                annotation_hash = points_hash(json.load(f))
+        return {"image_stat": image_stat, "image_hash": image_hash,
+                "points_stat": points_stat, "points_hash": annotation_hash}
+
+    def needs_processing(self, page_id, inputs):
+        """Whether a page must be (re)processed; inputs - result of _inputs()."""
+        if self.force:
+            return True
+        entry = self.manifest.get(page_id)
+        if entry is None or entry.get("params") != self.params:
+            return True
+        if entry.get("image_hash") != inputs["image_hash"] or entry.get("points_hash") != inputs["points_hash"]:
+            return True
+        if entry.get("status") == "failed":
+            return self.retry_failed
+        return not all(os.path.exists(os.path.join(self.out_dir, path)) for path in entry.get("outputs", []))
+
+    def process_page(self, page_id, image_path, points_path):
+        """
+        Validates the annotation, aligns the page and writes its outputs.
+
+        Returns:
+            outputs: Output paths relative to out_dir
+        """
+        with open(points_path, "r", encoding="utf-8") as f:
+            regions = regions_from_data(json.load(f))
+        for name, edge_points in regions:
+            short = [edge for edge, points in edge_points.items() if len(points) < 2]
+            if short:
+                raise ValueError(f"Область {name}: меньше 2 точек на границах " + ", ".join(short))
+            ensure_valid_mesh(*preprocess_edges(**edge_points), model=self.model)
+
+        stem = os.path.splitext(page_id)[0]
+        options = dict(mode=self.mode, scale=self.scale, store_dir=self.store_dir,
+                       memory_budget=self.memory_budget, model=self.model, process_pool=self._process_pool)
+        if len(regions) > 1:
+            results = run_regions(image_path, regions, layout=self.layout, **options)
+            if self.layout == "separate":
+                outputs = [(f"{stem}_{name}{self.ext}", image)
+                           for (name, _), image in zip(regions, results["results"])]
+            else:
+                outputs = [(stem + self.ext, results["result"])]
+        else:
+            results = run_alignment(image_path, regions[0][1], targets=["result"], **options)
+            outputs = [(stem + self.ext, results["result"])]
+
+        for path, image in outputs:
+            write_atomic(os.path.join(self.out_dir, path), encode_export(image, self.ext, **self.export_options))
+        return [path for path, _ in outputs]
+
+    def _failed(self, page_id, entry, ex):
+        entry.update(outputs=[], status="failed", error=str(ex) or type(ex).__name__,
+                     finished=datetime.now().isoformat())
+        self.manifest.set(page_id, entry)
+        return entry
+
+    def _run_page(self, page_id, image_path, points_path, inputs):
+        start = time.perf_counter()
+        entry = dict(inputs, params=self.params, image=image_path, points=points_path)
+        try:
+            entry["outputs"] = self.process_page(page_id, image_path, points_path)
+        except Exception as ex:
+            # Ошибка одной страницы (разметка, чтение, нехватка памяти) не останавливает пакет
+            entry["seconds"] = round(time.perf_counter() - start, 3)
+            return self._failed(page_id, entry, ex)
+        entry.update(status="done", seconds=round(time.perf_counter() - start, 3),
+                     finished=datetime.now().isoformat())
+        self.manifest.set(page_id, entry)
+        return entry
+
+    def run(self, on_page_done=None):
+        """
+        Processes the new and changed pages.
+
+        Args:
+            on_page_done: Callback (page id, manifest entry) after every processed page
+
+        Returns:
+            report: Dict with the numbers of processed, skipped, failed and removed pages
+        """
+        pages = find_pages(self.input_dir)
+        removed = self.manifest.remove_missing({page_id for page_id, _, _ in pages})
+
+        # a.png и a.jpg с одной разметкой a.json записали бы один результат a.png
+        images_per_points = Counter(points_path for _, _, points_path in pages)
+
+        todo, skipped, failed = [], 0, 0
+        for page_id, image_path, points_path in pages:
+            try:
+                if images_per_points[points_path] > 1:
+                    raise ValueError(f"Разметка {os.path.basename(points_path)} относится к нескольким изображениям "
+                                     f"с одинаковым именем; переименуйте лишние изображения")
+                inputs = self._inputs(page_id, image_path, points_path)
+            except (ValueError, KeyError, OSError) as ex:
+                # Нечитаемая или неоднозначная разметка: страница отмечается ошибкой
+                # и проверяется заново при следующем запуске
+                entry = self._failed(page_id, {"params": self.params, "image": image_path, "points": points_path}, ex)
+                if on_page_done is not None:
+                    on_page_done(page_id, entry)
+                failed += 1
+                continue
+            if self.needs_processing(page_id, inputs):
+                todo.append((page_id, image_path, points_path, inputs))
+            else:
+                entry = self.manifest.get(page_id)
+                if entry["image_stat"] != inputs["image_stat"] or entry["points_stat"] != inputs["points_stat"]:
+                    # Файлы перезаписаны без изменений: запоминается новое состояние, чтобы не хэшировать снова
+                    self.manifest.set(page_id, dict(entry, **inputs))
+                skipped += 1
+
+        processed = 0
+        last_flush = time.monotonic()
+        # Пул процессов создается до потоков страниц и один на весь запуск
+        if self.processes and todo:
+            self._process_pool = DewarpProcessPool(self.processes)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(self._run_page, *page): page[0] for page in todo}
+            for future in as_completed(futures):
+                entry = future.result()
+                if entry["status"] == "failed":
+                    failed += 1
+                else:
+                    processed += 1
+                if on_page_done is not None:
+                    on_page_done(futures[future], entry)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.manifest.save()
+                    last_flush = time.monotonic()
+        finally:
+            # При прерывании ожидающие страницы отменяются, а манифест записывается:
+            # уже обработанные страницы при следующем запуске не повторяются
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self._process_pool is not None:
+                self._process_pool.shutdown()
+                self._process_pool = None
+            self.manifest.save(force=not os.path.exists(self.manifest.path))
+
+        return {"pages": len(pages), "processed": processed, "skipped": skipped,
+                "failed": failed, "removed": len(removed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Каталог изображений с разметкой <имя>.json рядом")
+    parser.add_argument("output", help="Выходной каталог (результаты и manifest.json)")
+    parser.add_argument("--mode", default="color", choices=["color", "gray", "binary"], help="Режим результата")
+    parser.add_argument("--scale", type=float, default=1.0, help="Масштаб результата относительно входа")
+    parser.add_argument("--model", default=DEFAULT_WARP_MODEL, choices=WARP_MODELS, help="Модель деформации")
+    parser.add_argument("--layout", default="horizontal", choices=REGION_LAYOUTS,
+                        help="Раскладка результатов страниц с несколькими областями")
+    parser.add_argument("--format", default=".png", help="Формат результатов")
+    parser.add_argument("--store", default=None, help="Каталог хранилища результатов")
+    parser.add_argument("--memory-mb", type=float, default=None, help="Бюджет памяти на страницу в МБ")
+    parser.add_argument("--workers", type=int, default=1, help="Количество страниц, обрабатываемых одновременно")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Выравнивать каждую страницу в пуле из N процессов через разделяемую память")
+    parser.add_argument("--retry-failed", action="store_true", help="Повторить страницы с ошибками")
+    parser.add_argument("--force", action="store_true", help="Обработать все страницы заново")
+    args = parser.parse_args()
+
+    processor = BatchProcessor(
+        args.input, args.output, mode=args.mode, scale=args.scale, model=args.model, layout=args.layout,
+        ext=args.format if args.format.startswith(".") else "." + args.format, store_dir=args.store,
+        memory_budget=int(args.memory_mb * 1024 ** 2) if args.memory_mb else None,
+        workers=args.workers, processes=args.processes, retry_failed=args.retry_failed, force=args.force,
+    )
+
+    def on_page_done(page_id, entry):
+        if entry["status"] == "failed":
+            print(f"{page_id}: ошибка: {entry['error']}")
+        else:
+            print(f"{page_id}: {entry['seconds']:.2f} с")
+
+    report = processor.run(on_page_done)
+    print(f"Страниц: {report['pages']}, обработано: {report['processed']}, без изменений: {report['skipped']}, "
+          f"с ошибками: {report['failed']}, удалено из манифеста: {report['removed']}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
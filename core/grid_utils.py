@@ -1,7 +1,22 @@
+from collections import OrderedDict
 import numpy as np
 import cv2
 from scipy.interpolate import CubicSpline
 from scipy.interpolate import RegularGridInterpolator
+from scipy.interpolate import LSQUnivariateSpline
+from .memory import profile_stage
+
+# Начиная с этого количества точек граница считается плотной ломаной
+# (трассировка, детектор) и аппроксимируется сглаживающим сплайном
+DENSE_EDGE_POINTS = 50
+
+# Граница считается прямой, если все ее точки отстоят от хорды не более чем
+# на столько пикселей; сетка из четырех прямых границ билинейна
+STRAIGHT_EDGE_TOLERANCE = 0.5
+
+# Билинейная сетка заменяется гомографией (cv2.warpPerspective), если они
+# расходятся внутри четырехугольника не более чем на столько пикселей
+PROJECTIVE_TOLERANCE = 0.25
 
 class CvColors:
     # Basic colors (BGR format)
@@ -73,6 +88,39 @@ def compute_remap_maps(mesh_func, normalized_grid):
     return map_x, map_y
 
 
+def compute_remap_maps_region(mesh_func, width, height, y0=0, y1=None, x0=0, x1=None):
+    """
+    Computes map_x and map_y for a rectangular region of the output image.
+    
+    Gives the same values as compute_remap_maps() on the matching slice of the
+    normalized grid, without building the full-size coordinate grid.
+    
+    Args:
+        mesh_func: The mesh transformation function
+        width: Width of the full output image
+        height: Height of the full output image
+        y0, y1: Row range of the region (y1 defaults to height)
+        x0, x1: Column range of the region (x1 defaults to width)
+    
+    Returns:
+        map_x, map_y: float32 arrays of shape [y1 - y0, x1 - x0]
+    """
+    if y1 is None:
+        y1 = height
+    if x1 is None:
+        x1 = width
+    # Модели с собственным вычислением карт (BilinearMesh, core.warp_models.GridWarp)
+    if hasattr(mesh_func, "maps"):
+        return mesh_func.maps(width, height, y0, y1, x0, x1)
+    
+    s = (np.arange(x0, x1, dtype=np.float32) / (width - 1))[None, :]
+    t = ((height - 1 - np.arange(y0, y1, dtype=np.float32)) / (height - 1))[:, None]
+    s, t = np.broadcast_arrays(s, t)
+    
+    res = mesh_func(s, t)
+    return res[..., 0].astype(np.float32), res[..., 1].astype(np.float32)
+
+
 def apply_remap(image, map_x, map_y, interpolation=cv2.INTER_CUBIC, border_mode=cv2.BORDER_CONSTANT):
     """
     Applies the cv2.remap function with the given parameters.
@@ -95,6 +143,263 @@ def apply_remap(image, map_x, map_y, interpolation=cv2.INTER_CUBIC, border_mode=
     return result
 
 
+# Оценка пикового объема памяти выравнивания на пиксель: координатная сетка (int64),
+# нормализованная сетка, промежуточные массивы функции меша (float64) и карты remap
+DEWARP_BYTES_PER_PIXEL = 200
+
+
+def estimate_dewarp_bytes(height, width, channels=3, output_size=None):
+    """
+    Estimates the peak memory used by dewarp_image() for an image.
+    
+    Args:
+        height: Image height
+        width: Image width
+        channels: Number of image channels
+        output_size: Output size (width, height), defaults to the input size
+    
+    Returns:
+        nbytes: Estimated peak memory in bytes (input and result included)
+    """
+    out_width, out_height = output_size or (width, height)
+    return height * width * channels + out_height * out_width * (DEWARP_BYTES_PER_PIXEL + channels)
+
+
+def resolve_output_size(width, height, size=None, scale=None, dpi=None, source_dpi=None):
+    """
+    Resolves the requested output resolution into a pixel size.
+    
+    Args:
+        width, height: Input image size
+        size: Target size (width, height); one of the values may be None to keep the aspect ratio
+        scale: Output scale relative to the input
+        dpi: Target resolution in dots per inch (requires source_dpi)
+        source_dpi: Resolution of the input scan
+    
+    Returns:
+        out_width, out_height: Output size in pixels
+    """
+    if size is not None:
+        out_width, out_height = size
+        if out_width is None and out_height is None:
+            raise ValueError("Не задан размер результата")
+        if out_width is None:
+            out_width = width * out_height / height
+        if out_height is None:
+            out_height = height * out_width / width
+    else:
+        if dpi is not None:
+            if not source_dpi:
+                raise ValueError("Для выбора разрешения в dpi нужно указать разрешение исходного скана")
+            scale = dpi / source_dpi
+        if scale is None:
+            scale = 1.0
+        if scale <= 0:
+            raise ValueError(f"Некорректный масштаб результата: {scale}")
+        out_width, out_height = width * scale, height * scale
+    return max(2, int(round(out_width))), max(2, int(round(out_height)))
+
+
+# Предварительное сглаживание включается, если на пиксель результата
+# приходится больше PREFILTER_THRESHOLD пикселей исходного изображения; исходное
+# изображение уменьшается до PREFILTER_STEP пикселей на пиксель результата
+# (меньший шаг дает двойное размытие, больший - наложение спектров)
+PREFILTER_THRESHOLD = 2.0
+PREFILTER_STEP = 1.5
+
+
+def _sampling_step(map_x, map_y, spacing_x=1.0, spacing_y=1.0):
+    """Median distance in the source between neighbouring map samples, per output pixel."""
+    step_x = np.median(np.hypot(np.diff(map_x, axis=1), np.diff(map_y, axis=1))) / spacing_x if map_x.shape[1] > 1 else 1.0
+    step_y = np.median(np.hypot(np.diff(map_x, axis=0), np.diff(map_y, axis=0))) / spacing_y if map_x.shape[0] > 1 else 1.0
+    return step_x, step_y
+
+
+def _reduce_source(image, step_x, step_y, threshold, step):
+    """Reduces the source with INTER_AREA; returns the image and the scale factors (None if unchanged)."""
+    if max(step_x, step_y) < threshold:
+        return image, None
+    
+    height, width = image.shape[:2]
+    new_width = max(1, int(round(width * min(1.0, step / step_x))))
+    new_height = max(1, int(round(height * min(1.0, step / step_y))))
+    image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    return image, (new_width / width, new_height / height)
+
+
+def _scale_maps(map_x, map_y, factors):
+    """Rescales maps into the reduced source, with pixel centres as in cv2.resize."""
+    if factors is None:
+        return map_x, map_y
+    fx, fy = factors
+    return (map_x + 0.5) * fx - 0.5, (map_y + 0.5) * fy - 0.5
+
+
+def prefilter_for_maps(image, map_x, map_y, threshold=PREFILTER_THRESHOLD, step=PREFILTER_STEP):
+    """
+    Downscales the source before a shrinking remap to avoid aliasing.
+    
+    The local sampling step is measured on the maps (median distance between
+    neighbouring output pixels in the source); if it exceeds threshold, the
+    source is reduced with INTER_AREA so that the step becomes about step
+    source pixels, and the maps are rescaled into the reduced image.
+    
+    Args:
+        image: Input image
+        map_x, map_y: float32 remap maps into the input image
+        threshold: Minimum sampling step that triggers prefiltering
+        step: Sampling step after prefiltering
+    
+    Returns:
+        image, map_x, map_y: Possibly reduced image and matching maps
+    """
+    # Шаг выборки оценивается по разреженной подвыборке карт
+    stride = max(1, min(map_x.shape) // 64)
+    step_x, step_y = _sampling_step(map_x[::stride, ::stride], map_y[::stride, ::stride], stride, stride)
+    image, factors = _reduce_source(image, step_x, step_y, threshold, step)
+    map_x, map_y = _scale_maps(map_x, map_y, factors)
+    return image, map_x, map_y
+
+
+def prefilter_for_mesh(image, mesh_func, width, height, threshold=PREFILTER_THRESHOLD,
+                       step=PREFILTER_STEP, n_samples=65):
+    """
+    Same as prefilter_for_maps(), with the sampling step measured on a coarse
+    lattice of the mesh, for dewarping in strips without the full maps.
+    
+    Args:
+        image: Input image
+        mesh_func: The mesh transformation function
+        width, height: Output size
+        threshold: Minimum sampling step that triggers prefiltering
+        step: Sampling step after prefiltering
+        n_samples: Lattice size in each direction
+    
+    Returns:
+        image, factors: Possibly reduced image and the scale factors (fx, fy)
+            for _scale_maps(), None if the image is unchanged
+    """
+    nx, ny = min(n_samples, width), min(n_samples, height)
+    s, t = np.meshgrid(np.linspace(0, 1, nx), np.linspace(1, 0, ny))
+    res = np.asarray(mesh_func(s, t))
+    step_x, step_y = _sampling_step(res[..., 0], res[..., 1],
+                                    (width - 1) / max(1, nx - 1), (height - 1) / max(1, ny - 1))
+    return _reduce_source(image, step_x, step_y, threshold, step)
+
+
+def strip_maps(mesh_func, width, height, y0, y1, factors=None):
+    """Remap maps of output rows [y0, y1), rescaled into a prefiltered source."""
+    map_x, map_y = compute_remap_maps_region(mesh_func, width, height, y0, y1)
+    return _scale_maps(map_x, map_y, factors)
+
+
+def perspective_matrix(mesh_func, width, height, factors=None):
+    """
+    Matrix for cv2.warpPerspective(..., WARP_INVERSE_MAP) replacing the remap,
+    if the mesh is a BilinearMesh close enough to a homography.
+    
+    Args:
+        mesh_func: The mesh transformation function
+        width, height: Output size
+        factors: Scale factors of a prefiltered source, see prefilter_for_mesh()
+    
+    Returns:
+        matrix: 3x3 matrix from output pixels to source pixels, or None
+    """
+    if not isinstance(mesh_func, BilinearMesh):
+        return None
+    matrix = mesh_func.homography(width, height)
+    if matrix is None or factors is None:
+        return matrix
+    fx, fy = factors
+    scale = np.array([[fx, 0, 0.5 * fx - 0.5], [0, fy, 0.5 * fy - 0.5], [0, 0, 1]])
+    return scale @ matrix
+
+
+def warp_perspective_rows(image, matrix, width, y0, y1, interpolation=cv2.INTER_CUBIC,
+                          border_mode=cv2.BORDER_CONSTANT, border_value=0):
+    """Output rows [y0, y1) of cv2.warpPerspective with a matrix from perspective_matrix()."""
+    shift = np.array([[1, 0, 0], [0, 1, y0], [0, 0, 1]], dtype=np.float64)
+    return cv2.warpPerspective(image, matrix @ shift, (width, y1 - y0),
+                               flags=interpolation | cv2.WARP_INVERSE_MAP,
+                               borderMode=border_mode, borderValue=border_value)
+
+
+def dewarp_image(image, mesh_func, interpolation=cv2.INTER_CUBIC, border_mode=cv2.BORDER_CONSTANT,
+                 output_size=None, prefilter=True, strip_height=None, profiler=None):
+    """
+    Computes the remap maps for the whole image and applies them.
+    
+    Args:
+        image: Input image
+        mesh_func: The mesh transformation function
+        interpolation: Interpolation method
+        border_mode: Border handling mode
+        output_size: Output size (width, height), see resolve_output_size();
+            the maps are computed only at this size
+        prefilter: Downscale the source first when the output is smaller (see prefilter_for_maps())
+        strip_height: Process the output in strips of this many rows, so the
+            maps never exist at full size (see core.memory.plan_strip_height())
+        profiler: core.memory.MemoryProfiler accounting the "map" and "remap" stages
+    
+    Returns:
+        result: Dewarped image of the input size or of output_size
+    """
+    height, width = image.shape[:2]
+    if perspective_matrix(mesh_func, *(output_size or (width, height))) is not None:
+        return _dewarp_perspective(image, mesh_func, interpolation, border_mode,
+                                   output_size or (width, height), prefilter, profiler)
+    if strip_height is not None:
+        return _dewarp_strips(image, mesh_func, interpolation, border_mode,
+                              output_size or (width, height), prefilter, strip_height, profiler)
+    
+    if (output_size is None or tuple(output_size) == (width, height)) and not hasattr(mesh_func, "maps"):
+        with profile_stage(profiler, "map"):
+            grid = create_coordinate_grid(height, width)
+            normalized_grid = normalize_grid_coordinates(grid, width, height)
+            map_x, map_y = compute_remap_maps(mesh_func, normalized_grid)
+            del grid, normalized_grid
+        with profile_stage(profiler, "remap"):
+            return apply_remap(image, map_x, map_y, interpolation, border_mode)
+    
+    out_width, out_height = output_size or (width, height)
+    with profile_stage(profiler, "map"):
+        map_x, map_y = compute_remap_maps_region(mesh_func, out_width, out_height)
+    with profile_stage(profiler, "remap"):
+        if prefilter:
+            image, map_x, map_y = prefilter_for_maps(image, map_x, map_y)
+        return apply_remap(image, map_x, map_y, interpolation, border_mode)
+
+
+def _dewarp_perspective(image, mesh_func, interpolation, border_mode, output_size, prefilter, profiler):
+    # Гомография: карты не строятся, warpPerspective вычисляет координаты сам по блокам
+    out_width, out_height = output_size
+    factors = None
+    if prefilter:
+        with profile_stage(profiler, "prefilter"):
+            image, factors = prefilter_for_mesh(image, mesh_func, out_width, out_height)
+    matrix = perspective_matrix(mesh_func, out_width, out_height, factors)
+    with profile_stage(profiler, "remap"):
+        return warp_perspective_rows(image, matrix, out_width, 0, out_height, interpolation, border_mode)
+
+
+def _dewarp_strips(image, mesh_func, interpolation, border_mode, output_size, prefilter, strip_height, profiler):
+    out_width, out_height = output_size
+    factors = None
+    if prefilter:
+        with profile_stage(profiler, "prefilter"):
+            image, factors = prefilter_for_mesh(image, mesh_func, out_width, out_height)
+    
+    result = np.empty((out_height, out_width) + image.shape[2:], dtype=image.dtype)
+    for y0 in range(0, out_height, strip_height):
+        y1 = min(y0 + strip_height, out_height)
+        with profile_stage(profiler, "map"):
+            map_x, map_y = strip_maps(mesh_func, out_width, out_height, y0, y1, factors)
+        with profile_stage(profiler, "remap"):
+            result[y0:y1] = cv2.remap(image, map_x, map_y, interpolation=interpolation, borderMode=border_mode)
+    return result
+
+
 def get_log_thickness(height, width):
     """
     Calculates appropriate line thickness based on image dimensions.
@@ -110,7 +415,61 @@ def get_log_thickness(height, width):
     return max(1, int(size_factor))
 
 
-def visualize_grid(image, mesh_func, n_points=10, color_horizontal=None, color_vertical=None):
+def sample_grid_lines(mesh_func, n_lines=10, n_samples=None):
+    """
+    Evaluates all grid lines of the mesh in a single batched call.
+    
+    Args:
+        mesh_func: The mesh transformation function
+        n_lines: Number of grid lines in each direction
+        n_samples: Number of samples along each line (defaults to n_lines)
+    
+    Returns:
+        s_lines, t_lines: Arrays of shape [n_lines, n_samples, 2] with
+            lines of constant s and lines of constant t
+    """
+    if n_samples is None:
+        n_samples = n_lines
+    
+    line_values = np.linspace(0, 1, n_lines)
+    sample_values = np.linspace(0, 1, n_samples)
+    
+    # Строки [0, n_lines) - линии постоянного s, [n_lines, 2*n_lines) - постоянного t
+    s = np.concatenate([
+        np.repeat(line_values[:, None], n_samples, axis=1),
+        np.tile(sample_values, (n_lines, 1))
+    ])
+    t = np.concatenate([
+        np.tile(sample_values, (n_lines, 1)),
+        np.repeat(line_values[:, None], n_samples, axis=1)
+    ])
+    
+    res = np.asarray(mesh_func(s, t))
+    return res[:n_lines], res[n_lines:]
+
+
+def _draw_polylines(image, lines, color, thickness, scale=1.0):
+    """Draws a batch of open polylines with a single cv2.polylines call."""
+    if len(lines) == 0:
+        return
+    points = np.rint(np.asarray(lines, dtype=np.float64) * scale).astype(np.int32)
+    cv2.polylines(image, list(points.reshape(len(points), -1, 1, 2)), False, color, thickness)
+
+
+def _draw_points(image, points, color, radius, scale=1.0):
+    """
+    Draws a batch of filled round points with a single cv2.polylines call.
+    Each point is a zero-length segment, which OpenCV renders with round caps.
+    """
+    if len(points) == 0:
+        return
+    points = np.rint(np.asarray(points, dtype=np.float64)[:, :2] * scale).astype(np.int32)
+    segments = np.repeat(points[:, None, :], 2, axis=1).reshape(-1, 2, 1, 2)
+    cv2.polylines(image, list(segments), False, color, max(1, 2 * radius))
+
+
+def visualize_grid(image, mesh_func, n_points=10, color_horizontal=None, color_vertical=None,
+                   n_samples=None):
     """
     Visualizes the transformation grid on an image.
     
@@ -120,6 +479,7 @@ def visualize_grid(image, mesh_func, n_points=10, color_horizontal=None, color_v
         n_points: Number of grid lines in each direction
         color_horizontal: Color for horizontal grid lines (s-lines)
         color_vertical: Color for vertical grid lines (t-lines)
+        n_samples: Number of samples along each line (defaults to n_points)
     
     Returns:
         visualization: Image with grid visualization
@@ -133,39 +493,21 @@ def visualize_grid(image, mesh_func, n_points=10, color_horizontal=None, color_v
     height, width = image.shape[:2]
     cur_thickness = get_log_thickness(height, width)
     
-    test_params = []
-    
-    # Horizontal grid lines (constant s)
-    for s in np.linspace(0, 1, n_points):
-        test_params.append(
-            (s * np.ones(n_points), np.linspace(0, 1, n_points), color_horizontal)
-        )
-    
-    # Vertical grid lines (constant t)
-    for t in np.linspace(0, 1, n_points):
-        test_params.append(
-            (np.linspace(0, 1, n_points), t * np.ones(n_points), color_vertical)
-        )
-    
-    # Draw grid lines
-    for s, t, color in test_params:
-        # Convert 1D arrays to 2D
-        s_2d = s.reshape(1, -1)
-        t_2d = t.reshape(1, -1)
-        
-        # Get transformed coordinates
-        res = mesh_func(s_2d, t_2d)
-        x = res[..., 0]
-        y = res[..., 1]
-        
-        # Create point array for drawing
-        points = np.array([x.flatten(), y.flatten()]).T
-        points = points.reshape((-1, 1, 2)).astype(np.int32)
-        cv2.polylines(visualization, [points], False, color, cur_thickness)
+    s_lines, t_lines = sample_grid_lines(mesh_func, n_points, n_samples)
+    _draw_polylines(visualization, s_lines, color_horizontal, cur_thickness)
+    _draw_polylines(visualization, t_lines, color_vertical, cur_thickness)
     
     return visualization
 
 
+def _edge_lists(edges):
+    """Converts edges given as a dict or a list into a list of point lists."""
+    if isinstance(edges, dict):
+        # If edges is a dictionary, convert to list
+        return [edges[key] for key in sorted(edges.keys())]
+    return edges
+
+
 def visualize_boundary_points(image, edges, colors=None, thickness_factor=2):
     """
     Visualizes boundary points on an image.
@@ -184,25 +526,95 @@ def visualize_boundary_points(image, edges, colors=None, thickness_factor=2):
     
     base_thickness = get_log_thickness(height, width)
     circle_radius = int(base_thickness * thickness_factor)
-    point_thickness = circle_radius * 2
     
     # Default colors if none provided
     if colors is None:
         colors = [(0, 0, 255), (255, 0, 0), (0, 255, 0), (0, 165, 255)]  # R, B, G, O
     
-    if isinstance(edges, dict):
-        # If edges is a dictionary, convert to list
-        edge_lists = [edges[key] for key in sorted(edges.keys())]
+    for i, points in enumerate(_edge_lists(edges)):
+        # Радиус круга с толщиной обводки 2*r совпадает с прежней отрисовкой cv2.circle
+        _draw_points(visualization, points, colors[i % len(colors)], 2 * circle_radius)
+    
+    return visualization 
+
+
+def render_overlay(image, mesh_func, edges, n_lines=10, n_samples=100,
+                   color_horizontal=None, color_vertical=None, edge_colors=None,
+                   max_height=None, thickness_factor=2):
+    """
+    Renders the grid and boundary points overlay, optionally at display resolution.
+    
+    All grid lines are evaluated with a single mesh function call and drawn with
+    one cv2.polylines call per color. When max_height is given, the image is
+    downscaled first and the overlay is drawn on the small copy, so the
+    full-resolution image is never copied.
+    
+    Args:
+        image: The original image
+        mesh_func: The mesh transformation function
+        edges: Dictionary or list of edge points lists (in image coordinates)
+        n_lines: Number of grid lines in each direction
+        n_samples: Number of samples along each grid line
+        color_horizontal: Color for lines of constant s
+        color_vertical: Color for lines of constant t
+        edge_colors: List of colors for each edge
+        max_height: Maximum height of the rendered overlay (None - full size)
+        thickness_factor: Factor to multiply the base thickness for points
+    
+    Returns:
+        overlay: Image with grid and boundary points
+        scale: Scale factor from image coordinates to overlay coordinates
+    """
+    return render_regions_overlay(image, [mesh_func], [edges], n_lines, n_samples, color_horizontal,
+                                  color_vertical, edge_colors, max_height, thickness_factor)
+
+
+def render_regions_overlay(image, mesh_funcs, edges_list, n_lines=10, n_samples=100,
+                           color_horizontal=None, color_vertical=None, edge_colors=None,
+                           max_height=None, thickness_factor=2):
+    """
+    Same as render_overlay() for several regions of one image: the image is
+    downscaled once and the grid and points of every region are drawn on it.
+    
+    Args:
+        mesh_funcs: Mesh functions of the regions
+        edges_list: Edge points of the regions, in the same order
+        (other arguments as in render_overlay())
+    
+    Returns:
+        overlay: Image with the grids and boundary points of all regions
+        scale: Scale factor from image coordinates to overlay coordinates
+    """
+    if color_horizontal is None:
+        color_horizontal = CvColors.RED
+    if color_vertical is None:
+        color_vertical = CvColors.BLUE
+    if edge_colors is None:
+        edge_colors = [CvColors.RED, CvColors.BLUE, CvColors.GREEN, CvColors.ORANGE]
+    
+    height, width = image.shape[:2]
+    scale = 1.0
+    if max_height is not None and height > max_height:
+        scale = max_height / height
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        overlay = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
     else:
-        edge_lists = edges
+        overlay = image.copy()
     
-    for i, points in enumerate(edge_lists):
-        color = colors[i % len(colors)]
-        for point in points:
-            x, y = int(point[0]), int(point[1])
-            cv2.circle(visualization, (x, y), circle_radius, color, point_thickness)
+    # Толщины считаются от исходного размера, чтобы вид не зависел от масштаба
+    base_thickness = get_log_thickness(height, width)
+    thickness = max(1, int(round(base_thickness * scale)))
+    radius = max(2, int(round(2 * base_thickness * thickness_factor * scale)))
     
-    return visualization 
+    for mesh_func, edges in zip(mesh_funcs, edges_list):
+        s_lines, t_lines = sample_grid_lines(mesh_func, n_lines, n_samples)
+        _draw_polylines(overlay, s_lines, color_horizontal, thickness, scale)
+        _draw_polylines(overlay, t_lines, color_vertical, thickness, scale)
+        
+        for i, points in enumerate(_edge_lists(edges)):
+            _draw_points(overlay, points, edge_colors[i % len(edge_colors)], radius, scale)
+    
+    return overlay, scale
 
 
 def preprocess_edges(edge_top, edge_bottom, edge_left, edge_right):
@@ -255,15 +667,11 @@ def create_natural_spline(points: list[tuple|list[float, float]]):
     
     # Проверка на дубликаты и близкие значения параметра
     eps = 1e-10
-    unique_indices = [0]
-    
-    for i in range(1, len(t_normalized)):
-        if t_normalized[i] - t_normalized[unique_indices[-1]] > eps:
-            unique_indices.append(i)
+    unique_mask = np.insert(np.diff(t_normalized) > eps, 0, True)
     
     # Используем только уникальные значения
-    t_unique = t_normalized[unique_indices]
-    points_unique = points[unique_indices]
+    t_unique = t_normalized[unique_mask]
+    points_unique = points[unique_mask]
     
     # Если осталось менее 2 уникальных точек, не можем построить сплайн
     if len(t_unique) < 2:
@@ -285,6 +693,169 @@ def create_natural_spline(points: list[tuple|list[float, float]]):
 
     return spline_func
 
+def _simplify_polyline_mask(points, tolerance):
+    """Returns the mask of points kept by the Ramer-Douglas-Peucker algorithm."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    
+    # Итеративный обход вместо рекурсии: длинные ломаные не упираются в лимит стека
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        
+        segment = points[start + 1:end]
+        chord = points[end] - points[start]
+        chord_length = np.hypot(chord[0], chord[1])
+        rel = segment - points[start]
+        if chord_length > 0:
+            distances = np.abs(chord[0] * rel[:, 1] - chord[1] * rel[:, 0]) / chord_length
+        else:
+            distances = np.hypot(rel[:, 0], rel[:, 1])
+        
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    
+    return keep
+
+
+def simplify_polyline(points, tolerance=1.0):
+    """
+    Simplifies a polyline with the Ramer-Douglas-Peucker algorithm.
+    
+    Args:
+        points: Polyline points, array-like of shape [n, 2]
+        tolerance: Maximum distance from the removed points to the simplified polyline
+    
+    Returns:
+        simplified: Array of the kept points, the first and the last points are always kept
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+    return points[_simplify_polyline_mask(points, tolerance)]
+
+
+def average_polyline(points, step):
+    """
+    Averages a dense polyline over groups of consecutive points about step pixels long.
+    
+    The group size is estimated from the length of a coarse subsample of the
+    polyline, because the length of the dense noisy polyline itself is inflated
+    by the noise.
+    
+    Args:
+        points: Polyline points, array-like of shape [n, 2]
+        step: Approximate length of a group along the polyline in pixels
+    
+    Returns:
+        averaged: Array of group centroids; the first and the last points are kept as is
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+    
+    coarse = points[::max(1, len(points) // 200)]
+    length = np.hypot(*np.diff(np.vstack([coarse, points[-1:]]), axis=0).T).sum()
+    group_size = int(len(points) * step / length) if length > 0 else len(points)
+    if group_size < 2:
+        return points
+    
+    groups = np.arange(len(points)) // group_size
+    counts = np.bincount(groups)
+    x = np.bincount(groups, weights=points[:, 0]) / counts
+    y = np.bincount(groups, weights=points[:, 1]) / counts
+    
+    # Центры крайних групп заменяются исходными крайними точками
+    averaged = np.column_stack([x, y])
+    averaged[0] = points[0]
+    averaged[-1] = points[-1]
+    return averaged
+
+
+def create_smoothing_spline(points: list[tuple|list[float, float]], tolerance=1.0):
+    """
+    Creates a smoothing spline for a dense noisy polyline.
+    
+    The polyline is averaged over short groups of points to suppress noise and
+    simplified to the tolerance. The simplified vertices become the knots of a
+    least-squares cubic spline fitted to all averaged points, so the number of
+    knots follows the shape of the edge and the fit does not ring between them.
+    The end points are pinned, so the corners of the Coons patch stay consistent.
+    
+    Args:
+        points: Polyline points
+        tolerance: Allowed deviation from the input points in pixels
+    
+    Returns:
+        spline_func: Function of the natural parameter t in [0, 1] with the same
+            interface as create_natural_spline()
+    """
+    points = average_polyline(points, step=4 * tolerance)
+    
+    # Параметризация по длине дуги усредненной ломаной
+    distances = np.hypot(*np.diff(points, axis=0).T)
+    mask = np.insert(distances > 1e-10, 0, True)
+    points = points[mask]
+    
+    # Для кубического сплайна с узлами нужно минимум 4 точки
+    if len(points) < 4:
+        return create_natural_spline(points)
+    
+    t = np.insert(np.cumsum(distances[mask[1:]]), 0, 0)
+    t /= t[-1]
+    
+    # Узлы - вершины упрощенной ломаной; для устойчивости между соседними
+    # узлами должно быть не меньше 4 точек данных
+    knot_indices = np.flatnonzero(_simplify_polyline_mask(points, tolerance))[1:-1]
+    knots = []
+    last_index = 0
+    for index in knot_indices:
+        if index - last_index >= 4 and len(points) - 1 - index >= 4:
+            knots.append(t[index])
+            last_index = index
+    
+    # Большие веса закрепляют крайние точки
+    weights = np.ones(len(points))
+    weights[[0, -1]] = 1e3
+    
+    cs_x = LSQUnivariateSpline(t, points[:, 0], knots, w=weights, k=3)
+    cs_y = LSQUnivariateSpline(t, points[:, 1], knots, w=weights, k=3)
+    
+    def spline_func(t):
+        x = cs_x(t)
+        y = cs_y(t)
+        return np.column_stack([x, y]) if np.ndim(x) == 1 else np.array([[x, y]])
+    
+    return spline_func
+
+
+def create_edge_spline(points: list[tuple|list[float, float]], tolerance=1.0,
+                       dense_threshold=DENSE_EDGE_POINTS):
+    """
+    Creates a spline for a boundary edge choosing the fitting mode by point density.
+    
+    Sparse manually placed points are interpolated with a natural cubic spline,
+    dense polylines are simplified and fitted with a smoothing spline.
+    
+    Args:
+        points: Edge points
+        tolerance: Allowed deviation for dense polylines in pixels
+        dense_threshold: Number of points from which the edge is treated as dense
+    
+    Returns:
+        spline_func: Function of the natural parameter t in [0, 1]
+    """
+    if len(points) >= dense_threshold:
+        return create_smoothing_spline(points, tolerance)
+    return create_natural_spline(points)
+
+
 def build_mesh_function(edge_top, edge_bottom, edge_left, edge_right):
     """Возвращает функцию mesh_point(s, t)"""
     spline_top = create_natural_spline(edge_top)
@@ -356,16 +927,169 @@ def build_vectorized_mesh_function(edge_top, edge_bottom, edge_left, edge_right)
 
     return mesh_points
 
-def build_fast_mesh_function(edge_top, edge_bottom, edge_left, edge_right):
+def sample_edge(points, tolerance=1.0, num_samples=100):
+    """
+    Fits the edge spline and samples it at uniformly spaced values of the natural parameter.
+    
+    Returns:
+        samples: Array of shape [num_samples, 2]
+    """
+    spline = create_edge_spline(points, tolerance)
+    return np.asarray(spline(np.linspace(0, 1, num_samples))).reshape(num_samples, 2)
+
+
+class EdgeSampleCache:
+    """
+    LRU cache of sampled edge splines keyed by the edge points.
+    
+    While a point is dragged only its edge (and the edges sharing a moved
+    corner) changes, so the other edges are taken from the cache instead of
+    being refitted.
+    """
+    
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+    
+    def sample(self, points, tolerance=1.0, num_samples=100):
+        key = (tuple(tuple(p) for p in points), tolerance, num_samples)
+        samples = self._entries.get(key)
+        if samples is None:
+            samples = sample_edge(points, tolerance, num_samples)
+            self._entries[key] = samples
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return samples
+
+
+def edge_deviation(points):
+    """
+    Maximum distance of the edge points from the chord between its end points.
+    
+    Returns:
+        deviation: Distance in pixels; inf if the end points coincide or the
+            points go back along the chord (the edge is not a straight segment)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    chord = points[-1] - points[0]
+    length = np.hypot(*chord)
+    if length == 0:
+        return np.inf
+    offsets = points - points[0]
+    along = offsets @ chord / length
+    if np.any(np.diff(along) < 0):
+        return np.inf
+    return float(np.max(np.abs(offsets[:, 0] * chord[1] - offsets[:, 1] * chord[0])) / length)
+
+
+class BilinearMesh:
+    """
+    Mesh function of a Coons patch with four straight edges.
+    
+    With straight edges every term of the Coons formula is bilinear in (s, t),
+    so the patch is the bilinear map of its four corner values:
+    
+        P(s, t) = A + B s + C t + D s t
+    
+    The maps are computed from two outer products without spline queries, and
+    when the map is close to a homography (parallelograms, rotated or slightly
+    keystoned pages) dewarp_image() uses cv2.warpPerspective without any maps.
+    """
+    
+    def __init__(self, corners):
+        """
+        Args:
+            corners: Patch values at (s, t) = (0, 0), (1, 0), (0, 1), (1, 1)
+                (bottom-left, bottom-right, top-left, top-right), shape [4, 2]
+        """
+        self.corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        p00, p10, p01, p11 = self.corners
+        self.coefficients = np.stack([p00, p10 - p00, p01 - p00, p11 - p10 - p01 + p00])
+        self.projective_error = self._projective_error()
+    
+    @classmethod
+    def from_edges(cls, edge_top, edge_bottom, edge_left, edge_right):
+        """
+        Coons patch of the chords of the edges (the first and last point of each).
+        
+        With the corners taken from the top and bottom edges, as in
+        build_fast_mesh_function(), the top and bottom chords cancel at the
+        corners and the patch corners are the end points of the side edges;
+        after preprocess_edges() they coincide with the top and bottom ends.
+        """
+        return cls([edge_left[0], edge_right[0], edge_left[-1], edge_right[-1]])
+    
+    def __call__(self, s, t):
+        a, b, c, d = self.coefficients
+        s = np.asarray(s, dtype=np.float64)[..., None]
+        t = np.asarray(t, dtype=np.float64)[..., None]
+        return (a + b * s + c * t + d * s * t).astype(np.float32)
+    
+    def maps(self, width, height, y0=0, y1=None, x0=0, x1=None):
+        """Same as compute_remap_maps_region(), as two outer products."""
+        y1 = height if y1 is None else y1
+        x1 = width if x1 is None else x1
+        s = np.arange(x0, x1, dtype=np.float64) / (width - 1)
+        t = (height - 1 - np.arange(y0, y1, dtype=np.float64)) / (height - 1)
+        a, b, c, d = self.coefficients
+        maps = []
+        for axis in range(2):
+            row = (a[axis] + b[axis] * s).astype(np.float32)
+            slope = (c[axis] + d[axis] * s).astype(np.float32)
+            maps.append(row[None, :] + t.astype(np.float32)[:, None] * slope[None, :])
+        return maps[0], maps[1]
+    
+    def _projective_matrix(self, x_max, y_max):
+        # Углы результата (x, y) -> углы патча; строка y = 0 соответствует t = 1
+        dst = np.float32([[0, y_max], [x_max, y_max], [0, 0], [x_max, 0]])
+        return cv2.getPerspectiveTransform(dst, self.corners.astype(np.float32))
+    
+    def _projective_error(self, n_samples=17):
+        """Maximum distance between the bilinear map and the homography of the same corners."""
+        try:
+            matrix = self._projective_matrix(1.0, 1.0)
+        except cv2.error:
+            return np.inf
+        s, t = np.meshgrid(np.linspace(0, 1, n_samples), np.linspace(0, 1, n_samples))
+        points = np.stack([s.ravel(), 1 - t.ravel()], axis=-1)[None].astype(np.float64)
+        projected = cv2.perspectiveTransform(points, matrix)[0]
+        if not np.all(np.isfinite(projected)):
+            return np.inf
+        bilinear = self(s.ravel(), t.ravel())
+        return float(np.max(np.hypot(*(projected - bilinear).T)))
+    
+    def homography(self, width, height, tolerance=PROJECTIVE_TOLERANCE):
+        """
+        Homography from output pixels to source pixels.
+        
+        Returns:
+            matrix: 3x3 matrix, or None if the map differs from the bilinear
+                one by more than tolerance pixels or the output is degenerate
+        """
+        if width < 2 or height < 2 or self.projective_error > tolerance:
+            return None
+        return self._projective_matrix(width - 1, height - 1)
+
+
+def build_fast_mesh_function(edge_top, edge_bottom, edge_left, edge_right, tolerance=1.0, edge_cache=None,
+                             straight_tolerance=STRAIGHT_EDGE_TOLERANCE):
     """
     Создает быструю функцию меша для применения к массиву точек.
     Возвращает функцию, которая принимает весь массив нормализованных координат.
+    Плотные границы (от DENSE_EDGE_POINTS точек) упрощаются и аппроксимируются
+    сглаживающими сплайнами с допуском tolerance пикселей.
+    С edge_cache (EdgeSampleCache) заново строятся сплайны только изменившихся границ.
+    Если все границы прямые (отклонение от хорды не больше straight_tolerance
+    пикселей), сплайны не строятся и возвращается BilinearMesh;
+    straight_tolerance=None отключает эту проверку.
     """
-    # Создаем сплайны для всех границ
-    spline_top = create_natural_spline(edge_top)
-    spline_bottom = create_natural_spline(edge_bottom)
-    spline_left = create_natural_spline(edge_left)
-    spline_right = create_natural_spline(edge_right)
+    edges = (edge_top, edge_bottom, edge_left, edge_right)
+    if straight_tolerance is not None and all(edge_deviation(edge) <= straight_tolerance for edge in edges):
+        return BilinearMesh.from_edges(*edges)
+
+    sample = edge_cache.sample if edge_cache is not None else sample_edge
 
     # Вычисляем угловые точки напрямую из входных данных
     # Это более надежно, чем использовать сплайны для краевых точек
@@ -374,22 +1098,33 @@ def build_fast_mesh_function(edge_top, edge_bottom, edge_left, edge_right):
     P01 = np.array(edge_top[0])      # Левый верхний
     P11 = np.array(edge_top[-1])     # Правый верхний
 
-    print(f"Угловые точки:")
-    print(f"P00 (левый нижний): {P00}")
-    print(f"P10 (правый нижний): {P10}")
-    print(f"P01 (левый верхний): {P01}")
-    print(f"P11 (правый верхний): {P11}")
-
     # Предвычисляем точки сплайнов для более быстрой интерполяции
     num_samples = 100  # Количество точек в предвычисленных сплайнах
     s_values = np.linspace(0, 1, num_samples)
     t_values = np.linspace(0, 1, num_samples)
     
     # Используем предвычисленные точки для каждой границы
-    top_points = np.array([spline_top(s)[0] for s in s_values])
-    bottom_points = np.array([spline_bottom(s)[0] for s in s_values])
-    left_points = np.array([spline_left(t)[0] for t in t_values])
-    right_points = np.array([spline_right(t)[0] for t in t_values])
+    top_points = sample(edge_top, tolerance, num_samples)
+    bottom_points = sample(edge_bottom, tolerance, num_samples)
+    left_points = sample(edge_left, tolerance, num_samples)
+    right_points = sample(edge_right, tolerance, num_samples)
+
+    # Создаем интерполирующие функции для быстрого доступа к точкам
+    # Используем линейную интерполяцию для скорости.
+    # Интерполяторы строятся один раз, а не при каждом вызове функции меша
+    
+    # Создаем регулярные сетки для интерполяции
+    # Интерполяторы для верхней и нижней границ (функция от s)
+    interp_top_x = RegularGridInterpolator((s_values,), top_points[:, 0], bounds_error=False, fill_value=None)
+    interp_top_y = RegularGridInterpolator((s_values,), top_points[:, 1], bounds_error=False, fill_value=None)
+    interp_bottom_x = RegularGridInterpolator((s_values,), bottom_points[:, 0], bounds_error=False, fill_value=None)
+    interp_bottom_y = RegularGridInterpolator((s_values,), bottom_points[:, 1], bounds_error=False, fill_value=None)
+    
+    # Интерполяторы для левой и правой границ (функция от t)
+    interp_left_x = RegularGridInterpolator((t_values,), left_points[:, 0], bounds_error=False, fill_value=None)
+    interp_left_y = RegularGridInterpolator((t_values,), left_points[:, 1], bounds_error=False, fill_value=None)
+    interp_right_x = RegularGridInterpolator((t_values,), right_points[:, 0], bounds_error=False, fill_value=None)
+    interp_right_y = RegularGridInterpolator((t_values,), right_points[:, 1], bounds_error=False, fill_value=None)
 
     def apply_mesh_to_grid(s:np.ndarray, t:np.ndarray):
         """
@@ -409,22 +1144,6 @@ def build_fast_mesh_function(edge_top, edge_bottom, edge_left, edge_right):
         
         height, width = t.shape
         
-        # Создаем интерполирующие функции для быстрого доступа к точкам
-        # Используем линейную интерполяцию для скорости
-        
-        # Создаем регулярные сетки для интерполяции
-        # Интерполяторы для верхней и нижней границ (функция от s)
-        interp_top_x = RegularGridInterpolator((s_values,), top_points[:, 0], bounds_error=False, fill_value=None)
-        interp_top_y = RegularGridInterpolator((s_values,), top_points[:, 1], bounds_error=False, fill_value=None)
-        interp_bottom_x = RegularGridInterpolator((s_values,), bottom_points[:, 0], bounds_error=False, fill_value=None)
-        interp_bottom_y = RegularGridInterpolator((s_values,), bottom_points[:, 1], bounds_error=False, fill_value=None)
-        
-        # Интерполяторы для левой и правой границ (функция от t)
-        interp_left_x = RegularGridInterpolator((t_values,), left_points[:, 0], bounds_error=False, fill_value=None)
-        interp_left_y = RegularGridInterpolator((t_values,), left_points[:, 1], bounds_error=False, fill_value=None)
-        interp_right_x = RegularGridInterpolator((t_values,), right_points[:, 0], bounds_error=False, fill_value=None)
-        interp_right_y = RegularGridInterpolator((t_values,), right_points[:, 1], bounds_error=False, fill_value=None)
-
         # Подготовка входных данных для интерполяторов
         s_flat = s.reshape(-1, 1)
         t_flat = t.reshape(-1, 1)
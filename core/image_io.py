@@ -0,0 +1,209 @@
+import base64
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+
+# umask процесса: читается один раз при импорте, потому что os.umask() можно только
+# заменить и вернуть обратно, а это небезопасно при записи файлов из других потоков
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Форматы для быстрой передачи изображений в UI
+DISPLAY_FORMATS = {
+    ".jpg": cv2.IMWRITE_JPEG_QUALITY,
+    ".webp": cv2.IMWRITE_WEBP_QUALITY,
+}
+
+# Форматы сохранения результата
+EXPORT_EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff"]
+
+# Методы сжатия TIFF (значения тега Compression из libtiff)
+TIFF_COMPRESSION = {
+    "none": 1,
+    "lzw": 5,
+    "deflate": 8,
+}
+
+# Параметры сохранения по умолчанию
+DEFAULT_EXPORT_OPTIONS = {
+    "png_compression": 3,
+    "jpeg_quality": 95,
+    "webp_quality": 95,
+    "tiff_compression": "lzw",
+    "png_bilevel": False,
+}
+
+# Фоновый поток для кодирования больших изображений при сохранении
+_export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-export")
+
+
+def resize_to_height(image, max_height=None):
+    """
+    Downscales an image so that its height does not exceed max_height.
+
+    Args:
+        image: Input image
+        max_height: Maximum height of the result (None - keep the original size)
+
+    Returns:
+        resized: Downscaled image (the input itself if no resize is needed)
+        scale: Scale factor from the input to the result
+    """
+    height, width = image.shape[:2]
+    if max_height is None or height <= max_height:
+        return image, 1.0
+
+    scale = max_height / height
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def encode_image(image, ext=".jpg", quality=85):
+    """
+    Encodes an image into an in-memory buffer.
+
+    Args:
+        image: Image to encode
+        ext: Target format extension (".jpg" or ".webp")
+        quality: Encoding quality in the range [0, 100]
+
+    Returns:
+        data: Encoded image bytes
+    """
+    if ext not in DISPLAY_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат отображения: {ext}")
+
+    ok, buffer = cv2.imencode(ext, image, [DISPLAY_FORMATS[ext], int(quality)])
+    if not ok:
+        raise ValueError(f"Не удалось закодировать изображение в формат {ext}")
+    return buffer.tobytes()
+
+
+def encode_image_base64(image, max_height=None, ext=".jpg", quality=85):
+    """
+    Encodes an image at display resolution into a base64 string for ft.Image.src_base64.
+
+    Args:
+        image: Image to encode
+        max_height: Maximum height of the encoded image (None - full size)
+        ext: Target format extension (".jpg" or ".webp")
+        quality: Encoding quality in the range [0, 100]
+
+    Returns:
+        data: Base64-encoded image
+    """
+    display_image, _ = resize_to_height(image, max_height)
+    return base64.b64encode(encode_image(display_image, ext, quality)).decode("ascii")
+
+
+def export_params(ext, png_compression=3, jpeg_quality=95, webp_quality=95, tiff_compression="lzw",
+                  png_bilevel=False):
+    """
+    Builds cv2.imwrite parameters for the chosen output format.
+
+    Args:
+        ext: Output format extension
+        png_compression: PNG compression level in the range [0, 9]
+        jpeg_quality: JPEG quality in the range [0, 100]
+        webp_quality: WebP quality in the range [1, 100] (above 100 - lossless)
+        tiff_compression: TIFF compression method ("none", "lzw" or "deflate")
+        png_bilevel: Write a binary (0/255) single-channel image as a 1-bit PNG
+
+    Returns:
+        params: Flat list of cv2 encoding parameters
+    """
+    ext = ext.lower()
+    if ext not in EXPORT_EXTENSIONS:
+        raise ValueError(f"Неподдерживаемый формат сохранения: {ext}")
+
+    if ext == ".png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+        if png_bilevel:
+            params += [cv2.IMWRITE_PNG_BILEVEL, 1]
+        return params
+    if ext in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    if ext == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(webp_quality)]
+    if tiff_compression not in TIFF_COMPRESSION:
+        raise ValueError(f"Неизвестный метод сжатия TIFF: {tiff_compression}")
+    return [cv2.IMWRITE_TIFF_COMPRESSION, TIFF_COMPRESSION[tiff_compression]]
+
+
+def encode_export(image, ext, **options):
+    """
+    Encodes an image into an export format in memory.
+
+    Args:
+        image: Image to encode
+        ext: Output format extension
+        **options: Format options, see export_params()
+
+    Returns:
+        data: Encoded file content
+    """
+    ext = ext.lower()
+    ok, buffer = cv2.imencode(ext, image, export_params(ext, **options))
+    if not ok:
+        raise ValueError(f"Не удалось закодировать изображение в формат {ext}")
+    return buffer.tobytes()
+
+
+def write_atomic(path, data):
+    """
+    Writes bytes to a temporary file in the same directory and renames it into place.
+
+    Readers never see a partially written file: an interrupted write leaves
+    the previous content (or no file) behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.splitext(path)[1], dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp создает файл с правами 0600; результат получает обычные права по umask, как при open()
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_image(path, image, **options):
+    """
+    Encodes a full-resolution image straight into the format chosen by the file extension.
+    Uses cv2.imencode so that non-ASCII paths work on every platform.
+
+    Args:
+        path: Output file path; the format is chosen by the extension
+        image: Image to write
+        **options: Format options, see export_params()
+    """
+    data = encode_export(image, os.path.splitext(path)[1] or ".png", **options)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_image_async(path, image, on_done=None, **options):
+    """
+    Writes an image on a background thread, so encoding a large result does not block the UI.
+
+    Args:
+        path: Output file path; the format is chosen by the extension
+        image: Image to write
+        on_done: Callback called with the exception or None when writing finishes
+        **options: Format options, see export_params()
+
+    Returns:
+        future: concurrent.futures.Future of the write
+    """
+    future = _export_executor.submit(write_image, path, image, **options)
+    if on_done is not None:
+        future.add_done_callback(lambda f: on_done(f.exception()))
+    return future
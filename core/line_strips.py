@@ -0,0 +1,196 @@
+import json
+import os
+import numpy as np
+import cv2
+from .image_io import write_image
+from .ocr_output import to_grayscale
+
+
+class LineStrip:
+    """A text line strip of the dewarped image with its polygon in the source image."""
+
+    def __init__(self, index, y0, y1, image, polygon):
+        """
+        Args:
+            index: Line number from the top
+            y0, y1: Row range of the strip in the dewarped image
+            image: Strip of the dewarped image (a view, rows y0:y1)
+            polygon: Strip outline in source image coordinates, float32 [n, 2]:
+                the upper constant-t curve left to right, then the lower one right to left
+        """
+        self.index = index
+        self.y0 = y0
+        self.y1 = y1
+        self.image = image
+        self.polygon = polygon
+
+    def as_dict(self):
+        return {
+            "index": self.index,
+            "y0": int(self.y0),
+            "y1": int(self.y1),
+            "polygon": self.polygon.round(2).tolist(),
+        }
+
+
+def ink_profile(image, smooth=3):
+    """
+    Horizontal projection profile: the fraction of ink pixels in every row.
+
+    Dark pixels are separated with Otsu's threshold; a constant contribution of
+    dark borders (pixels outside the source) is removed by subtracting the
+    profile baseline.
+
+    Args:
+        image: Dewarped image (color, grayscale or binary)
+        smooth: Size of the moving average along the rows
+
+    Returns:
+        profile: float32 array [height]
+    """
+    gray = to_grayscale(image)
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    profile = cv2.reduce(ink, 1, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel()
+    if smooth > 1:
+        profile = np.convolve(profile, np.ones(smooth, dtype=np.float32) / smooth, mode="same")
+    return profile - np.percentile(profile, 5)
+
+
+def find_text_lines(profile, level=0.1, min_height=4, min_gap=None):
+    """
+    Finds text line row ranges in a projection profile.
+
+    Args:
+        profile: Projection profile from ink_profile()
+        level: Row threshold as a fraction of the profile peak
+        min_height: Lines lower than this are dropped (noise, dust)
+        min_gap: Gaps smaller than this are merged (default - a fifth of the median line height)
+
+    Returns:
+        lines: List of (y0, y1) row ranges, top to bottom
+    """
+    peak = np.percentile(profile, 99)
+    if peak <= 0:
+        return []
+    rows = profile > level * peak
+
+    # Начала и концы участков строк с текстом
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], rows.view(np.int8), [0]])))
+    runs = list(zip(edges[::2], edges[1::2]))
+    if not runs:
+        return []
+
+    if min_gap is None:
+        min_gap = max(1, int(np.median([y1 - y0 for y0, y1 in runs]) / 5))
+    merged = [list(runs[0])]
+    for y0, y1 in runs[1:]:
+        if y0 - merged[-1][1] < min_gap:
+            merged[-1][1] = y1
+        else:
+            merged.append([y0, y1])
+    return [(int(y0), int(y1)) for y0, y1 in merged if y1 - y0 >= min_height]
+
+
+def strip_polygon(mesh_func, width, height, y0, y1, n_samples=32):
+    """
+    Outline of output rows [y0, y1) in source coordinates.
+
+    Rows of the dewarped image are the constant-t lines of the mesh, so the
+    strip boundaries are the mesh curves at the t of its first and last rows.
+    """
+    s = np.linspace(0, 1, n_samples)
+    t_top = (height - 1 - y0) / (height - 1)
+    t_bottom = (height - 1 - (y1 - 1)) / (height - 1)
+    s_values = np.concatenate([s, s[::-1]])
+    t_values = np.concatenate([np.full(n_samples, t_top), np.full(n_samples, t_bottom)])
+    points = np.asarray(mesh_func(s_values[None, :], t_values[None, :]))[0]
+    return points.astype(np.float32)
+
+
+def extract_line_strips(image, mesh_func, padding=None, level=0.1, min_height=4, n_samples=32):
+    """
+    Cuts a dewarped image into text line strips for OCR.
+
+    After dewarping the constant-t lines of the mesh are horizontal, so text
+    lines are found with a one-dimensional horizontal projection profile.
+    Neighbouring strips are split at the profile minimum between the lines;
+    every strip gets its outline in the source image through the mesh.
+
+    Args:
+        image: Dewarped image (color, grayscale or binary)
+        mesh_func: The mesh function used for dewarping
+        padding: Rows added above and below a line (default - a third of the median line height)
+        level: Row threshold as a fraction of the profile peak
+        min_height: Minimum line height in rows
+        n_samples: Points per polygon side
+
+    Returns:
+        strips: List of LineStrip, top to bottom
+    """
+    height, width = image.shape[:2]
+    profile = ink_profile(image)
+    lines = find_text_lines(profile, level, min_height)
+    if not lines:
+        return []
+    if padding is None:
+        padding = max(1, int(np.median([y1 - y0 for y0, y1 in lines]) / 3))
+
+    # Границы между соседними строками - минимум профиля в промежутке
+    bounds = [0]
+    for (_, prev_end), (next_start, _) in zip(lines[:-1], lines[1:]):
+        bounds.append(prev_end + int(np.argmin(profile[prev_end:next_start])) if next_start > prev_end else prev_end)
+    bounds.append(height)
+
+    strips = []
+    for index, (y0, y1) in enumerate(lines):
+        top = max(bounds[index], y0 - padding)
+        bottom = min(bounds[index + 1], y1 + padding)
+        polygon = strip_polygon(mesh_func, width, height, top, bottom, n_samples)
+        strips.append(LineStrip(index, top, bottom, image[top:bottom], polygon))
+    return strips
+
+
+def ocr_strips(strips, ocr_func, executor=None, timeout=None):
+    """
+    Runs OCR on line strips in parallel.
+
+    Args:
+        strips: List of LineStrip
+        ocr_func: Function of a strip image returning the recognized text
+            (any engine, e.g. a wrapper around pytesseract)
+        executor: BoundedExecutor or concurrent.futures executor
+            (default - the shared pool from core.workers)
+        timeout: Maximum time to wait for a free slot of a BoundedExecutor
+
+    Returns:
+        texts: Results of ocr_func in the order of the strips
+    """
+    if executor is None:
+        from .workers import get_shared_executor
+        executor = get_shared_executor()
+    if hasattr(executor, "max_workers"):
+        futures = [executor.submit(ocr_func, strip.image, timeout=timeout) for strip in strips]
+    else:
+        futures = [executor.submit(ocr_func, strip.image) for strip in strips]
+    return [future.result() for future in futures]
+
+
+def save_line_strips(strips, out_dir, ext=".png"):
+    """
+    Writes strip images (strip_NNN.png) and strips.json with their rows and source polygons.
+
+    Returns:
+        paths: Paths of the strip images
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths, items = [], []
+    for strip in strips:
+        path = os.path.join(out_dir, f"strip_{strip.index:03d}{ext}")
+        write_image(path, strip.image)
+        item = strip.as_dict()
+        item["file"] = os.path.basename(path)
+        paths.append(path)
+        items.append(item)
+    with open(os.path.join(out_dir, "strips.json"), "w", encoding="utf-8") as f:
+        json.dump({"strips": items}, f, indent=2)
+    return paths
@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import cv2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Память на пиксель полосы результата: промежуточные массивы функции меша (float64),
+# карты remap (float32) и полоса результата; измерено tracemalloc на
+# compute_remap_maps_region() + cv2.remap
+STRIP_BYTES_PER_PIXEL = 160
+
+# Минимальная высота полосы; при нехватке памяти полоса уменьшается вдвое до этого предела
+MIN_STRIP_HEIGHT = 16
+
+
+def rss_bytes():
+    """Current resident set size of the process in bytes (None if unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Без /proc доступен только пиковый RSS (в Linux в КБ, в macOS в байтах)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+    return None
+
+
+class StageMemory:
+    """Memory and time of one stage, accumulated over all its runs (e.g. strips)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.traced_peak = 0
+        self.rss_peak = None
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "runs": self.runs,
+            "seconds": self.seconds,
+            "traced_peak_mb": self.traced_peak / 1024 ** 2,
+            "rss_peak_mb": self.rss_peak / 1024 ** 2 if self.rss_peak is not None else None,
+        }
+
+
+class MemoryProfiler:
+    """
+    Per-stage peak memory accounting.
+
+    Every stage records the peak of the memory traced by tracemalloc (NumPy
+    and cv2 arrays are allocated through the traced allocator) above the level
+    at the stage start, and the peak RSS sampled by a background thread. RSS
+    also covers native allocations invisible to tracemalloc, tracemalloc
+    attributes the growth to a stage precisely.
+
+    Both counters are process-wide, so every stage keeps its own peaks: when
+    a stage starts or ends, the tracemalloc peak since the previous boundary
+    is credited to all running stages before it is reset, and every RSS
+    sample is credited to all running stages. A stage starting on another
+    thread therefore never erases the peak of a running one. The numbers of
+    stages running at the same time (the pipeline runs the mesh, overlay and
+    warp stages concurrently) include the allocations of their neighbours;
+    run the stages one at a time to attribute memory exactly.
+    """
+
+    def __init__(self, sample_interval=0.005, trace=True):
+        """
+        Args:
+            sample_interval: RSS sampling period in seconds
+            trace: Use tracemalloc (it slows down pure Python code)
+        """
+        self.sample_interval = sample_interval
+        self.trace = trace
+        self.stages = {}
+        self._lock = threading.Lock()
+        # Пиковые значения выполняющихся этапов: [traced, rss] для каждого запуска
+        self._active = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started_tracing = False
+
+    def start(self):
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if rss_bytes() is not None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = rss_bytes()
+            with self._lock:
+                for peaks in self._active.values():
+                    if peaks[1] is None or rss > peaks[1]:
+                        peaks[1] = rss
+
+    def _fold_traced_peak(self):
+        # Пик tracemalloc с предыдущей границы этапа относится ко всем выполняющимся этапам;
+        # вызывается под self._lock
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            for peaks in self._active.values():
+                peaks[0] = max(peaks[0], peak)
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager accounting the memory and time of a stage."""
+        token = object()
+        tracing = tracemalloc.is_tracing()
+        with self._lock:
+            self._fold_traced_peak()
+            base = tracemalloc.get_traced_memory()[0] if tracing else 0
+            peaks = self._active[token] = [base, rss_bytes()]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rss = rss_bytes()
+            with self._lock:
+                self._fold_traced_peak()
+                del self._active[token]
+                traced_peak = peaks[0] - base if tracing else 0
+                rss_peak = max(peaks[1], rss) if rss is not None else None
+                record = self.stages.setdefault(name, StageMemory(name))
+                record.runs += 1
+                record.seconds += elapsed
+                record.traced_peak = max(record.traced_peak, traced_peak)
+                if rss_peak is not None:
+                    record.rss_peak = max(record.rss_peak or 0, rss_peak)
+
+    def report(self):
+        """List of per-stage dicts in the order the stages first ran."""
+        return [record.as_dict() for record in self.stages.values()]
+
+    def format_report(self):
+        lines = []
+        for item in self.report():
+            rss = f"{item['rss_peak_mb']:.0f} МБ" if item["rss_peak_mb"] is not None else "н/д"
+            lines.append(f"{item['stage']}: {item['seconds'] * 1000:.0f} мс, прирост (tracemalloc) "
+                         f"{item['traced_peak_mb']:.1f} МБ, пиковый RSS {rss}, запусков {item['runs']}")
+        return "\n".join(lines)
+
+
+def profile_stage(profiler, name):
+    """profiler.stage(name), or a no-op context when profiler is None."""
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+def plan_strip_height(height, width, channels=3, output_size=None, budget_bytes=None,
+                      bytes_per_pixel=STRIP_BYTES_PER_PIXEL, min_strip_height=MIN_STRIP_HEIGHT):
+    """
+    Picks the output strip height for dewarping within a memory budget.
+
+    The input image, the result and a possible prefiltered copy of the input
+    are held for the whole run; what remains of the budget is given to the
+    per-strip maps and mesh intermediates.
+
+    Args:
+        height, width: Input image size
+        channels: Number of image channels
+        output_size: Output size (width, height), defaults to the input size
+        budget_bytes: Memory budget in bytes (None - no limit, a single strip)
+        bytes_per_pixel: Memory per output pixel of a strip
+        min_strip_height: Smallest allowed strip height
+
+    Returns:
+        strip_height: Rows per strip, at most the output height
+    """
+    out_width, out_height = output_size or (width, height)
+    if budget_bytes is None:
+        return out_height
+    fixed = 2 * height * width * channels + out_height * out_width * channels
+    rows = (budget_bytes - fixed) // (out_width * bytes_per_pixel)
+    if rows < min(min_strip_height, out_height):
+        raise MemoryError(
+            f"Обработка требует не менее {(fixed + min_strip_height * out_width * bytes_per_pixel) / 1024 ** 2:.0f} МБ, "
+            f"бюджет памяти {budget_bytes / 1024 ** 2:.0f} МБ"
+        )
+    return int(min(rows, out_height))
+
+
+def _is_out_of_memory(ex):
+    if isinstance(ex, MemoryError):
+        return True
+    return isinstance(ex, cv2.error) and ex.code == cv2.Error.StsNoMem
+
+
+def run_with_strip_fallback(func, strip_height, min_strip_height=MIN_STRIP_HEIGHT):
+    """
+    Runs func(strip_height), halving the strip height on out-of-memory errors.
+
+    Args:
+        func: Function of the strip height
+        strip_height: Initial strip height (from plan_strip_height())
+        min_strip_height: The error is re-raised below this height
+
+    Returns:
+        result: Result of func
+    """
+    while True:
+        try:
+            return func(strip_height)
+        except (MemoryError, cv2.error) as ex:
+            if not _is_out_of_memory(ex) or strip_height <= min_strip_height:
+                raise
+            strip_height = max(min_strip_height, strip_height // 2)
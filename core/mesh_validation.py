@@ -0,0 +1,171 @@
+import numpy as np
+from .grid_utils import sample_grid_lines
+from .warp_models import DEFAULT_WARP_MODEL, build_warp_model
+
+
+class MeshValidationError(ValueError):
+    """Raised when an annotation produces an invalid mesh."""
+
+    def __init__(self, report):
+        super().__init__("; ".join(report.issues))
+        self.report = report
+
+
+class MeshReport:
+    """
+    Result of the pre-flight mesh check.
+
+    Attributes:
+        issues: Human-readable descriptions of the found problems
+        folded_cells: Number of coarse grid cells with flipped orientation
+        min_jacobian: Smallest Jacobian determinant relative to the median one
+        self_intersections: Number of crossing pairs of boundary segments
+    """
+
+    def __init__(self):
+        self.issues = []
+        self.folded_cells = 0
+        self.min_jacobian = None
+        self.self_intersections = 0
+
+    @property
+    def ok(self):
+        return not self.issues
+
+    def __repr__(self):
+        return f"MeshReport(ok={self.ok}, issues={self.issues!r})"
+
+
+def _cell_areas(points):
+    """
+    Signed areas of the coarse grid cells.
+
+    Args:
+        points: Mesh points of shape [n_s, n_t, 2] (first axis - s, second - t)
+
+    Returns:
+        areas: Array of shape [n_s - 1, n_t - 1]
+    """
+    p00 = points[:-1, :-1]
+    p10 = points[1:, :-1]
+    p11 = points[1:, 1:]
+    p01 = points[:-1, 1:]
+    # Формула площади Гаусса для четырехугольника p00 -> p10 -> p11 -> p01
+    quad = np.stack([p00, p10, p11, p01], axis=0)
+    x, y = quad[..., 0], quad[..., 1]
+    return 0.5 * (x * np.roll(y, -1, axis=0) - np.roll(x, -1, axis=0) * y).sum(axis=0)
+
+
+def _count_segment_crossings(polygon):
+    """
+    Counts crossing pairs of non-adjacent segments of a closed polygon.
+
+    Args:
+        polygon: Polygon vertices of shape [n, 2] (not repeated at the end)
+
+    Returns:
+        count: Number of crossing segment pairs
+    """
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    n = len(a)
+
+    def orient(p, q, r):
+        return np.sign((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1])
+                       - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+
+    ai, bi = a[:, None], b[:, None]
+    aj, bj = a[None, :], b[None, :]
+    crosses = ((orient(ai, bi, aj) * orient(ai, bi, bj) < 0)
+               & (orient(aj, bj, ai) * orient(aj, bj, bi) < 0))
+
+    # Соседние отрезки и сам отрезок не учитываются
+    i, j = np.triu_indices(n, k=2)
+    adjacent = (i == 0) & (j == n - 1)
+    return int(crosses[i[~adjacent], j[~adjacent]].sum())
+
+
+def validate_mesh(edge_top, edge_bottom, edge_left, edge_right,
+                  grid_size=33, min_edge_length=5.0, min_jacobian_ratio=0.02, model=DEFAULT_WARP_MODEL):
+    """
+    Cheap pre-flight check of an annotation before the full-resolution remap.
+
+    Evaluates the mesh of the warp model on a coarse grid and reports degenerate edges,
+    fold-overs (cells with flipped orientation or a vanishing Jacobian),
+    self-intersections of the boundary and a mirrored orientation, which
+    usually means swapped edges or misassigned corners.
+
+    Args:
+        edge_top, edge_bottom, edge_left, edge_right: Preprocessed edge points
+        grid_size: Number of coarse grid lines in each direction
+        min_edge_length: Minimum length of an edge in pixels
+        min_jacobian_ratio: Minimum Jacobian relative to the median one
+        model: Warp model, one of core.warp_models.WARP_MODELS; the models share
+            the boundary but may fold differently inside the region
+
+    Returns:
+        report: MeshReport with the found issues
+    """
+    report = MeshReport()
+    names = {"edge_top": edge_top, "edge_bottom": edge_bottom,
+             "edge_left": edge_left, "edge_right": edge_right}
+
+    # Вырожденные границы
+    for name, points in names.items():
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        length = np.hypot(*np.diff(points, axis=0).T).sum() if len(points) > 1 else 0.0
+        if length < min_edge_length:
+            report.issues.append(f"Граница {name} вырождена (длина {length:.1f} пикс.)")
+    if not report.ok:
+        return report
+
+    mesh_func = build_warp_model(model, edge_top, edge_bottom, edge_left, edge_right)
+    s_lines, _ = sample_grid_lines(mesh_func, grid_size, grid_size)
+    points = np.asarray(s_lines, dtype=np.float64)
+
+    # Ориентация и складки: в координатах изображения ось y направлена вниз,
+    # а параметр t растет снизу вверх, поэтому у правильной сетки площади ячеек
+    # отрицательны; знак меняется, чтобы дальше работать с положительными площадями
+    areas = -_cell_areas(points)
+    median_area = np.median(areas)
+    if median_area < 0:
+        report.issues.append("Сетка зеркально отражена: вероятно, перепутаны границы или угловые точки")
+        areas = -areas
+        median_area = -median_area
+
+    if median_area <= 0:
+        report.issues.append("Сетка вырождена: площадь ячеек близка к нулю")
+        return report
+
+    report.min_jacobian = float(areas.min() / median_area)
+    report.folded_cells = int((areas <= 0).sum())
+    if report.folded_cells:
+        report.issues.append(f"Сетка складывается: {report.folded_cells} ячеек с обратной ориентацией")
+    elif report.min_jacobian < min_jacobian_ratio:
+        report.issues.append(f"Сетка почти вырождена: минимальный якобиан {report.min_jacobian:.3f} от медианного")
+
+    # Самопересечения границы: обход bottom -> right -> top -> left
+    boundary = np.concatenate([
+        points[:, 0],
+        points[-1, 1:],
+        points[-2::-1, -1],
+        points[0, -2:0:-1],
+    ])
+    report.self_intersections = _count_segment_crossings(boundary)
+    if report.self_intersections:
+        report.issues.append(f"Граница области самопересекается ({report.self_intersections} пересечений)")
+
+    return report
+
+
+def ensure_valid_mesh(edge_top, edge_bottom, edge_left, edge_right, **kwargs):
+    """
+    Runs validate_mesh() and raises MeshValidationError if any issue is found.
+
+    Returns:
+        report: MeshReport of a valid mesh
+    """
+    report = validate_mesh(edge_top, edge_bottom, edge_left, edge_right, **kwargs)
+    if not report.ok:
+        raise MeshValidationError(report)
+    return report
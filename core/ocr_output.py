@@ -0,0 +1,104 @@
+import numpy as np
+import cv2
+from .grid_utils import prefilter_for_mesh, strip_maps, perspective_matrix, warp_perspective_rows
+from .memory import profile_stage
+
+
+# Режимы результата для OCR
+OCR_MODES = ("gray", "binary")
+
+# Параметры адаптивной бинаризации по умолчанию
+DEFAULT_BLOCK_SIZE = 31
+DEFAULT_THRESHOLD_C = 10
+
+
+def to_grayscale(image):
+    """Converts a BGR/BGRA image to a single channel; single-channel images are returned as is."""
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 1:
+        return image[..., 0]
+    code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    return cv2.cvtColor(image, code)
+
+
+def dewarp_for_ocr(image, mesh_func, mode="binary", output_size=None, pack_bits=False,
+                   strip_height=256, block_size=DEFAULT_BLOCK_SIZE, threshold_c=DEFAULT_THRESHOLD_C,
+                   interpolation=cv2.INTER_CUBIC, prefilter=True, profiler=None):
+    """
+    Dewarps an image straight into an OCR-ready single-channel result.
+
+    The image is converted to grayscale before the remap, so only one channel
+    is interpolated. The maps are computed per row strip and never exist at
+    full size. In binary mode every strip is binarized with
+    cv2.adaptiveThreshold right after it is remapped, while it is still in
+    cache; strips are remapped with an overlap of block_size // 2 rows, so the
+    result is identical to thresholding the whole dewarped image.
+
+    Args:
+        image: Input image
+        mesh_func: The mesh transformation function
+        mode: "gray" - 8-bit grayscale, "binary" - adaptive binarization (0/255)
+        output_size: Output size (width, height), defaults to the input size
+        pack_bits: Pack the binary result into 1 bit per pixel (np.packbits along rows)
+        strip_height: Height of the processed row strips (see core.memory.plan_strip_height())
+        block_size: Neighbourhood size of the adaptive threshold (odd)
+        threshold_c: Constant subtracted from the local weighted mean
+        interpolation: Interpolation method
+        prefilter: Downscale the source first when the output is smaller
+        profiler: core.memory.MemoryProfiler accounting the "map" and "remap" stages
+
+    Returns:
+        result: uint8 array [height, width], or [height, ceil(width / 8)] when pack_bits is set
+    """
+    if mode not in OCR_MODES:
+        raise ValueError(f"Неизвестный режим результата: {mode}")
+    if pack_bits and mode != "binary":
+        raise ValueError("Упаковка в 1 бит доступна только для бинарного результата")
+
+    gray = to_grayscale(image)
+    height, width = gray.shape
+    out_width, out_height = output_size or (width, height)
+
+    factors = None
+    if prefilter:
+        with profile_stage(profiler, "prefilter"):
+            gray, factors = prefilter_for_mesh(gray, mesh_func, out_width, out_height)
+
+    # Полосы с перекрытием на радиус окна бинаризации, карты - только для полосы
+    # (для гомографии карты не нужны, см. perspective_matrix())
+    overlap = block_size // 2 if mode == "binary" else 0
+    matrix = perspective_matrix(mesh_func, out_width, out_height, factors)
+    result = np.empty((out_height, out_width), dtype=np.uint8)
+    for y0 in range(0, out_height, strip_height):
+        y1 = min(y0 + strip_height, out_height)
+        ry0, ry1 = max(0, y0 - overlap), min(out_height, y1 + overlap)
+        with profile_stage(profiler, "map"):
+            maps = strip_maps(mesh_func, out_width, out_height, ry0, ry1, factors) if matrix is None else None
+        with profile_stage(profiler, "remap"):
+            if maps is None:
+                strip = warp_perspective_rows(gray, matrix, out_width, ry0, ry1, interpolation,
+                                              cv2.BORDER_CONSTANT, 255)
+            else:
+                strip = cv2.remap(gray, maps[0], maps[1], interpolation=interpolation,
+                                  borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+            if mode == "binary":
+                strip = cv2.adaptiveThreshold(strip, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                              cv2.THRESH_BINARY, block_size, threshold_c)
+            result[y0:y1] = strip[y0 - ry0:y0 - ry0 + (y1 - y0)]
+
+    return np.packbits(result > 0, axis=1) if pack_bits else result
+
+
+def unpack_bits(packed, width):
+    """
+    Unpacks a 1-bit result of dewarp_for_ocr(pack_bits=True) into a 0/255 image.
+
+    Args:
+        packed: Packed array [height, ceil(width / 8)]
+        width: Width of the original result
+
+    Returns:
+        image: uint8 array [height, width] with values 0 and 255
+    """
+    return np.unpackbits(packed, axis=1, count=width) * np.uint8(255)
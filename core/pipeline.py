@@ -0,0 +1,538 @@
+"""
+Граф этапов выравнивания, общий для интерфейса и запуска без UI.
+
+Запуск без UI:
+    python -m core.pipeline image.png points.json -o result.png --scale 0.5 --mode binary
+    python -m core.pipeline image.png points.json -o result.png --store storage/results
+    python -m core.pipeline image.png points.json -o result.png --memory-mb 512 --memory-report
+    python -m core.pipeline image.png points.json -o result.png --mode binary --strips strips/
+    python -m core.pipeline spread.png regions.json -o pages.png --layout separate
+    python -m core.pipeline image.png points.json -o result.png --model tps
+    python -m core.pipeline image.png points.json -o result.png --processes 8
+"""
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import cv2
+from .grid_utils import (
+    preprocess_edges, dewarp_image, resolve_output_size, render_overlay, render_regions_overlay
+)
+from .image_io import encode_image_base64, write_image
+from .line_strips import extract_line_strips, save_line_strips
+from .memory import MemoryProfiler, plan_strip_height, profile_stage, run_with_strip_fallback
+from .ocr_output import dewarp_for_ocr
+from .regions import REGION_LAYOUTS, compose_regions, region_output_size, regions_from_data
+from .result_store import get_result_store
+from .shared_arrays import DewarpProcessPool
+from .warp_field import WarpField
+from .warp_models import DEFAULT_WARP_MODEL, WARP_MODELS, build_warp_model
+
+
+class Stage:
+    """A named step of the graph; func receives the results of deps as keyword arguments."""
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+class StageGraph:
+    """
+    Small dependency graph of processing stages.
+
+    Every stage is submitted to a thread pool as soon as all its dependencies
+    are done, so independent branches (overlay and dewarp, encoding and
+    further processing) run concurrently. cv2 and NumPy release the GIL, so
+    threads give real parallelism here.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, func, deps=()):
+        """
+        Adds a stage.
+
+        Args:
+            name: Stage name, also the key of its result
+            func: Function called with the results of deps as keyword arguments
+            deps: Names of stages or inputs the stage depends on
+        """
+        if name in self.stages:
+            raise ValueError(f"Этап {name} уже добавлен")
+        self.stages[name] = Stage(name, func, deps)
+        return self
+
+    def _required(self, targets, inputs):
+        """Stages needed to compute the targets (inputs are treated as done)."""
+        required = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in required or name in inputs:
+                continue
+            if name not in self.stages:
+                raise KeyError(f"Неизвестный этап или вход: {name}")
+            required.add(name)
+            stack.extend(self.stages[name].deps)
+        return required
+
+    def run(self, inputs, targets=None, executor=None, on_stage_done=None):
+        """
+        Runs the stages needed for the targets.
+
+        If a stage fails, its dependents are skipped, independent branches still
+        finish, and the first error is re-raised after the run.
+
+        Args:
+            inputs: Dict of input values; a stage given here is not computed
+            targets: Names of the stages to compute (default - all)
+            executor: Thread pool to run the stages on (default - the module pool)
+            on_stage_done: Callback (name, value) called in the caller's thread
+                as soon as a stage finishes, so it may update UI controls
+
+        Returns:
+            results: Dict with the inputs and the results of all computed stages
+        """
+        if targets is None:
+            targets = list(self.stages)
+        pending = self._required(targets, inputs)
+        if executor is None:
+            executor = get_stage_executor()
+
+        results = dict(inputs)
+        errors = []
+        running = {}
+        failed = set()
+
+        def submit_ready():
+            # Этапы, зависящие от упавших, пропускаются по цепочке
+            changed = True
+            while changed:
+                changed = False
+                for name in sorted(pending):
+                    stage = self.stages[name]
+                    if any(dep in failed for dep in stage.deps):
+                        pending.discard(name)
+                        failed.add(name)
+                        changed = True
+                    elif all(dep in results for dep in stage.deps):
+                        pending.discard(name)
+                        kwargs = {dep: results[dep] for dep in stage.deps}
+                        running[executor.submit(stage.func, **kwargs)] = name
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as ex:
+                    failed.add(name)
+                    errors.append(ex)
+                    continue
+                if on_stage_done is not None:
+                    on_stage_done(name, results[name])
+            submit_ready()
+
+        if errors:
+            raise errors[0]
+        return results
+
+
+_stage_executor = None
+_stage_lock = threading.Lock()
+
+
+def get_stage_executor():
+    """Returns the process-wide pool for graph stages."""
+    global _stage_executor
+    with _stage_lock:
+        if _stage_executor is None:
+            _stage_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stage")
+        return _stage_executor
+
+
+def _load_image(image_path):
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Не удалось загрузить изображение: {image_path}")
+    return image
+
+
+def _dewarp_stage(mode, memory_budget, warp_executor, warp_timeout, profiler, process_pool=None,
+                  model=DEFAULT_WARP_MODEL):
+    """Dewarp stage function (image, mesh, output_size, edges) -> result."""
+    def dewarp(image, mesh, output_size, edges):
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 and mode == "color" else 1
+        # Высота полосы подбирается под бюджет памяти до начала обработки
+        strip_height = plan_strip_height(height, width, channels, output_size, memory_budget)
+
+        def run(strip_height):
+            if process_pool is not None:
+                # Воркерам передаются только границы, изображение и результат - в разделяемой памяти
+                with profile_stage(profiler, "parallel_dewarp"):
+                    return process_pool.dewarp(image, edges, mesh_func=mesh, model=model, output_size=output_size,
+                                               mode=mode, strip_height=strip_height)
+            if mode == "color":
+                return dewarp_image(image, mesh, output_size=output_size,
+                                    strip_height=strip_height, profiler=profiler)
+            return dewarp_for_ocr(image, mesh, mode=mode, output_size=output_size,
+                                  strip_height=strip_height, profiler=profiler)
+
+        if warp_executor is not None:
+            return warp_executor.run(run_with_strip_fallback, run, strip_height, timeout=warp_timeout)
+        return run_with_strip_fallback(run, strip_height)
+
+    return dewarp
+
+
+def _mesh_stage(profiler, model=DEFAULT_WARP_MODEL):
+    """Mesh stage function edges -> mesh of the warp model (see core.warp_models)."""
+    def build_mesh(edges):
+        with profile_stage(profiler, "mesh"):
+            return build_warp_model(model, *edges)
+
+    return build_mesh
+
+
+def _store_params(mode, scale, model, **extra):
+    params = {"mode": mode, "scale": scale, **extra}
+    # Модель по умолчанию не входит в ключ, чтобы ранее сохраненные результаты оставались доступны
+    if model != DEFAULT_WARP_MODEL:
+        params["model"] = model
+    return params
+
+
+def _stored_stage(store, dewarp, mode):
+    """Dewarp stage taking a stored result by store_key, a new result is stored in the background."""
+    def stored_dewarp(store_key, image, mesh, output_size, edges):
+        result = store.get_image(store_key)
+        if result is None:
+            result = dewarp(image, mesh, output_size, edges)
+            store.put_image_async(store_key, result, png_bilevel=mode == "binary")
+        return result
+
+    return stored_dewarp
+
+
+def build_alignment_graph(mode="color", scale=1.0, display_height=None, memory_budget=None,
+                          warp_executor=None, warp_timeout=None, output_path=None, export_options=None,
+                          store=None, profiler=None, line_strips=False, model=DEFAULT_WARP_MODEL, process_pool=None):
+    """
+    Builds the alignment graph.
+
+    Inputs: image_path (or a ready image) and edge_points in the format of
+    AppState.edge_points_lists.
+
+    Stages:
+        image, edges, mesh, output_size - loading and the mesh
+        result, warp_field - dewarped image and its compact warp field
+            (the warp field stores a Coons patch, so it is built only for model="coons")
+        preview, overlay, result_preview - base64 images for the UI (only with display_height)
+        saved - path of the written result (only with output_path)
+        store_key - key of the result in the store (only with store)
+        line_strips - text line strips of the result for OCR (only with line_strips)
+
+    Args:
+        mode: "color", "gray" or "binary" (see core.ocr_output)
+        scale: Output scale relative to the input
+        display_height: Height of the UI previews
+        memory_budget: Memory budget of the dewarp in bytes; the strip height is
+            planned from it before processing and halved on out-of-memory errors
+        warp_executor: BoundedExecutor to run the dewarp on (e.g. the shared pool)
+        warp_timeout: Maximum time to wait for a free slot in warp_executor
+        output_path: Path to write the result to
+        export_options: Format options for write_image()
+        store: ResultStore; a stored result for the same image, edges and
+            parameters is returned without dewarping, a new one is stored
+            in the background
+        profiler: core.memory.MemoryProfiler accounting the mesh, map and remap stages
+        line_strips: Cut the result into text line strips (see core.line_strips)
+        model: Warp model, one of core.warp_models.WARP_MODELS
+        process_pool: core.shared_arrays.DewarpProcessPool to dewarp on worker
+            processes through shared memory (batch processing on many cores)
+
+    Returns:
+        graph: StageGraph
+    """
+    graph = StageGraph()
+    dewarp = _dewarp_stage(mode, memory_budget, warp_executor, warp_timeout, profiler, process_pool, model)
+    build_mesh = _mesh_stage(profiler, model)
+
+    graph.add("image", _load_image, ["image_path"])
+    graph.add("edges", lambda edge_points: preprocess_edges(**edge_points), ["edge_points"])
+    graph.add("mesh", build_mesh, ["edges"])
+    graph.add("output_size", lambda image: resolve_output_size(image.shape[1], image.shape[0], scale=scale), ["image"])
+    if store is None:
+        graph.add("result", dewarp, ["image", "mesh", "output_size", "edges"])
+    else:
+        params = _store_params(mode, scale, model)
+        graph.add("image_hash", lambda image_path: store.image_hash(image_path), ["image_path"])
+        graph.add("store_key", lambda image_hash, edge_points: store.make_key(image_hash, edge_points, params),
+                  ["image_hash", "edge_points"])
+        graph.add("result", _stored_stage(store, dewarp, mode), ["store_key", "image", "mesh", "output_size", "edges"])
+    if model == "coons":
+        graph.add("warp_field", lambda mesh, output_size: WarpField.from_mesh(mesh, *output_size),
+                  ["mesh", "output_size"])
+
+    if display_height is not None:
+        def overlay(image, mesh, edges):
+            visualization, _ = render_overlay(image, mesh, list(edges), n_lines=10, max_height=display_height)
+            return encode_image_base64(visualization)
+
+        graph.add("preview", lambda image: encode_image_base64(image, max_height=display_height), ["image"])
+        graph.add("overlay", overlay, ["image", "mesh", "edges"])
+        graph.add("result_preview", lambda result: encode_image_base64(result, max_height=display_height), ["result"])
+
+    if line_strips:
+        graph.add("line_strips", lambda result, mesh: extract_line_strips(result, mesh), ["result", "mesh"])
+
+    if output_path is not None:
+        options = dict(export_options or {})
+        if mode == "binary":
+            options.setdefault("png_bilevel", True)
+
+        def save(result):
+            write_image(output_path, result, **options)
+            return output_path
+
+        graph.add("saved", save, ["result"])
+
+    return graph
+
+
+def build_regions_graph(region_names, mode="color", scale=1.0, layout="horizontal", display_height=None,
+                        memory_budget=None, warp_executor=None, warp_timeout=None, store=None, profiler=None,
+                        model=DEFAULT_WARP_MODEL, process_pool=None):
+    """
+    Builds the graph for several independent regions of one image (columns,
+    pages of a book spread), each with its own mesh of the warp model.
+
+    The image is loaded once and shared by all regions; the mesh and dewarp
+    branches of the regions are independent, so the graph runs them in
+    parallel.
+
+    Inputs: image_path and regions - dict region name -> edge points in the
+    format of AppState.edge_points_lists.
+
+    Stages:
+        image - the image, loaded once
+        edges:<name>, mesh:<name>, output_size:<name>, result:<name> - per region;
+            the output size follows the edge lengths (see core.regions.region_output_size)
+        results - list of region results in the order of region_names
+        result - results composed into one image (not with layout="separate")
+        preview, overlay, result_preview - base64 images for the UI (only with display_height)
+
+    Args:
+        region_names: Region names in reading order
+        layout: "separate", "horizontal" or "vertical" (see core.regions.compose_regions)
+        (other arguments as in build_alignment_graph())
+
+    Returns:
+        graph: StageGraph
+    """
+    if layout not in REGION_LAYOUTS:
+        raise ValueError(f"Неизвестная раскладка областей: {layout}")
+    graph = StageGraph()
+    dewarp = _dewarp_stage(mode, memory_budget, warp_executor, warp_timeout, profiler, process_pool, model)
+    build_mesh = _mesh_stage(profiler, model)
+
+    graph.add("image", _load_image, ["image_path"])
+    stored_dewarp = None
+    if store is not None:
+        # Размер результата области зависит от длин ее границ, а не от размера изображения
+        params = _store_params(mode, scale, model, sizing="region")
+        stored_dewarp = _stored_stage(store, dewarp, mode)
+        graph.add("image_hash", lambda image_path: store.image_hash(image_path), ["image_path"])
+
+    def add_region(name):
+        # Имена этапов области содержат ее имя, поэтому результаты зависимостей берутся из **deps
+        edges, mesh, size, key, result = (f"{stage}:{name}" for stage in
+                                          ("edges", "mesh", "output_size", "store_key", "result"))
+        graph.add(edges, lambda regions: preprocess_edges(**regions[name]), ["regions"])
+        graph.add(mesh, lambda **deps: build_mesh(deps[edges]), [edges])
+        graph.add(size, lambda **deps: region_output_size(deps[edges], scale), [edges])
+        if stored_dewarp is None:
+            graph.add(result, lambda **deps: dewarp(deps["image"], deps[mesh], deps[size], deps[edges]),
+                      ["image", mesh, size, edges])
+        else:
+            graph.add(key, lambda image_hash, regions: store.make_key(image_hash, regions[name], params),
+                      ["image_hash", "regions"])
+            graph.add(result,
+                      lambda **deps: stored_dewarp(deps[key], deps["image"], deps[mesh], deps[size], deps[edges]),
+                      [key, "image", mesh, size, edges])
+
+    for name in region_names:
+        add_region(name)
+
+    graph.add("results", lambda **deps: [deps[f"result:{name}"] for name in region_names],
+              [f"result:{name}" for name in region_names])
+    if layout != "separate":
+        graph.add("result", lambda results: compose_regions(results, layout), ["results"])
+
+    if display_height is not None:
+        def overlay(image, **deps):
+            meshes = [deps[f"mesh:{name}"] for name in region_names]
+            edges = [list(deps[f"edges:{name}"]) for name in region_names]
+            visualization, _ = render_regions_overlay(image, meshes, edges, n_lines=10, max_height=display_height)
+            return encode_image_base64(visualization)
+
+        graph.add("preview", lambda image: encode_image_base64(image, max_height=display_height), ["image"])
+        graph.add("overlay", overlay,
+                  ["image"] + [f"mesh:{name}" for name in region_names] + [f"edges:{name}" for name in region_names])
+        if layout != "separate":
+            graph.add("result_preview", lambda result: encode_image_base64(result, max_height=display_height),
+                      ["result"])
+        else:
+            graph.add("result_preview",
+                      lambda results: encode_image_base64(compose_regions(results), max_height=display_height),
+                      ["results"])
+
+    return graph
+
+
+def run_alignment(image_path, edge_points, output_path=None, mode="color", scale=1.0,
+                  export_options=None, targets=None, store_dir=None, memory_budget=None, profiler=None,
+                  line_strips=False, model=DEFAULT_WARP_MODEL, process_pool=None):
+    """
+    Headless alignment of one image through the same graph as the UI.
+
+    Args:
+        image_path: Path to the input image
+        edge_points: Edge points in the format of AppState.edge_points_lists
+        output_path: Path to write the result to (None - keep it in memory only)
+        mode: "color", "gray" or "binary"
+        scale: Output scale relative to the input
+        export_options: Format options for write_image()
+        targets: Stages to compute (default - result, warp_field for model="coons"
+            and saved if output_path is set)
+        store_dir: Directory of the result store (None - do not reuse results)
+        memory_budget: Memory budget of the dewarp in bytes
+        profiler: core.memory.MemoryProfiler accounting the stages
+        line_strips: Also cut the result into text line strips
+        model: Warp model, one of core.warp_models.WARP_MODELS
+        process_pool: core.shared_arrays.DewarpProcessPool to dewarp on worker processes
+
+    Returns:
+        results: Dict of stage results
+    """
+    store = get_result_store(store_dir) if store_dir is not None else None
+    graph = build_alignment_graph(mode=mode, scale=scale, output_path=output_path,
+                                  export_options=export_options, store=store,
+                                  memory_budget=memory_budget, profiler=profiler, line_strips=line_strips,
+                                  model=model, process_pool=process_pool)
+    if targets is None:
+        targets = ["result"] + (["warp_field"] if model == "coons" else [])
+        targets += ["saved"] if output_path is not None else []
+        if line_strips:
+            targets.append("line_strips")
+    return graph.run({"image_path": image_path, "edge_points": edge_points}, targets)
+
+
+def run_regions(image_path, regions, output_path=None, mode="color", scale=1.0, layout="horizontal",
+                export_options=None, store_dir=None, memory_budget=None, profiler=None, model=DEFAULT_WARP_MODEL,
+                process_pool=None):
+    """
+    Headless alignment of several regions of one image.
+
+    Args:
+        image_path: Path to the input image
+        regions: List of (name, edge points), see core.regions.regions_from_data()
+        output_path: Path of the composed result; with layout="separate" every
+            region is written next to it as <stem>_<name><ext>
+        layout: "separate", "horizontal" or "vertical"
+        (other arguments as in run_alignment())
+
+    Returns:
+        results: Dict of stage results; "saved" - list of written paths
+    """
+    names = [name for name, _ in regions]
+    store = get_result_store(store_dir) if store_dir is not None else None
+    graph = build_regions_graph(names, mode=mode, scale=scale, layout=layout, store=store,
+                                memory_budget=memory_budget, profiler=profiler, model=model,
+                                process_pool=process_pool)
+    results = graph.run({"image_path": image_path, "regions": dict(regions)},
+                        ["results"] if layout == "separate" else ["result"])
+
+    if output_path is not None:
+        options = dict(export_options or {})
+        if mode == "binary":
+            options.setdefault("png_bilevel", True)
+        if layout == "separate":
+            stem, ext = os.path.splitext(output_path)
+            outputs = [(f"{stem}_{name}{ext}", image) for name, image in zip(names, results["results"])]
+        else:
+            outputs = [(output_path, results["result"])]
+        for path, image in outputs:
+            write_image(path, image, **options)
+        results["saved"] = [path for path, _ in outputs]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", help="Входное изображение")
+    parser.add_argument("points", help="Файл разметки points.json")
+    parser.add_argument("-o", "--output", required=True, help="Путь к результату (формат по расширению)")
+    parser.add_argument("--mode", default="color", choices=["color", "gray", "binary"], help="Режим результата")
+    parser.add_argument("--scale", type=float, default=1.0, help="Масштаб результата относительно входа")
+    parser.add_argument("--warp-field", default=None, help="Сохранить поле деформации в .npz")
+    parser.add_argument("--store", default=None, help="Каталог хранилища результатов для повторного использования")
+    parser.add_argument("--memory-mb", type=float, default=None, help="Бюджет памяти на выравнивание в МБ")
+    parser.add_argument("--memory-report", action="store_true", help="Вывести пиковую память по этапам")
+    parser.add_argument("--strips", default=None, help="Каталог для полос строк текста и их контуров (strips.json)")
+    parser.add_argument("--layout", default="horizontal", choices=REGION_LAYOUTS,
+                        help="Раскладка результатов, если в разметке несколько областей")
+    parser.add_argument("--model", default=DEFAULT_WARP_MODEL, choices=WARP_MODELS, help="Модель деформации")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Выравнивать в пуле из N процессов через разделяемую память")
+    args = parser.parse_args()
+    if args.warp_field and args.model != "coons":
+        parser.error("--warp-field доступно только для модели coons")
+
+    with open(args.points, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    regions = regions_from_data(data)
+    memory_budget = int(args.memory_mb * 1024 ** 2) if args.memory_mb else None
+    profiler = MemoryProfiler() if args.memory_report else None
+    process_pool = DewarpProcessPool(args.processes) if args.processes else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        if len(regions) > 1:
+            results = run_regions(args.image, regions, args.output, mode=args.mode, scale=args.scale,
+                                  layout=args.layout, store_dir=args.store, memory_budget=memory_budget,
+                                  profiler=profiler, model=args.model, process_pool=process_pool)
+        else:
+            results = run_alignment(args.image, regions[0][1], args.output, mode=args.mode, scale=args.scale,
+                                    store_dir=args.store, memory_budget=memory_budget, profiler=profiler,
+                                    line_strips=args.strips is not None, model=args.model,
+                                    process_pool=process_pool)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if process_pool is not None:
+            process_pool.shutdown()
+    if len(regions) > 1:
+        # Поле деформации и полосы строк строятся для одной области
+        print(f"Областей: {len(regions)}, результат сохранен в " + ", ".join(results["saved"]))
+    else:
+        if args.warp_field:
+            results["warp_field"].save(args.warp_field)
+        print(f"Результат сохранен в {results['saved']}")
+        if args.strips:
+            save_line_strips(results["line_strips"], args.strips)
+            print(f"Полос строк: {len(results['line_strips'])}, сохранены в {args.strips}")
+    if profiler is not None:
+        print(profiler.format_report())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
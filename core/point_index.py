@@ -0,0 +1,80 @@
+import math
+
+
+class PointIndex:
+    """
+    Uniform grid index of boundary points for hit-testing.
+
+    Points are bucketed into square cells, so a query only looks at the
+    cells overlapping the search radius instead of every point. Points are
+    identified by (edge name, index in the edge list), which stays stable
+    while points are appended and moved.
+    """
+
+    def __init__(self, cell_size=64.0):
+        """
+        Args:
+            cell_size: Cell size in the units of the point coordinates
+        """
+        self.cell_size = cell_size
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+
+    def rebuild(self, edge_points):
+        """
+        Indexes all points.
+
+        Args:
+            edge_points: Dict edge name -> list of (x, y), as AppState.edge_points_lists
+        """
+        self.clear()
+        for edge, points in edge_points.items():
+            for index, (x, y) in enumerate(points):
+                self.insert(edge, index, x, y)
+
+    def insert(self, edge, index, x, y):
+        key = (edge, index)
+        self._points[key] = (x, y)
+        self._cells.setdefault(self._cell(x, y), set()).add(key)
+
+    def move(self, edge, index, x, y):
+        """Moves an indexed point to (x, y)."""
+        key = (edge, index)
+        old_cell = self._cell(*self._points[key])
+        new_cell = self._cell(x, y)
+        if old_cell != new_cell:
+            bucket = self._cells[old_cell]
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[old_cell]
+            self._cells.setdefault(new_cell, set()).add(key)
+        self._points[key] = (x, y)
+
+    def nearest(self, x, y, radius):
+        """
+        Finds the point nearest to (x, y) within radius.
+
+        Returns:
+            key: (edge name, index) or None if no point is within radius
+        """
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        best, best_distance = None, radius * radius
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for key in self._cells.get((cx, cy), ()):
+                    px, py = self._points[key]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= best_distance:
+                        best, best_distance = key, distance
+        return best
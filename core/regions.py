@@ -0,0 +1,98 @@
+import numpy as np
+
+
+# Раскладка результатов областей: каждая область в свой файл или одно общее изображение
+REGION_LAYOUTS = ("separate", "horizontal", "vertical")
+
+# Промежуток между областями в общем изображении, пикселей
+DEFAULT_REGION_GAP = 16
+
+
+def regions_from_data(data):
+    """
+    Reads the regions of a points.json file.
+
+    A file with several regions stores them as
+    {"regions": [{"name": ..., "points": {edge_top: ..., ...}}, ...]};
+    a file with a single "points" dict is read as one region.
+
+    Args:
+        data: Loaded JSON data
+
+    Returns:
+        regions: List of (name, edge points) in the format of AppState.edge_points_lists
+    """
+    if "regions" in data:
+        return [(region.get("name") or f"region_{index + 1}", region["points"])
+                for index, region in enumerate(data["regions"])]
+    return [("region_1", data["points"])]
+
+
+def regions_to_data(regions):
+    """Inverse of regions_from_data() for a list of (name, edge points)."""
+    return [{"name": name, "points": points} for name, points in regions]
+
+
+def _polyline_length(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return float(np.hypot(*np.diff(points, axis=0).T).sum()) if len(points) > 1 else 0.0
+
+
+def region_output_size(edges, scale=1.0):
+    """
+    Output size of a region from the lengths of its edges.
+
+    A region covers only a part of the page (a column, one page of a spread),
+    so its result is sized by the longer of the opposite edges instead of the
+    whole image, keeping the source resolution along both axes.
+
+    Args:
+        edges: Edges (top, bottom, left, right) after preprocess_edges()
+        scale: Output scale relative to the source
+
+    Returns:
+        size: (width, height) in pixels
+    """
+    top, bottom, left, right = edges
+    width = max(_polyline_length(top), _polyline_length(bottom)) * scale
+    height = max(_polyline_length(left), _polyline_length(right)) * scale
+    return max(2, int(round(width))), max(2, int(round(height)))
+
+
+def compose_regions(images, layout="horizontal", gap=DEFAULT_REGION_GAP, background=255):
+    """
+    Places the region results side by side or one under another.
+
+    Args:
+        images: Region results in reading order (all color or all single-channel)
+        layout: "horizontal" (columns, book spreads) or "vertical"
+        gap: Gap between the regions in pixels
+        background: Fill value of the gaps and of the unused area
+
+    Returns:
+        image: Composed image
+    """
+    if layout not in ("horizontal", "vertical"):
+        raise ValueError(f"Неизвестная раскладка областей: {layout}")
+    if not images:
+        raise ValueError("Нет областей для раскладки")
+
+    horizontal = layout == "horizontal"
+    heights = [image.shape[0] for image in images]
+    widths = [image.shape[1] for image in images]
+    if horizontal:
+        height, width = max(heights), sum(widths) + gap * (len(images) - 1)
+    else:
+        height, width = sum(heights) + gap * (len(images) - 1), max(widths)
+
+    result = np.full((height, width) + images[0].shape[2:], background, dtype=images[0].dtype)
+    offset = 0
+    for image in images:
+        h, w = image.shape[:2]
+        if horizontal:
+            result[:h, offset:offset + w] = image
+            offset += w + gap
+        else:
+            result[offset:offset + h, :w] = image
+            offset += h + gap
+    return result
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+from .image_io import encode_export, write_atomic
+
+
+# Версия ключей хранилища: увеличивается при изменении алгоритма выравнивания,
+# чтобы старые результаты не выдавались за новые
+STORE_KEY_VERSION = 1
+
+# Квота хранилища по умолчанию (МБ) и переменная окружения для ее настройки
+STORE_QUOTA_ENV = "TEXT_IMAGE_TOOL_STORE_MB"
+DEFAULT_STORE_QUOTA_MB = 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """
+    Content-addressed artifact store with a disk quota and LRU eviction.
+
+    Artifacts are addressed by a key derived from the image hash, the edge
+    points and the processing parameters, so an unchanged image and
+    annotation map to the same stored result. Files are written to a unique
+    temporary name and renamed into place, so concurrent runs never see or
+    produce partial files. The last access time is kept in the file mtime;
+    when the total size exceeds the quota, the least recently used files are
+    removed.
+    """
+
+    def __init__(self, root, quota_bytes=None):
+        """
+        Args:
+            root: Store directory (created if missing)
+            quota_bytes: Disk quota in bytes (default - TEXT_IMAGE_TOOL_STORE_MB)
+        """
+        if quota_bytes is None:
+            quota_bytes = int(os.environ.get(STORE_QUOTA_ENV, DEFAULT_STORE_QUOTA_MB)) * 1024 ** 2
+        self.root = os.path.abspath(root)
+        self.quota_bytes = quota_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Хэши файлов по (путь, размер, mtime), чтобы не читать файл повторно
+        self._file_hashes = {}
+        # Индекс хранилища: путь -> (размер, время последнего доступа)
+        self._index = {}
+        self._total = 0
+        self._scan()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-store")
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                self._index[path] = (stat.st_size, stat.st_mtime)
+                self._total += stat.st_size
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def image_hash(self, path):
+        """Content hash of an image file, memoized by path, size and mtime."""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._file_hashes.get(memo_key)
+        if digest is None:
+            digest = hash_file(path)
+            with self._lock:
+                self._file_hashes[memo_key] = digest
+        return digest
+
+    @staticmethod
+    def make_key(image_hash, edge_points, params=None):
+        """
+        Builds the artifact key.
+
+        Args:
+            image_hash: Content hash of the input image
+            edge_points: Edge points in the format of AppState.edge_points_lists
+            params: Processing parameters (mode, scale, ...)
+
+        Returns:
+            key: Hex key
+        """
+        payload = json.dumps({
+            "version": STORE_KEY_VERSION,
+            "image": image_hash,
+            "edges": {name: [list(map(float, p)) for p in points] for name, points in edge_points.items()},
+            "params": params or {},
+        }, sort_keys=True)
+        return hash_bytes(payload.encode("utf-8"))
+
+    def path(self, key, ext):
+        """Path of an artifact; files are sharded by the first two characters of the key."""
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def get_path(self, key, ext):
+        """
+        Returns the path of a stored artifact and marks it as recently used.
+
+        Returns:
+            path: Artifact path or None if it is not stored
+        """
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(path)
+            return None
+        with self._lock:
+            if path not in self._index:
+                self._total += size
+            self._index[path] = (size, os.path.getmtime(path))
+        return path
+
+    def get_image(self, key, ext=".png", flags=cv2.IMREAD_UNCHANGED):
+        """Loads a stored image or returns None."""
+        path = self.get_path(key, ext)
+        if path is None:
+            return None
+        data = np.fromfile(path, dtype=np.uint8)
+        return cv2.imdecode(data, flags)
+
+    def put_bytes(self, key, ext, data):
+        """
+        Writes an artifact atomically and evicts old artifacts over the quota.
+
+        Returns:
+            path: Artifact path
+        """
+        path = self.path(key, ext)
+        write_atomic(path, data)
+
+        with self._lock:
+            self._forget(path)
+            self._index[path] = (len(data), os.path.getmtime(path))
+            self._total += len(data)
+            self._evict(keep=path)
+        return path
+
+    def put_image(self, key, image, ext=".png", **options):
+        """Encodes an image losslessly (by default) and stores it."""
+        options.setdefault("png_compression", 1)
+        return self.put_bytes(key, ext, encode_export(image, ext, **options))
+
+    def put_image_async(self, key, image, ext=".png", **options):
+        """Stores an image on a background thread; returns a Future with the path."""
+        return self._writer.submit(self.put_image, key, image, ext, **options)
+
+    def flush(self):
+        """Waits for the background writes submitted so far."""
+        # Запись выполняется одним потоком по очереди: пустая задача завершается после всех предыдущих
+        self._writer.submit(lambda: None).result()
+
+    def _forget(self, path):
+        entry = self._index.pop(path, None)
+        if entry is not None:
+            self._total -= entry[0]
+
+    def _evict(self, keep=None):
+        """Removes the least recently used artifacts until the store fits into the quota."""
+        if self._total <= self.quota_bytes:
+            return
+        for path, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= self.quota_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._forget(path)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_result_store(root, quota_bytes=None):
+    """Returns the process-wide store for a directory."""
+    root = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = ResultStore(root, quota_bytes)
+        return store
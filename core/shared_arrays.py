@@ -0,0 +1,332 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import cv2
+from .grid_utils import (
+    perspective_matrix, prefilter_for_mesh, strip_maps, warp_perspective_rows
+)
+from .ocr_output import DEFAULT_BLOCK_SIZE, DEFAULT_THRESHOLD_C, OCR_MODES, to_grayscale
+from .warp_models import DEFAULT_WARP_MODEL, build_warp_model
+
+
+class SharedArray:
+    """
+    NumPy array backed by a multiprocessing.shared_memory block.
+
+    The owner creates the block and is responsible for unlinking it; workers
+    attach by descriptor and get a zero-copy view of the same memory.
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype):
+        """Creates a new uninitialized shared array."""
+        nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        return cls(shm, shape, dtype, owner=True)
+
+    @classmethod
+    def from_array(cls, array):
+        """Creates a shared array with a copy of the given array."""
+        shared = cls.create(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Attaches to an existing shared array without copying.
+
+        Args:
+            descriptor: Tuple (name, shape, dtype) returned by SharedArray.descriptor
+        """
+        name, shape, dtype = descriptor
+        # Воркеры пула используют resource_tracker родительского процесса,
+        # поэтому блок удаляется только владельцем в close()
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, shape, dtype, owner=False)
+
+    @property
+    def descriptor(self):
+        """Picklable descriptor for passing the array to another process."""
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self):
+        """Releases the view and, for the owner, frees the shared memory block."""
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SharedArrayPool:
+    """
+    Owns a group of shared arrays and frees all of them on exit,
+    including when processing fails half-way.
+    """
+
+    def __init__(self):
+        self._arrays = []
+
+    def create(self, shape, dtype):
+        shared = SharedArray.create(shape, dtype)
+        self._arrays.append(shared)
+        return shared
+
+    def from_array(self, array):
+        shared = SharedArray.from_array(array)
+        self._arrays.append(shared)
+        return shared
+
+    def close(self):
+        while self._arrays:
+            self._arrays.pop().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _strips(height, count):
+    """Splits rows [0, height) into count nearly equal strips."""
+    bounds = np.linspace(0, height, max(1, min(count, height)) + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _remap_strip(image_desc, map_x_desc, map_y_desc, out_desc, y0, y1, interpolation, border_mode):
+    """Worker: remaps rows [y0, y1) of the output straight into the shared output buffer."""
+    with SharedArray.attach(image_desc) as image, \
+            SharedArray.attach(map_x_desc) as map_x, \
+            SharedArray.attach(map_y_desc) as map_y, \
+            SharedArray.attach(out_desc) as out:
+        cv2.remap(image.array, map_x.array[y0:y1], map_y.array[y0:y1],
+                  interpolation=interpolation, borderMode=border_mode,
+                  dst=out.array[y0:y1])
+
+
+# Функции меша, построенные в процессе-воркере, по ключу разметки
+_worker_meshes = {}
+
+
+def _worker_mesh(edges_key):
+    mesh_func = _worker_meshes.get(edges_key)
+    if mesh_func is None:
+        data = json.loads(edges_key)
+        mesh_func = build_warp_model(data["model"], *data["edges"])
+        _worker_meshes.clear()
+        _worker_meshes[edges_key] = mesh_func
+    return mesh_func
+
+
+def _dewarp_strip(image_desc, out_desc, edges_key, y0, y1, factors, mode, interpolation, border_mode,
+                  block_size, threshold_c):
+    """
+    Worker: dewarps output rows [y0, y1) straight into the shared output.
+
+    Follows the strip path of dewarp_image() and dewarp_for_ocr(): maps of the
+    strip only (or cv2.warpPerspective for a homography), rescaled into the
+    prefiltered source; in binary mode the strip is remapped with an overlap
+    of block_size // 2 rows and thresholded, so the result does not depend on
+    the strip bounds.
+    """
+    mesh_func = _worker_mesh(edges_key)
+    with SharedArray.attach(image_desc) as image, SharedArray.attach(out_desc) as out:
+        height, width = out.shape[:2]
+        overlap = block_size // 2 if mode == "binary" else 0
+        ry0, ry1 = max(0, y0 - overlap), min(height, y1 + overlap)
+        border_value = 0 if mode == "color" else 255
+        matrix = perspective_matrix(mesh_func, width, height, factors)
+        if matrix is not None:
+            strip = warp_perspective_rows(image.array, matrix, width, ry0, ry1, interpolation,
+                                          border_mode, border_value)
+        else:
+            map_x, map_y = strip_maps(mesh_func, width, height, ry0, ry1, factors)
+            strip = cv2.remap(image.array, map_x, map_y, interpolation=interpolation,
+                              borderMode=border_mode, borderValue=border_value)
+        if mode == "binary":
+            strip = cv2.adaptiveThreshold(strip, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                          cv2.THRESH_BINARY, block_size, threshold_c)
+        out.array[y0:y1] = strip[y0 - ry0:y0 - ry0 + (y1 - y0)]
+
+
+def _run_strips(executor, processes, func, args, height, strip_height=None):
+    """
+    Runs func over row strips on a process pool and re-raises the first failure.
+
+    There are two strips per worker for load balancing, or more if
+    strip_height limits the rows of a strip.
+    """
+    own_executor = executor is None
+    if own_executor:
+        resource_tracker.ensure_running()
+        executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        count = (processes or os.cpu_count() or 1) * 2
+        if strip_height:
+            count = max(count, -(-height // strip_height))
+        futures = [executor.submit(func, *args(y0, y1)) for y0, y1 in _strips(height, count)]
+        for future in futures:
+            future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parallel_remap(image, map_x, map_y, processes=None, executor=None, output=None,
+                   interpolation=cv2.INTER_CUBIC, border_mode=cv2.BORDER_CONSTANT):
+    """
+    Applies precomputed remap maps on a process pool through shared memory.
+
+    The image, both maps and the output live in shared memory blocks; workers
+    get zero-copy views and write their row strips directly into the output.
+    All blocks are freed when the call returns, also on failure.
+
+    Args:
+        image: Input image
+        map_x, map_y: float32 remap maps
+        processes: Number of worker processes (default - number of CPUs)
+        executor: Existing ProcessPoolExecutor to reuse
+        output: SharedArray to write the result into; if given, the result is
+            returned as its view without the final copy
+        interpolation: Interpolation method
+        border_mode: Border handling mode
+
+    Returns:
+        result: Remapped image
+    """
+    height, width = map_x.shape
+    with SharedArrayPool() as pool:
+        shared_image = pool.from_array(np.ascontiguousarray(image))
+        shared_x = pool.from_array(np.ascontiguousarray(map_x, dtype=np.float32))
+        shared_y = pool.from_array(np.ascontiguousarray(map_y, dtype=np.float32))
+        out = output if output is not None else pool.create((height, width) + image.shape[2:], image.dtype)
+
+        _run_strips(executor, processes, _remap_strip, lambda y0, y1: (
+            shared_image.descriptor, shared_x.descriptor, shared_y.descriptor,
+            out.descriptor, y0, y1, interpolation, border_mode
+        ), height)
+        return out.array if output is not None else out.array.copy()
+
+
+def parallel_dewarp(image, edges, processes=None, executor=None, output=None,
+                    interpolation=cv2.INTER_CUBIC, border_mode=cv2.BORDER_CONSTANT, model=DEFAULT_WARP_MODEL,
+                    output_size=None, mode="color", prefilter=True, strip_height=None, mesh_func=None,
+                    block_size=DEFAULT_BLOCK_SIZE, threshold_c=DEFAULT_THRESHOLD_C):
+    """
+    Dewarps an image on a process pool through shared memory.
+
+    Only the boundary points are pickled; every worker builds the mesh once,
+    computes the maps for its own row strips and remaps them straight into the
+    shared output, so full-size maps are never materialized or copied. The
+    result is the same as dewarp_image() (mode="color") or dewarp_for_ocr()
+    in strips.
+
+    Args:
+        image: Input image
+        edges: Preprocessed edges (edge_top, edge_bottom, edge_left, edge_right)
+        processes: Number of worker processes (default - number of CPUs)
+        executor: Existing ProcessPoolExecutor to reuse
+        output: SharedArray to write the result into; if given, the result is
+            returned as its view without the final copy
+        interpolation: Interpolation method
+        border_mode: Border handling mode
+        model: Warp model, one of core.warp_models.WARP_MODELS
+        output_size: Output size (width, height), defaults to the input size
+        mode: "color", "gray" or "binary" (see core.ocr_output)
+        prefilter: Downscale the source first when the output is smaller (see prefilter_for_mesh())
+        strip_height: Maximum rows of a strip (see core.memory.plan_strip_height())
+        mesh_func: Mesh of the edges if already built in this process (used for prefiltering)
+        block_size, threshold_c: Adaptive threshold parameters of mode="binary"
+
+    Returns:
+        result: Dewarped image of the input size or of output_size
+    """
+    if mode != "color":
+        if mode not in OCR_MODES:
+            raise ValueError(f"Неизвестный режим результата: {mode}")
+        # Для OCR интерполируется только один канал
+        image = to_grayscale(image)
+    height, width = image.shape[:2]
+    out_width, out_height = output_size or (width, height)
+
+    factors = None
+    if prefilter:
+        if mesh_func is None:
+            mesh_func = build_warp_model(model, *edges)
+        image, factors = prefilter_for_mesh(image, mesh_func, out_width, out_height)
+
+    edges_key = json.dumps({"model": model, "edges": [[list(map(float, p)) for p in edge] for edge in edges]})
+    with SharedArrayPool() as pool:
+        shared_image = pool.from_array(np.ascontiguousarray(image))
+        out = output if output is not None else pool.create((out_height, out_width) + image.shape[2:], image.dtype)
+
+        _run_strips(executor, processes, _dewarp_strip, lambda y0, y1: (
+            shared_image.descriptor, out.descriptor, edges_key, y0, y1, factors, mode,
+            interpolation, border_mode, block_size, threshold_c
+        ), out_height, strip_height)
+        return out.array if output is not None else out.array.copy()
+
+
+class DewarpProcessPool:
+    """
+    Process pool for parallel_dewarp(), shared by all pages of a batch.
+
+    Starting worker processes costs more than dewarping a page, so one pool
+    serves the whole run; see core.pipeline (process_pool) and core.batch.
+    """
+
+    def __init__(self, processes=None):
+        """
+        Args:
+            processes: Number of worker processes (default - number of CPUs)
+        """
+        self.processes = processes or os.cpu_count() or 1
+        # Воркеры должны унаследовать resource_tracker этого процесса: иначе каждый запускает свой,
+        # и тот при выходе пытается удалить блоки, уже освобожденные владельцем
+        resource_tracker.ensure_running()
+        self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        # Процессы запускаются сразу, пока у вызывающего нет рабочих потоков (fork копирует только
+        # текущий поток, а блокировки остальных остались бы захваченными в воркерах)
+        self.executor.submit(int).result()
+
+    def dewarp(self, image, edges, strip_height=None, **kwargs):
+        """
+        parallel_dewarp() on this pool.
+
+        Args:
+            strip_height: Total rows of the strips processed at once (e.g. from a
+                memory budget); every worker gets strip_height / processes rows
+            **kwargs: Other arguments of parallel_dewarp()
+        """
+        if strip_height is not None:
+            strip_height = max(1, strip_height // self.processes)
+        return parallel_dewarp(image, edges, processes=self.processes, executor=self.executor,
+                               strip_height=strip_height, **kwargs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
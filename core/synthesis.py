@@ -0,0 +1,304 @@
+import numpy as np
+import cv2
+from .grid_utils import preprocess_edges, sample_grid_lines
+from .warp_models import DEFAULT_WARP_MODEL, build_warp_model
+
+
+# Символы для случайного текста страницы
+_ALPHABET = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def render_text_page(rng, width, height, margin=0.1, line_height=None, background=255):
+    """
+    Renders a flat page with random text lines.
+
+    Args:
+        rng: numpy.random.Generator
+        width, height: Page size in pixels
+        margin: Text margin as a fraction of the page size
+        line_height: Distance between text lines in pixels (default - 1/40 of the height)
+        background: Page brightness
+
+    Returns:
+        page: BGR image of shape [height, width, 3]
+    """
+    page = np.full((height, width, 3), background, dtype=np.uint8)
+    if line_height is None:
+        line_height = max(12, height // 40)
+    font_scale = line_height / 40
+    thickness = max(1, int(round(font_scale * 1.5)))
+
+    x0, x1 = int(width * margin), int(width * (1 - margin))
+    y = int(height * margin) + line_height
+    while y < height * (1 - margin):
+        x = x0
+        while True:
+            word = "".join(rng.choice(_ALPHABET, rng.integers(2, 10)))
+            (w, _), _ = cv2.getTextSize(word, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            if x + w > x1:
+                break
+            cv2.putText(page, word, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        (0, 0, 0), thickness, cv2.LINE_AA)
+            x += w + line_height // 2
+        y += line_height
+    return page
+
+
+def random_edges(rng, width, height, margin=0.08, bend=0.05, skew=0.02, points_per_edge=6):
+    """
+    Generates random curved boundaries of a page region.
+
+    Top and bottom edges are bent like a page of an open book, the corners are
+    jittered and the side edges are slightly curved.
+
+    Args:
+        rng: numpy.random.Generator
+        width, height: Image size in pixels
+        margin: Mean distance from the region to the image border (fraction of the size)
+        bend: Maximum bend of the top and bottom edges (fraction of the height)
+        skew: Maximum corner jitter (fraction of the size)
+        points_per_edge: Number of points on every edge
+
+    Returns:
+        edges: Dict with edge_top, edge_bottom, edge_left, edge_right in
+            the format of AppState.edge_points_lists
+    """
+    size = np.array([width, height], dtype=np.float64)
+    jitter = lambda: rng.uniform(-skew, skew, 2) * size
+    tl = np.array([margin, margin]) * size + jitter()
+    tr = np.array([1 - margin, margin]) * size + jitter()
+    bl = np.array([margin, 1 - margin]) * size + jitter()
+    br = np.array([1 - margin, 1 - margin]) * size + jitter()
+
+    u = np.linspace(0, 1, points_per_edge)[:, None]
+    # Изгиб: сумма полуволны и смещенной волны, чтобы кривые были несимметричными
+    def bow(amplitude, axis):
+        phase = rng.uniform(0, np.pi)
+        offset = amplitude * (np.sin(np.pi * u) + 0.3 * np.sin(2 * np.pi * u + phase))
+        vector = np.zeros((1, 2))
+        vector[0, axis] = 1
+        return offset * vector
+
+    top = tl + (tr - tl) * u + bow(rng.uniform(-bend, bend) * height, 1)
+    bottom = bl + (br - bl) * u + bow(rng.uniform(-bend, bend) * height, 1)
+    left = tl + (bl - tl) * u + bow(rng.uniform(-skew, skew) * width, 0)
+    right = tr + (br - tr) * u + bow(rng.uniform(-skew, skew) * width, 0)
+
+    to_points = lambda pts: [(int(round(x)), int(round(y))) for x, y in pts]
+    return {
+        "edge_top": to_points(top),
+        "edge_bottom": to_points(bottom),
+        "edge_left": to_points(left[1:-1]),
+        "edge_right": to_points(right[1:-1]),
+    }
+
+
+def _bilinear_lattice(grid, u, v):
+    """
+    Piecewise-bilinear interpolation of a forward grid and its derivatives.
+
+    Args:
+        grid: Forward grid [n, n, 2], grid[i, j] = P(i / (n-1), j / (n-1))
+        u, v: Grid coordinates (s and t times n-1); outside [0, n-1] the
+            border cells are extrapolated linearly
+
+    Returns:
+        point, d_u, d_v: Interpolated points and partial derivatives, each [..., 2]
+    """
+    n = grid.shape[0]
+    flat = grid.reshape(-1, 2)
+    i = np.clip(np.floor(u), 0, n - 2).astype(np.intp)
+    j = np.clip(np.floor(v), 0, n - 2).astype(np.intp)
+    fu = (u - i)[..., None]
+    fv = (v - j)[..., None]
+    # Один плоский индекс на ячейку вместо четырех двумерных
+    index = i * n + j
+    p00, p01 = flat[index], flat[index + 1]
+    p10, p11 = flat[index + n], flat[index + n + 1]
+    d_u = (p10 - p00) * (1 - fv) + (p11 - p01) * fv
+    d_v = (p01 - p00) * (1 - fu) + (p11 - p10) * fu
+    point = p00 + (p10 - p00) * fu + d_v * fv
+    return point, d_u, d_v
+
+
+def invert_lattice(grid, targets, iterations=8, tolerance=0.5, converged=1e-3):
+    """
+    Inverts a forward grid at the target points with Newton's method.
+
+    The forward map is the piecewise-bilinear interpolation of the grid; the
+    iteration starts from the affine map fitted to the grid corners and runs
+    for all targets at once with NumPy, dropping the targets whose step is
+    already below converged. Targets outside the region are extrapolated from
+    the border cells, so they get grid coordinates outside [0, n-1]; targets
+    where the iteration does not converge are marked with nan.
+
+    Args:
+        grid: Forward grid [n, n, 2], grid[i, j] = P(i / (n-1), j / (n-1))
+        targets: Points to invert [m, 2]
+        iterations: Maximum number of Newton steps
+        tolerance: Maximum residual in pixels of a converged target
+        converged: Step in grid cells below which a target stops iterating
+
+    Returns:
+        uv: Grid coordinates [m, 2] (u along s, v along t)
+    """
+    n = grid.shape[0]
+    corners_uv = np.array([[0, 0], [n - 1, 0], [0, n - 1], [n - 1, n - 1]], dtype=np.float64)
+    corners_xy = np.stack([grid[0, 0], grid[-1, 0], grid[0, -1], grid[-1, -1]])
+    # Начальное приближение - аффинное отображение, подобранное по четырем углам
+    affine, *_ = np.linalg.lstsq(np.column_stack([corners_xy, np.ones(4)]), corners_uv, rcond=None)
+    uv = np.column_stack([targets, np.ones(len(targets))]) @ affine
+
+    active = np.arange(len(targets))
+    for _ in range(iterations):
+        u, v = uv[active, 0], uv[active, 1]
+        point, d_u, d_v = _bilinear_lattice(grid, u, v)
+        rx, ry = (targets[active] - point).T
+        det = d_u[:, 0] * d_v[:, 1] - d_u[:, 1] * d_v[:, 0]
+        det = np.where(np.abs(det) < 1e-12, 1e-12, det)
+        du = (rx * d_v[:, 1] - ry * d_v[:, 0]) / det
+        dv = (ry * d_u[:, 0] - rx * d_u[:, 1]) / det
+        uv[active, 0] = np.clip(u + du, -n, 2 * n)
+        uv[active, 1] = np.clip(v + dv, -n, 2 * n)
+        active = active[np.maximum(np.abs(du), np.abs(dv)) > converged]
+        if not len(active):
+            break
+
+    point, _, _ = _bilinear_lattice(grid, uv[:, 0], uv[:, 1])
+    residual = np.hypot(*(targets - point).T)
+    uv[residual > tolerance] = np.nan
+    return uv
+
+
+def invert_mesh_maps(mesh_func, width, height, flat_size=None, grid_size=65, step=8):
+    """
+    Computes remap maps from the warped image back to the flat page.
+
+    The Coons mapping (s, t) -> (x, y) is evaluated on a coarse grid and
+    inverted with Newton's method (invert_lattice()) at a coarse lattice of
+    output pixels, which is then upsampled to full size with cv2.resize.
+    Pixels outside the region get coordinates outside the flat page, so
+    cv2.remap fills them with the border value.
+
+    Args:
+        mesh_func: Mesh function of the region
+        width, height: Size of the warped image
+        flat_size: Size (width, height) of the flat page (default - the same as the warped image)
+        grid_size: Number of coarse grid lines in each direction
+        step: Lattice step in pixels of the warped image
+
+    Returns:
+        map_x, map_y: float32 maps of shape [height, width] into the flat page
+    """
+    flat_width, flat_height = flat_size or (width, height)
+    s_lines, _ = sample_grid_lines(mesh_func, grid_size, grid_size)
+    grid = np.asarray(s_lines, dtype=np.float64)
+
+    # Узлы решетки в центрах блоков step x step: тогда растяжение cv2.resize
+    # в step раз попадает точно в пиксели результата
+    nx, ny = -(-width // step), -(-height // step)
+    xs = (np.arange(nx) + 0.5) * step - 0.5
+    ys = (np.arange(ny) + 0.5) * step - 0.5
+    query = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    uv = invert_lattice(grid, query) / (grid_size - 1)
+    # Координаты плоской страницы: s по горизонтали, t снизу вверх;
+    # несошедшиеся узлы (далеко вне области) отправляются за пределы страницы
+    coarse = np.stack([uv[:, 0] * (flat_width - 1), (1 - uv[:, 1]) * (flat_height - 1)], axis=-1)
+    coarse = np.nan_to_num(coarse, nan=-1e4).reshape(ny, nx, 2).astype(np.float32)
+
+    maps = cv2.resize(coarse, (nx * step, ny * step), interpolation=cv2.INTER_LINEAR)[:height, :width]
+    return np.ascontiguousarray(maps[..., 0]), np.ascontiguousarray(maps[..., 1])
+
+
+def warp_page(flat, edges, size=None, background=(255, 255, 255), interpolation=cv2.INTER_LINEAR,
+              model=DEFAULT_WARP_MODEL, **kwargs):
+    """
+    Warps a flat page into the region bounded by the given edges.
+
+    This is the inverse of the dewarp: dewarping the result with the same
+    edges and model gives back the flat page resized to the warped image size.
+
+    Args:
+        flat: Flat page image
+        edges: Edge points in the format of AppState.edge_points_lists
+        size: Size (width, height) of the warped image (default - the size of the flat page)
+        background: Color outside the region
+        interpolation: Interpolation method
+        model: Warp model of the page, one of core.warp_models.WARP_MODELS
+        **kwargs: Parameters of invert_mesh_maps()
+
+    Returns:
+        warped: Warped image
+    """
+    flat_height, flat_width = flat.shape[:2]
+    width, height = size or (flat_width, flat_height)
+    mesh_func = build_warp_model(model, *preprocess_edges(**edges))
+    map_x, map_y = invert_mesh_maps(mesh_func, width, height, (flat_width, flat_height), **kwargs)
+    return cv2.remap(flat, map_x, map_y, interpolation=interpolation,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=background)
+
+
+def curve_page(flat, rng, size=None, background=(255, 255, 255), **edge_kwargs):
+    """
+    Curves a flat page with random boundaries.
+
+    Args:
+        flat: Flat page image
+        rng: numpy.random.Generator
+        size: Size (width, height) of the curved image (default - the size of the flat page)
+        background: Color outside the region
+        **edge_kwargs: Parameters of random_edges() (margin, bend, skew, points_per_edge)
+
+    Returns:
+        warped, edges: Curved image and its boundaries in the format of AppState.edge_points_lists
+    """
+    width, height = size or (flat.shape[1], flat.shape[0])
+    edges = random_edges(rng, width, height, **edge_kwargs)
+    return warp_page(flat, edges, (width, height), background), edges
+
+
+def iter_curved_pages(flats, count, seed=0, size=None, executor=None, timeout=None, **edge_kwargs):
+    """
+    Generates count curved versions of flat pages for training data.
+
+    Every image gets its own generator seeded with (seed, index), so the
+    result depends only on seed and the image number, not on scheduling.
+    Images are curved in parallel; at most twice the pool size is in flight,
+    so memory stays bounded for any count, and results come out in order.
+
+    Args:
+        flats: List of flat page images; each image takes a random one of them
+        count: Number of images to generate
+        seed: Seed of the random generators
+        size: Size (width, height) of the curved images (default - the size of the flat page)
+        executor: BoundedExecutor or concurrent.futures executor
+            (default - the shared pool from core.workers)
+        timeout: Maximum time to wait for a free slot of a BoundedExecutor
+        **edge_kwargs: Parameters of random_edges()
+
+    Yields:
+        index, warped, edges: Image number, curved image and its boundaries
+    """
+    if not len(flats):
+        raise ValueError("Нет плоских страниц для генерации")
+    if executor is None:
+        from .workers import get_shared_executor
+        executor = get_shared_executor()
+    bounded = hasattr(executor, "max_workers")
+    window = 2 * (executor.max_workers if bounded else getattr(executor, "_max_workers", 1))
+
+    def task(index):
+        rng = np.random.default_rng([seed, index])
+        flat = flats[int(rng.integers(len(flats)))]
+        return curve_page(flat, rng, size, **edge_kwargs)
+
+    pending = []
+    for index in range(count):
+        pending.append((index, executor.submit(task, index, timeout=timeout) if bounded
+                        else executor.submit(task, index)))
+        if len(pending) >= window:
+            done_index, future = pending.pop(0)
+            yield (done_index, *future.result())
+    for done_index, future in pending:
+        yield (done_index, *future.result())
@@ -0,0 +1,132 @@
+import math
+from collections import OrderedDict
+import cv2
+from .image_io import encode_image_base64
+
+
+class TilePyramid:
+    """
+    Multi-resolution tile pyramid of an image for the deep-zoom viewer.
+
+    Level 0 is the full-resolution image, every next level is downscaled by 2
+    until the whole image fits into a single tile. Tiles are encoded on first
+    request and kept in an LRU cache, so only the visible tiles are ever encoded.
+    """
+
+    def __init__(self, image, tile_size=256, ext=".jpg", quality=85, max_cached_tiles=512):
+        """
+        Builds the pyramid levels.
+
+        Args:
+            image: Full-resolution image
+            tile_size: Tile size in pixels of its own level
+            ext: Tile encoding format (".jpg" or ".webp")
+            quality: Tile encoding quality
+            max_cached_tiles: Maximum number of encoded tiles kept in memory
+        """
+        self.tile_size = tile_size
+        self.ext = ext
+        self.quality = quality
+        self.max_cached_tiles = max_cached_tiles
+        self.height, self.width = image.shape[:2]
+
+        self.levels = [image]
+        while max(self.levels[-1].shape[:2]) > tile_size:
+            prev = self.levels[-1]
+            size = (max(1, (prev.shape[1] + 1) // 2), max(1, (prev.shape[0] + 1) // 2))
+            self.levels.append(cv2.resize(prev, size, interpolation=cv2.INTER_AREA))
+
+        self._tiles = OrderedDict()
+
+    @property
+    def num_levels(self):
+        return len(self.levels)
+
+    def level_factors(self, level):
+        """
+        Returns the number of full-resolution pixels per pixel of the level.
+        Computed from the real level size, since odd sizes are rounded up.
+
+        Returns:
+            factor_x, factor_y: Horizontal and vertical factors
+        """
+        level_height, level_width = self.levels[level].shape[:2]
+        return self.width / level_width, self.height / level_height
+
+    def level_for_scale(self, scale):
+        """
+        Chooses the coarsest level that still has at least one level pixel
+        per display pixel.
+
+        Args:
+            scale: Display pixels per full-resolution pixel
+
+        Returns:
+            level: Pyramid level index
+        """
+        if scale <= 0:
+            return self.num_levels - 1
+        level = int(math.floor(math.log2(1.0 / scale))) if scale < 1 else 0
+        return min(max(level, 0), self.num_levels - 1)
+
+    def visible_tiles(self, level, x0, y0, x1, y1):
+        """
+        Lists the tiles of a level that intersect a rectangle.
+
+        Args:
+            level: Pyramid level index
+            x0, y0, x1, y1: Visible rectangle in full-resolution coordinates
+
+        Returns:
+            tiles: List of (col, row) tile indices
+        """
+        factor_x, factor_y = self.level_factors(level)
+        level_height, level_width = self.levels[level].shape[:2]
+        cols = math.ceil(level_width / self.tile_size)
+        rows = math.ceil(level_height / self.tile_size)
+
+        span_x = self.tile_size * factor_x
+        span_y = self.tile_size * factor_y
+        col0 = max(0, int(x0 // span_x))
+        row0 = max(0, int(y0 // span_y))
+        col1 = min(cols - 1, int(math.ceil(x1 / span_x)) - 1)
+        row1 = min(rows - 1, int(math.ceil(y1 / span_y)) - 1)
+
+        return [(col, row) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+    def tile_bounds(self, level, col, row):
+        """
+        Returns the bounds of a tile in full-resolution coordinates.
+
+        Returns:
+            x, y, width, height: Tile rectangle
+        """
+        factor_x, factor_y = self.level_factors(level)
+        level_height, level_width = self.levels[level].shape[:2]
+        x = col * self.tile_size
+        y = row * self.tile_size
+        w = min(self.tile_size, level_width - x)
+        h = min(self.tile_size, level_height - y)
+        return x * factor_x, y * factor_y, w * factor_x, h * factor_y
+
+    def get_tile(self, level, col, row):
+        """
+        Returns a base64-encoded tile, encoding it on the first request.
+
+        Returns:
+            data: Base64-encoded tile image for ft.Image.src_base64
+        """
+        key = (level, col, row)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+
+        y = row * self.tile_size
+        x = col * self.tile_size
+        tile = self.levels[level][y:y + self.tile_size, x:x + self.tile_size]
+        data = encode_image_base64(tile, ext=self.ext, quality=self.quality)
+
+        self._tiles[key] = data
+        if len(self._tiles) > self.max_cached_tiles:
+            self._tiles.popitem(last=False)
+        return data
@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+
+# Тяжелые модули, которые нужны только после загрузки изображения
+HEAVY_MODULES = (
+    "numpy",
+    "cv2",
+    "scipy.interpolate",
+    "core.grid_utils",
+    "core.tile_pyramid",
+    "core.mesh_validation",
+    "core.pipeline",
+)
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def warm_up(modules=HEAVY_MODULES):
+    """Imports the modules; failures are ignored, the real import reports them later."""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def start_warmup(modules=HEAVY_MODULES):
+    """
+    Imports heavy modules on a background thread, once per process.
+
+    The import lock makes a concurrent import from the UI thread wait for the
+    warm-up of the same module instead of importing it twice.
+
+    Args:
+        modules: Names of the modules to import
+
+    Returns:
+        thread: The warm-up thread
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, args=(tuple(modules),),
+                                              name="warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
@@ -0,0 +1,179 @@
+import numpy as np
+import cv2
+from .grid_utils import build_fast_mesh_function, preprocess_edges
+
+
+# Версия формата файла поля деформации
+WARP_FIELD_VERSION = 1
+
+
+class WarpField:
+    """
+    Compact factored representation of a Coons warp.
+
+    For a Coons patch the full-size map_x/map_y are determined by the four
+    boundary curves sampled at the output pixels (two vectors of length W,
+    two of length H) and the four corners:
+
+        P(s, t) = (1-t) B(s) + t T(s) + (1-s) L(t) + s R(t)
+                  - [(1-s)(1-t) P00 + s(1-t) P10 + (1-s)t P01 + st P11]
+
+    so the warp is stored in O(H + W) memory and expanded into maps for any
+    tile on demand, without rebuilding the splines.
+    """
+
+    def __init__(self, width, height, top, bottom, left, right, corners):
+        """
+        Args:
+            width, height: Output size in pixels
+            top, bottom: Top and bottom boundaries at the output columns, shape [width, 2]
+            left, right: Left and right boundaries at the output rows (top to bottom), shape [height, 2]
+            corners: Corners P00, P10, P01, P11 (bottom-left, bottom-right, top-left, top-right), shape [4, 2]
+        """
+        self.width = int(width)
+        self.height = int(height)
+        self.top = np.asarray(top, dtype=np.float32).reshape(self.width, 2)
+        self.bottom = np.asarray(bottom, dtype=np.float32).reshape(self.width, 2)
+        self.left = np.asarray(left, dtype=np.float32).reshape(self.height, 2)
+        self.right = np.asarray(right, dtype=np.float32).reshape(self.height, 2)
+        self.corners = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+
+    @classmethod
+    def from_mesh(cls, mesh_func, width, height):
+        """
+        Samples the boundaries of a Coons mesh function at the output pixels.
+
+        The Coons projector reproduces any Coons patch exactly from its own
+        boundaries, so the expanded maps match compute_remap_maps().
+
+        Args:
+            mesh_func: Mesh function (s, t) -> (x, y)
+            width, height: Output size in pixels
+        """
+        s = (np.arange(width, dtype=np.float32) / (width - 1))
+        t = ((height - 1 - np.arange(height, dtype=np.float32)) / (height - 1))
+
+        # Все границы и углы вычисляются одним пакетным вызовом
+        n = max(width, height, 4)
+        pad = lambda v: np.pad(v, (0, n - len(v)))
+        s_rows = np.stack([pad(s), pad(s), np.zeros(n), np.ones(n), [0, 1, 0, 1] + [0] * (n - 4)])
+        t_rows = np.stack([np.ones(n), np.zeros(n), pad(t), pad(t), [0, 0, 1, 1] + [0] * (n - 4)])
+        res = np.asarray(mesh_func(s_rows.astype(np.float32), t_rows.astype(np.float32)))
+
+        return cls(width, height,
+                   top=res[0, :width], bottom=res[1, :width],
+                   left=res[2, :height], right=res[3, :height],
+                   corners=res[4, :4])
+
+    @classmethod
+    def from_edges(cls, edges, width, height, tolerance=1.0):
+        """
+        Builds the warp field from boundary points.
+
+        Args:
+            edges: Edge points in the format of AppState.edge_points_lists
+            width, height: Output size in pixels
+            tolerance: Approximation tolerance for dense edges
+        """
+        mesh_func = build_fast_mesh_function(*preprocess_edges(**edges), tolerance=tolerance)
+        return cls.from_mesh(mesh_func, width, height)
+
+    @property
+    def nbytes(self):
+        """Size of the descriptor data in bytes"""
+        return sum(a.nbytes for a in (self.top, self.bottom, self.left, self.right, self.corners))
+
+    def maps(self, y0=0, y1=None, x0=0, x1=None):
+        """
+        Expands the warp into remap maps for a rectangular region of the output.
+
+        Args:
+            y0, y1: Row range of the region (y1 defaults to height)
+            x0, x1: Column range of the region (x1 defaults to width)
+
+        Returns:
+            map_x, map_y: float32 arrays of shape [y1 - y0, x1 - x0]
+        """
+        if y1 is None:
+            y1 = self.height
+        if x1 is None:
+            x1 = self.width
+
+        s = (np.arange(x0, x1, dtype=np.float32) / (self.width - 1))[None, :, None]
+        t = ((self.height - 1 - np.arange(y0, y1, dtype=np.float32)) / (self.height - 1))[:, None, None]
+        top = self.top[None, x0:x1]
+        bottom = self.bottom[None, x0:x1]
+        left = self.left[y0:y1, None]
+        right = self.right[y0:y1, None]
+        p00, p10, p01, p11 = self.corners
+
+        res = ((1 - t) * bottom + t * top
+               + (1 - s) * left + s * right
+               - ((1 - t) * (1 - s) * p00 + (1 - t) * s * p10 + t * (1 - s) * p01 + t * s * p11))
+        return np.ascontiguousarray(res[..., 0]), np.ascontiguousarray(res[..., 1])
+
+    def iter_tiles(self, tile_size=512):
+        """
+        Expands the warp tile by tile.
+
+        Yields:
+            (x0, y0, x1, y1), map_x, map_y: Tile bounds in the output and its maps
+        """
+        for y0 in range(0, self.height, tile_size):
+            y1 = min(y0 + tile_size, self.height)
+            for x0 in range(0, self.width, tile_size):
+                x1 = min(x0 + tile_size, self.width)
+                yield (x0, y0, x1, y1), *self.maps(y0, y1, x0, x1)
+
+    def apply(self, image, tile_size=512, interpolation=cv2.INTER_CUBIC, border_mode=cv2.BORDER_CONSTANT):
+        """
+        Applies the warp to an image, expanding the maps one tile at a time,
+        so full-size maps are never held in memory.
+
+        Args:
+            image: Input image
+            tile_size: Tile size in output pixels
+            interpolation: Interpolation method
+            border_mode: Border handling mode
+
+        Returns:
+            result: Output image of shape [height, width, ...]
+        """
+        result = np.empty((self.height, self.width) + image.shape[2:], dtype=image.dtype)
+        for (x0, y0, x1, y1), map_x, map_y in self.iter_tiles(tile_size):
+            cv2.remap(image, map_x, map_y, interpolation=interpolation,
+                      borderMode=border_mode, dst=result[y0:y1, x0:x1])
+        return result
+
+    def save(self, path):
+        """
+        Writes the warp field into a versioned .npz file.
+
+        Args:
+            path: Output file path
+        """
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                version=np.int32(WARP_FIELD_VERSION),
+                size=np.array([self.width, self.height], dtype=np.int64),
+                top=self.top, bottom=self.bottom,
+                left=self.left, right=self.right,
+                corners=self.corners
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a warp field written by WarpField.save().
+
+        Args:
+            path: Path to the .npz file
+        """
+        with np.load(path) as data:
+            version = int(data["version"]) if "version" in data else None
+            if version != WARP_FIELD_VERSION:
+                raise ValueError(f"Неподдерживаемая версия файла деформации: {version}")
+            width, height = (int(v) for v in data["size"])
+            return cls(width, height, data["top"], data["bottom"],
+                       data["left"], data["right"], data["corners"])
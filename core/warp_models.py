@@ -0,0 +1,186 @@
+import numpy as np
+from .grid_utils import build_fast_mesh_function, sample_edge
+
+
+# Модели деформации: трансфинитный патч Кунса, сплайн тонкой пластины,
+# радиальные базисные функции и кусочно-аффинная триангуляция
+WARP_MODELS = ("coons", "tps", "rbf", "piecewise_affine")
+DEFAULT_WARP_MODEL = "coons"
+
+# Число линий грубой сетки (s, t), на которой вычисляются модели кроме Кунса
+DEFAULT_GRID_SIZE = 65
+
+# Число точек соответствия на каждой границе
+DEFAULT_EDGE_SAMPLES = 16
+
+
+def boundary_correspondences(edge_top, edge_bottom, edge_left, edge_right, samples_per_edge=DEFAULT_EDGE_SAMPLES,
+                             tolerance=1.0):
+    """
+    Point correspondences (s, t) -> (x, y) along the four edges.
+
+    Every edge is sampled with the same edge spline as the Coons mesh
+    (sample_edge()), uniformly in its natural parameter, so all models share
+    the boundary of the Coons patch and differ only inside the region. The
+    corners are taken once, from the top and bottom edges.
+
+    Args:
+        edge_top, edge_bottom, edge_left, edge_right: Edges after preprocess_edges()
+        samples_per_edge: Number of samples on every edge
+        tolerance: Smoothing tolerance of dense edges in pixels
+
+    Returns:
+        st, xy: Arrays [n, 2] of parameters and image points
+    """
+    u = np.linspace(0, 1, samples_per_edge)
+    top = sample_edge(edge_top, tolerance, samples_per_edge)
+    bottom = sample_edge(edge_bottom, tolerance, samples_per_edge)
+    # Левая и правая границы после preprocess_edges() идут снизу вверх, как параметр t
+    left = sample_edge(edge_left, tolerance, samples_per_edge)[1:-1]
+    right = sample_edge(edge_right, tolerance, samples_per_edge)[1:-1]
+    inner = u[1:-1]
+
+    st = np.concatenate([
+        np.column_stack([u, np.ones_like(u)]),
+        np.column_stack([u, np.zeros_like(u)]),
+        np.column_stack([np.zeros_like(inner), inner]),
+        np.column_stack([np.ones_like(inner), inner]),
+    ])
+    xy = np.concatenate([top, bottom, left, right])
+    return st, xy
+
+
+class GridWarp:
+    """
+    Warp model (s, t) -> (x, y) evaluated on a coarse grid.
+
+    Scattered-data models (thin-plate spline, RBF, triangulation) are too slow
+    to evaluate at every output pixel, so they are evaluated once on a
+    grid_size x grid_size grid of (s, t) and interpolated bilinearly. The
+    object is a mesh function, so every remap path accepts it; maps() computes
+    the remap maps of a region separably, as BilinearMesh.maps() does.
+    """
+
+    def __init__(self, func, grid_size=DEFAULT_GRID_SIZE, name=None):
+        """
+        Args:
+            func: Model function of points [m, 2] in (s, t) returning points [m, 2] in (x, y)
+            grid_size: Number of grid lines in each direction
+            name: Model name for reports
+        """
+        self.name = name
+        self.grid_size = grid_size
+        u = np.linspace(0, 1, grid_size)
+        s, t = np.meshgrid(u, u)
+        # Строки сетки - значения t, столбцы - значения s
+        values = np.asarray(func(np.column_stack([s.ravel(), t.ravel()])), dtype=np.float64)
+        self.grid = values.reshape(grid_size, grid_size, 2).astype(np.float32)
+
+    def _weights(self, values):
+        # Индекс ячейки и доля внутри нее; вне [0, 1] значения берутся с границы сетки
+        position = np.clip(np.asarray(values, dtype=np.float64), 0, 1) * (self.grid_size - 1)
+        index = np.minimum(position.astype(np.intp), self.grid_size - 2)
+        return index, (position - index).astype(np.float32)
+
+    def __call__(self, s, t):
+        i, fx = self._weights(s)
+        j, fy = self._weights(t)
+        i, j = np.broadcast_arrays(i, j)
+        fx, fy = (np.broadcast_to(f, i.shape)[..., None] for f in (fx, fy))
+        grid = self.grid
+        lower = grid[j, i] * (1 - fx) + grid[j, i + 1] * fx
+        upper = grid[j + 1, i] * (1 - fx) + grid[j + 1, i + 1] * fx
+        return lower * (1 - fy) + upper * fy
+
+    def maps(self, width, height, y0=0, y1=None, x0=0, x1=None):
+        """Same as compute_remap_maps_region(): interpolation along s for every grid row, then along t."""
+        y1 = height if y1 is None else y1
+        x1 = width if x1 is None else x1
+        i, fx = self._weights(np.arange(x0, x1) / (width - 1))
+        j, fy = self._weights((height - 1 - np.arange(y0, y1)) / (height - 1))
+        fy = fy[:, None]
+        maps = []
+        for axis in range(2):
+            grid = self.grid[..., axis]
+            rows = grid[:, i] * (1 - fx) + grid[:, i + 1] * fx
+            maps.append(rows[j] * (1 - fy) + rows[j + 1] * fy)
+        return maps[0], maps[1]
+
+
+def fit_tps(st, xy, smoothing=0.0):
+    """Thin-plate spline interpolating the correspondences (minimum bending energy inside)."""
+    from scipy.interpolate import RBFInterpolator
+    return RBFInterpolator(st, xy, kernel="thin_plate_spline", smoothing=smoothing)
+
+
+def fit_rbf(st, xy, kernel="cubic", smoothing=0.0, epsilon=None):
+    """
+    Radial basis function interpolant of the correspondences.
+
+    Args:
+        kernel: Kernel of scipy.interpolate.RBFInterpolator; the default
+            polyharmonic "cubic" kernel needs no shape parameter
+        epsilon: Shape parameter of kernels that need one (gaussian, multiquadric, ...)
+    """
+    from scipy.interpolate import RBFInterpolator
+    options = {} if epsilon is None else {"epsilon": epsilon}
+    return RBFInterpolator(st, xy, kernel=kernel, smoothing=smoothing, **options)
+
+
+def fit_piecewise_affine(st, xy):
+    """Piecewise-affine map over the Delaunay triangulation of the correspondences in (s, t)."""
+    from scipy.interpolate import LinearNDInterpolator, NearestNDInterpolator
+    linear = LinearNDInterpolator(st, xy)
+    nearest = NearestNDInterpolator(st, xy)
+
+    def evaluate(points):
+        values = linear(points)
+        # Точки на границе квадрата могут оказаться вне триангуляции из-за округления
+        missing = np.isnan(values[:, 0])
+        if missing.any():
+            values[missing] = nearest(points[missing])
+        return values
+
+    return evaluate
+
+
+_FITTERS = {
+    "tps": fit_tps,
+    "rbf": fit_rbf,
+    "piecewise_affine": fit_piecewise_affine,
+}
+
+
+def build_warp_model(model, edge_top, edge_bottom, edge_left, edge_right, grid_size=DEFAULT_GRID_SIZE,
+                     samples_per_edge=DEFAULT_EDGE_SAMPLES, interior=None, tolerance=1.0, **options):
+    """
+    Builds the mesh function of a warp model from the edges.
+
+    All models map the output parameters (s, t) to source pixels, so the
+    result is accepted by every remap path (dewarp_image(), dewarp_for_ocr(),
+    compute_remap_maps_region(), parallel_dewarp(), warp_page()).
+
+    Args:
+        model: One of WARP_MODELS
+        edge_top, edge_bottom, edge_left, edge_right: Edges after preprocess_edges()
+        grid_size: Grid size of the scattered-data models (see GridWarp)
+        samples_per_edge: Correspondences per edge of the scattered-data models
+        interior: Extra correspondences inside the region for local
+            deformations, pair of arrays (st [k, 2], xy [k, 2]); not used by "coons"
+        tolerance: Smoothing tolerance of dense edges in pixels
+        **options: Options of the model (build_fast_mesh_function() for "coons",
+            fit_tps() / fit_rbf() for the others)
+
+    Returns:
+        mesh_func: BilinearMesh or the Coons mesh function for "coons", GridWarp otherwise
+    """
+    if model == "coons":
+        return build_fast_mesh_function(edge_top, edge_bottom, edge_left, edge_right, tolerance=tolerance, **options)
+    if model not in _FITTERS:
+        raise ValueError(f"Неизвестная модель деформации: {model}")
+
+    st, xy = boundary_correspondences(edge_top, edge_bottom, edge_left, edge_right, samples_per_edge, tolerance)
+    if interior is not None:
+        interior_st, interior_xy = (np.asarray(a, dtype=np.float64).reshape(-1, 2) for a in interior)
+        st, xy = np.concatenate([st, interior_st]), np.concatenate([xy, interior_xy])
+    return GridWarp(_FITTERS[model](st, xy, **options), grid_size, name=model)
@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Переменные окружения для настройки общего пула
+WORKERS_ENV = "TEXT_IMAGE_TOOL_WORKERS"
+QUEUE_ENV = "TEXT_IMAGE_TOOL_QUEUE"
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded number of queued tasks.
+
+    cv2.remap and the NumPy kernels of the mesh release the GIL, so threads give
+    real parallelism for warps. The queue bound gives backpressure: when every
+    worker is busy and the queue is full, submit() blocks instead of piling up
+    full-size images in memory.
+    """
+
+    def __init__(self, max_workers, max_queued=None):
+        """
+        Args:
+            max_workers: Number of worker threads
+            max_queued: Number of tasks allowed to wait for a worker (default - max_workers)
+        """
+        if max_queued is None:
+            max_queued = max_workers
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warp")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+
+    def submit(self, fn, *args, timeout=None, **kwargs):
+        """
+        Schedules fn(*args, **kwargs) on the pool.
+
+        Args:
+            fn: Function to run
+            timeout: Maximum time to wait for a free slot in seconds (None - wait forever)
+
+        Returns:
+            future: concurrent.futures.Future of the task
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Пул обработки перегружен, попробуйте позже")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Runs fn on the pool and waits for the result."""
+        return self.submit(fn, *args, timeout=timeout, **kwargs).result()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_executor():
+    """
+    Returns the process-wide pool shared by all sessions.
+    The pool size is taken from TEXT_IMAGE_TOOL_WORKERS (default - number of CPUs).
+    """
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            max_workers = int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1))
+            max_queued = int(os.environ.get(QUEUE_ENV, max_workers * 2))
+            _shared_executor = BoundedExecutor(max(1, max_workers), max(0, max_queued))
+        return _shared_executor
@@ -11,7 +11,8 @@ class ControlPanelComponent:
                 on_clear=None, 
                 on_save=None, 
                 on_load=None, 
-                on_grid_toggle=None):
+                on_grid_toggle=None,
+                on_new_region=None):
         """
         Инициализирует панель управления.
         
@@ -22,6 +23,7 @@ class ControlPanelComponent:
             on_save: Обработчик нажатия кнопки сохранения
             on_load: Обработчик нажатия кнопки загрузки
             on_grid_toggle: Обработчик переключения отображения сетки
+            on_new_region: Обработчик нажатия кнопки новой области
         """
         self.state = state
         
@@ -65,6 +67,14 @@ class ControlPanelComponent:
             on_click=on_load if on_load else lambda _: None
         )
         
+        # Кнопка завершения текущей области (колонка, страница разворота) и начала новой
+        self.new_region_button = ft.ElevatedButton(
+            "Новая область",
+            icon=ft.icons.ADD_BOX_OUTLINED,
+            on_click=on_new_region if on_new_region else lambda _: None,
+            disabled=True  # Активна, когда текущая область размечена
+        )
+        
         # Создаем чекбокс для отображения сетки
         self.show_grid_checkbox = ft.Checkbox(
             label="Показать сетку",
@@ -94,6 +104,8 @@ class ControlPanelComponent:
     def update_coords_text(self):
         """Обновляет текст с координатами точек"""
         points_text = ""
+        if self.state.regions:
+            points_text += f"Завершенных областей: {len(self.state.regions)}\n"
         
         for border_name, points in self.state.edge_points_lists.items():
             if points:
@@ -110,8 +122,10 @@ class ControlPanelComponent:
         enough_points = self.state.check_points()
         
         # Обновляем состояние кнопок
-        self.clear_button.disabled = not has_points
-        self.save_button.disabled = not has_points
+        has_regions = bool(self.state.regions)
+        self.clear_button.disabled = not (has_points or has_regions)
+        self.save_button.disabled = not (has_points or has_regions)
+        self.new_region_button.disabled = not enough_points
         
         # Обновляем состояние чекбокса
         self.show_grid_checkbox.disabled = not enough_points
@@ -121,7 +135,8 @@ class ControlPanelComponent:
                     on_clear=None, 
                     on_save=None, 
                     on_load=None, 
-                    on_grid_toggle=None):
+                    on_grid_toggle=None,
+                    on_new_region=None):
         """
         Устанавливает обработчики событий для элементов управления.
         Это позволяет установить обработчики после создания объекта.
@@ -132,6 +147,7 @@ class ControlPanelComponent:
             on_save: Обработчик нажатия кнопки сохранения
             on_load: Обработчик нажатия кнопки загрузки
             on_grid_toggle: Обработчик переключения отображения сетки
+            on_new_region: Обработчик нажатия кнопки новой области
         """
         if on_upload:
             self.upload_button.on_click = on_upload
@@ -146,4 +162,7 @@ class ControlPanelComponent:
             self.load_button.on_click = on_load
             
         if on_grid_toggle:
-            self.show_grid_checkbox.on_change = on_grid_toggle 
\ No newline at end of file
+            self.show_grid_checkbox.on_change = on_grid_toggle
+            
+        if on_new_region:
+            self.new_region_button.on_click = on_new_region 
\ No newline at end of file
@@ -1,4 +1,6 @@
 import flet as ft
+import os
+from typing import Optional
 
 class FilePickerManager:
     """
@@ -19,18 +21,57 @@ class FilePickerManager:
         # Добавляем FilePicker'ы на страницу
         page.overlay.extend([self.image_picker, self.save_picker, self.load_picker])
     
-    def pick_image(self, on_result):
+    def pick_image(self, on_result, upload_subdir: Optional[str] = None,
+                   upload_dir: Optional[str] = None):
         """
         Открывает диалог выбора изображения.
         
+        В web-режиме у выбранного файла нет локального пути: если заданы
+        каталоги загрузки, файл сначала загружается в каталог сессии,
+        а on_result вызывается уже с путем к загруженному файлу.
+        
         Args:
             on_result (function): Функция-обработчик результата выбора
+            upload_subdir: Каталог загрузки относительно upload_dir приложения
+            upload_dir: Тот же каталог в файловой системе
         """
-        self.image_picker.on_result = on_result
+        def on_pick(e: ft.FilePickerResultEvent):
+            if e.files and not e.files[0].path and upload_subdir and upload_dir:
+                self._upload_file(e, upload_subdir, upload_dir, on_result)
+            else:
+                on_result(e)
+        
+        self.image_picker.on_result = on_pick
         self.image_picker.pick_files(
             allowed_extensions=["png", "jpg", "jpeg", "bmp", "gif"]
         )
     
+    def _upload_file(self, e: ft.FilePickerResultEvent, upload_subdir: str,
+                     upload_dir: str, on_result):
+        """Загружает выбранный файл в каталог сессии и передает результат с путем к нему"""
+        file = e.files[0]
+        
+        def on_upload(upload: ft.FilePickerUploadEvent):
+            if upload.error:
+                # Ошибка показывается пользователю в браузере, а не в консоли сервера
+                self.page.snack_bar = ft.SnackBar(
+                    content=ft.Text(f"Ошибка загрузки файла {upload.file_name}: {upload.error}"),
+                    bgcolor=ft.colors.RED
+                )
+                self.page.snack_bar.open = True
+                self.page.update()
+            elif upload.progress is not None and upload.progress >= 1.0:
+                file.path = os.path.join(upload_dir, file.name)
+                on_result(e)
+        
+        self.image_picker.on_upload = on_upload
+        self.image_picker.upload([
+            ft.FilePickerUploadFile(
+                file.name,
+                upload_url=self.page.get_upload_url(f"{upload_subdir}/{file.name}", 600)
+            )
+        ])
+    
     def save_points(self, on_result):
         """
         Открывает диалог сохранения точек.
@@ -65,6 +106,19 @@ class FilePickerManager:
         """
         self.save_picker.on_result = on_result
         self.save_picker.save_file(
-            allowed_extensions=["png", "jpg", "jpeg", "tif", "tiff"],
+            allowed_extensions=["png", "jpg", "jpeg", "webp", "tif", "tiff"],
             file_name="processed_image.png"
+        )
+    
+    def save_warp_field(self, on_result):
+        """
+        Открывает диалог сохранения поля деформации.
+        
+        Args:
+            on_result (function): Функция-обработчик результата сохранения
+        """
+        self.save_picker.on_result = on_result
+        self.save_picker.save_file(
+            allowed_extensions=["npz"],
+            file_name="warp_field.npz"
         ) 
\ No newline at end of file
@@ -1,44 +1,99 @@
+import os
 import flet as ft
 from flet import canvas as canv
-import cv2
-from typing import Callable, Optional
+from typing import Callable, Optional, TYPE_CHECKING
+from core.point_index import PointIndex
 from ..state.app_state import AppState
 
+if TYPE_CHECKING:
+    from core.tile_pyramid import TilePyramid
+
 class ImageDisplay:
-    def __init__(self, state: AppState, height: float, on_point_added: Optional[Callable] = None):
+    # Пределы масштабирования относительно вписанного в окно изображения
+    MIN_ZOOM = 1.0
+    # Максимум - столько экранных пикселей на пиксель исходного изображения
+    MAX_PIXEL_SCALE = 8.0
+    # Множитель масштаба за один шаг колеса мыши
+    ZOOM_STEP = 1.25
+    # Радиус точки в экранных пикселях
+    POINT_RADIUS = 4
+    # Радиус захвата точки для перетаскивания в экранных пикселях
+    HIT_RADIUS = 8
+    # Цвет точек завершенных областей
+    REGION_COLOR = ft.Colors.GREY_600
+
+    def __init__(self, state: AppState, height: float, on_point_added: Optional[Callable] = None,
+                 on_view_changed: Optional[Callable] = None, on_point_moved: Optional[Callable] = None):
         """
         Инициализирует компонент отображения изображения.
-        
+
         Args:
             state: Объект состояния приложения
             height: Высота компонента
             on_point_added: Обработчик добавления точки (может быть установлен позже)
+            on_view_changed: Обработчик изменения масштаба или сдвига (может быть установлен позже)
+            on_point_moved: Обработчик перемещения точки (border, final), final=True
+                по окончании перетаскивания (может быть установлен позже)
         """
         self.state = state
         self.height = height
         self._on_point_added = on_point_added
-        
-        # Создаем компонент изображения
-        self.image = ft.Image(
-            fit=ft.ImageFit.CONTAIN,
+        self.on_view_changed = on_view_changed
+        self.on_point_moved = on_point_moved
+
+        # Пространственный индекс точек в координатах исходного изображения для захвата
+        # и перетаскиваемая точка (граница, индекс)
+        self.point_index = PointIndex()
+        self._drag = None
+
+        # Параметры просмотра: масштаб относительно вписанного изображения
+        # и координаты левого верхнего угла области просмотра в пикселях исходного изображения
+        self.zoom = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+
+        # Видимые тайлы пирамиды: (уровень, столбец, строка) -> ft.Image
+        self._tile_controls = {}
+
+        # Слой тайлов изображения
+        self.image = ft.Stack(
+            [],
             visible=False,
             height=height
         )
-        
+
+        # Слой точек: по одному холсту на границу, все точки границы -
+        # один элемент canv.Points, поэтому добавление точки или загрузка
+        # разметки передается одним изменением, а не сотнями элементов
+        self.point_layers = {border: self._create_point_layer(color)
+                             for border, color in state.colors.items()}
+
+        # Точки завершенных областей - один общий слой под точками текущей области
+        self.regions_layer = self._create_point_layer(self.REGION_COLOR)
+
+        # Холст сетки (между изображением и точками)
+        self._mesh_canvas = None
+
         # Stack для наложения точек на изображение
         self.stack = ft.Stack(
-            [self.image],
-            height=height
+            self._layer_controls(),
+            height=height,
+            clip_behavior=ft.ClipBehavior.HARD_EDGE
         )
-        
-        # GestureDetector для отслеживания кликов
+
+        # GestureDetector для отслеживания кликов, масштабирования и сдвига
         self.gesture = ft.GestureDetector(
             mouse_cursor=ft.MouseCursor.CLICK,
             content=self.stack,
             on_tap_up=self._handle_image_click,
+            on_scroll=self._handle_scroll,
+            on_pan_start=self._handle_pan_start,
+            on_pan_update=self._handle_pan,
+            on_pan_end=self._handle_pan_end,
+            drag_interval=16,
             height=height
         )
-        
+
         # Контейнер для отображения
         self.container = ft.Container(
             content=self.gesture,
@@ -47,114 +102,313 @@ class ImageDisplay:
             height=height,
             alignment=ft.alignment.center
         )
-    
+
     @property
     def on_point_added(self) -> Optional[Callable]:
         """Геттер для обработчика добавления точки"""
         return self._on_point_added
-    
+
     @on_point_added.setter
     def on_point_added(self, callback: Optional[Callable]):
         """Сеттер для обработчика добавления точки"""
         self._on_point_added = callback
-        
+
+    @property
+    def scale(self) -> float:
+        """Количество экранных пикселей на пиксель исходного изображения"""
+        return self.zoom / self.state.ratio
+
+    def to_image(self, x: float, y: float) -> tuple[float, float]:
+        """Переводит локальные координаты компонента в координаты исходного изображения"""
+        return self.offset_x + x / self.scale, self.offset_y + y / self.scale
+
+    def to_view(self, x: float, y: float) -> tuple[float, float]:
+        """Переводит координаты исходного изображения в локальные координаты компонента"""
+        return (x - self.offset_x) * self.scale, (y - self.offset_y) * self.scale
+
     def _handle_image_click(self, e: ft.TapEvent):
         if self.image.visible:
-            # Получаем координаты клика относительно изображения
-            x = e.local_x
-            y = e.local_y
-
-            # Создаем точку
-            point_radius = 4
-            point = ft.Container(
-                content=ft.CircleAvatar(
-                    bgcolor=self.state.colors[self.state.current_border],
-                    radius=point_radius,
-                ),  
-                left=(x-point_radius),
-                top=(y-point_radius)
-            )
-            
+            # Координаты клика переводятся в пиксели исходного изображения
+            # с учетом текущего масштаба и сдвига
+            x, y = self.to_image(e.local_x, e.local_y)
+
             # Сохраняем координаты в состояние
-            self.state.add_point(x, y)
-            self.stack.controls.append(point)
-            
-            # Обновляем UI
-            self.stack.update()
-            
+            self._sync_index()
+            self.state.add_image_point(x, y)
+            border = self.state.current_border
+            self.point_index.insert(border, len(self.state.edge_points_lists[border]) - 1,
+                                    *self.state.edge_points_lists[border][-1])
+
+            # Точка добавляется в слой своей границы, обновляется только этот слой
+            points = self._layer_points(border)
+            points.points.append(self.to_view(x, y))
+            points.update()
+
             # Вызываем callback для обновления панели управления
             if self._on_point_added:
                 self._on_point_added()
-            
-    def set_image(self, image_path: str, ratio: float):
+
+    def _handle_scroll(self, e: ft.ScrollEvent):
+        """Масштабирует изображение колесом мыши относительно курсора"""
+        if not self.image.visible or not e.scroll_delta_y:
+            return
+
+        factor = 1 / self.ZOOM_STEP if e.scroll_delta_y > 0 else self.ZOOM_STEP
+        max_zoom = self.MAX_PIXEL_SCALE * self.state.ratio
+        zoom = min(max(self.zoom * factor, self.MIN_ZOOM), max(max_zoom, self.MIN_ZOOM))
+        if zoom == self.zoom:
+            return
+
+        # Точка под курсором остается на месте
+        anchor_x, anchor_y = self.to_image(e.local_x, e.local_y)
+        self.zoom = zoom
+        self.offset_x = anchor_x - e.local_x / self.scale
+        self.offset_y = anchor_y - e.local_y / self.scale
+        self._update_view()
+
+    def _sync_index(self):
+        """Перестраивает индекс, если точки были загружены или очищены в обход компонента"""
+        count = sum(len(points) for points in self.state.edge_points_lists.values())
+        if count != len(self.point_index):
+            self.point_index.rebuild(self.state.edge_points_lists)
+
+    def _handle_pan_start(self, e: ft.DragStartEvent):
+        """Захватывает точку под курсором; если точки нет, перетаскивание сдвигает изображение"""
+        self._drag = None
+        if not self.image.visible:
+            return
+        self._sync_index()
+        x, y = self.to_image(e.local_x, e.local_y)
+        self._drag = self.point_index.nearest(x, y, self.HIT_RADIUS / self.scale)
+
+    def _handle_pan(self, e: ft.DragUpdateEvent):
+        """Перемещает захваченную точку или сдвигает увеличенное изображение"""
+        if self._drag is not None:
+            self._move_point(e.local_x, e.local_y)
+            return
+        if not self.image.visible or self.zoom == self.MIN_ZOOM:
+            return
+
+        self.offset_x -= e.delta_x / self.scale
+        self.offset_y -= e.delta_y / self.scale
+        self._update_view()
+
+    def _handle_pan_end(self, e: ft.DragEndEvent):
+        if self._drag is None:
+            return
+        border, _ = self._drag
+        self._drag = None
+        if self.on_point_moved:
+            self.on_point_moved(border, True)
+
+    def _move_point(self, local_x: float, local_y: float):
+        """Перемещает захваченную точку в позицию курсора; обновляется только слой ее границы"""
+        border, index = self._drag
+        pyramid = self.state.tile_pyramid
+        x, y = self.to_image(local_x, local_y)
+        x = min(max(x, 0.0), pyramid.width - 1)
+        y = min(max(y, 0.0), pyramid.height - 1)
+
+        self.state.move_image_point(border, index, x, y)
+        self.point_index.move(border, index, *self.state.edge_points_lists[border][index])
+
+        points = self._layer_points(border)
+        points.points[index] = self.to_view(x, y)
+        points.update()
+
+        if self.on_point_moved:
+            self.on_point_moved(border, False)
+
+    def _clamp_offset(self):
+        """Ограничивает сдвиг так, чтобы область просмотра не выходила за изображение"""
+        pyramid = self.state.tile_pyramid
+        view_width = self.image.width / self.scale
+        view_height = self.height / self.scale
+        self.offset_x = min(max(self.offset_x, 0.0), max(pyramid.width - view_width, 0.0))
+        self.offset_y = min(max(self.offset_y, 0.0), max(pyramid.height - view_height, 0.0))
+
+    def _update_view(self):
+        """Перерисовывает тайлы, точки и сетку после изменения масштаба или сдвига"""
+        self._clamp_offset()
+        self._render_tiles()
+        self.refresh_points()
+        if self.on_view_changed:
+            self.on_view_changed()
+        self.stack.update()
+
+    def _render_tiles(self):
+        """Загружает только тайлы текущего уровня, попадающие в область просмотра"""
+        pyramid = self.state.tile_pyramid
+        scale = self.scale
+        level = pyramid.level_for_scale(scale)
+
+        x0, y0 = self.offset_x, self.offset_y
+        x1 = x0 + self.image.width / scale
+        y1 = y0 + self.height / scale
+
+        tile_controls = {}
+        for col, row in pyramid.visible_tiles(level, x0, y0, x1, y1):
+            key = (level, col, row)
+            tile = self._tile_controls.get(key)
+            if tile is None:
+                tile = ft.Image(
+                    src_base64=pyramid.get_tile(level, col, row),
+                    fit=ft.ImageFit.FILL,
+                    gapless_playback=True
+                )
+            tx, ty, tw, th = pyramid.tile_bounds(level, col, row)
+            tile.left, tile.top = self.to_view(tx, ty)
+            # Небольшой запас убирает щели между соседними тайлами
+            tile.width = tw * scale + 1
+            tile.height = th * scale + 1
+            tile_controls[key] = tile
+
+        self._tile_controls = tile_controls
+        self.image.controls = list(tile_controls.values())
+
+    def _create_point_layer(self, color: ft.Colors) -> canv.Canvas:
+        """Создает холст точек одной границы; точки рисуются кругами (круглый конец штриха)"""
+        paint = ft.Paint(
+            color=color,
+            stroke_width=2 * self.POINT_RADIUS,
+            stroke_cap=ft.StrokeCap.ROUND,
+            style=ft.PaintingStyle.STROKE
+        )
+        return canv.Canvas(
+            [canv.Points([], point_mode=canv.PointMode.POINTS, paint=paint)],
+            left=0,
+            top=0
+        )
+
+    @property
+    def mesh_canvas(self) -> Optional[canv.Canvas]:
+        """Показанный холст сетки"""
+        return self._mesh_canvas
+
+    def _layer_points(self, border: str) -> canv.Points:
+        return self.point_layers[border].shapes[0]
+
+    def _layer_controls(self) -> list:
+        """Слои в порядке отрисовки: изображение, сетка, точки завершенных областей, точки"""
+        controls = [self.image]
+        if self._mesh_canvas is not None:
+            controls.append(self._mesh_canvas)
+        controls.append(self.regions_layer)
+        controls.extend(self.point_layers.values())
+        return controls
+
+    def refresh_points(self):
+        """Пересчитывает точки всех слоев из состояния с учетом масштаба и сдвига (без отправки в UI)"""
+        for border, points in self.state.edge_points_lists.items():
+            self._layer_points(border).points = [self.to_view(*p) for p in points]
+        self.regions_layer.shapes[0].points = [self.to_view(*p) for region in self.state.regions
+                                               for points in region.values() for p in points]
+
+    def set_image(self, pyramid: "TilePyramid", ratio: float):
         """Устанавливает новое изображение"""
-        self.image.src = image_path
-        self.image.visible = True
+        self.state.tile_pyramid = pyramid
         self.state.ratio = ratio
+
+        # Сбрасываем масштаб и сдвиг
+        self.zoom = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self._tile_controls = {}
+
+        self.image.width = pyramid.width / ratio
+        self.image.visible = True
+        self.stack.width = self.image.width
+        for layer in [self.regions_layer, *self.point_layers.values()]:
+            layer.width, layer.height = self.image.width, self.height
+        self._render_tiles()
         self.stack.update()
-        
+
     def clear(self):
-        """Очищает все точки с изображения"""
-        self.stack.controls = [self.image]
+        """Очищает все точки и сетку с изображения"""
+        self.point_index.clear()
+        self._drag = None
+        for border in self.point_layers:
+            self._layer_points(border).points = []
+        self.regions_layer.shapes[0].points = []
+        self._mesh_canvas = None
+        self.stack.controls = self._layer_controls()
         self.stack.update()
-        
+
+    def reset_image(self):
+        """Убирает изображение: пирамида тайлов, путь, точки и области сбрасываются"""
+        self.state.tile_pyramid = None
+        self.state.tile_pyramid_source = None
+        self.state.current_image_path = None
+        self.state.grid_built = False
+        self.state.show_grid = False
+        self.state.clear_points()
+        self.state.clear_regions()
+        self._tile_controls = {}
+        self.image.controls = []
+        self.image.visible = False
+        self.clear()
+
     def process_new_image(self, file_path: str):
-        """Обрабатывает новое изображение"""
-        # Сохраняем путь к текущему изображению
+        """
+        Обрабатывает новое изображение.
+
+        Raises:
+            ValueError: Файл не найден или не читается как изображение; предыдущее
+                изображение при этом убирается, чтобы точки не ставились на чужие пиксели
+        """
+        # Пирамида тайлов строится один раз для каждого изображения; файл, перезаписанный
+        # под тем же именем (повторная загрузка в web-режиме, правка), определяется по размеру и времени изменения
+        try:
+            stat = os.stat(file_path)
+        except OSError as ex:
+            self.reset_image()
+            raise ValueError(f"Файл изображения недоступен: {file_path} ({ex.strerror})") from ex
+        source = (file_path, stat.st_size, stat.st_mtime_ns)
+        pyramid = self.state.tile_pyramid
+        changed = source != self.state.tile_pyramid_source
+        if pyramid is None or changed:
+            # cv2 и пирамида импортируются при первой загрузке изображения, а не при запуске
+            import cv2
+            from core.tile_pyramid import TilePyramid
+            img = cv2.imread(file_path)
+            if img is None:
+                self.reset_image()
+                raise ValueError(f"Не удалось прочитать изображение: {file_path}")
+            pyramid = TilePyramid(img)
+            self.state.tile_pyramid_source = source
+
+        # Сохраняем путь к текущему изображению; новое содержимое по прежнему пути
+        # тоже делает недействительными производные результаты
+        if changed and self.state.current_image_path == file_path:
+            self.state.touch_image()
         self.state.current_image_path = file_path
-        
+
         # Сбрасываем флаги
         self.state.grid_built = False
         self.state.show_grid = False
-        
-        # Очищаем точки
+
+        # Очищаем точки и области
         self.state.clear_points()
-        
+        self.state.clear_regions()
+
         # Обновляем изображения для обоих режимов
         self.clear()
-        
-        # Загружаем изображение для получения его размеров
-        img = cv2.imread(file_path)
-        if img is not None:
-            img_height, img_width = img.shape[:2]
-            # Вычисляем коэффициент масштабирования
-            ratio = img_height / self.height
-            
-            # Устанавливаем изображения
-            self.set_image(file_path, ratio)
-
-        
-    def add_points(self, points: list, color:ft.Colors):
-        point_radius = 4
-        for p in points:
-            point = ft.Container(
-                content=ft.CircleAvatar(
-                    bgcolor=color,
-                    radius=point_radius,
-                ),
-                left=(p[0]-point_radius),
-                top=(p[1]-point_radius)
-            )
-            self.stack.controls.append(point)    
-        
+
+        # Вычисляем коэффициент масштабирования
+        ratio = pyramid.height / self.height
+
+        # Устанавливаем изображения
+        self.set_image(pyramid, ratio)
+
     def add_mesh_canvas(self, canvas: canv.Canvas):
-        """Добавляет canvas с сеткой"""
-        if canvas not in self.stack.controls:
-            # Удаляем старую сетку, если она есть
-            for control in self.stack.controls[:]:
-                if isinstance(control, canv.Canvas):
-                    self.stack.controls.remove(control)
-            
-            # Добавляем новую сетку
-            controls = [self.image, canvas]
-            # Добавляем все точки поверх сетки
-            controls.extend([c for c in self.stack.controls if c != self.image])
-            self.stack.controls = controls
+        """Добавляет canvas с сеткой (старая сетка заменяется, точки остаются поверх)"""
+        if canvas is not self._mesh_canvas:
+            self._mesh_canvas = canvas
+            self.stack.controls = self._layer_controls()
             self.stack.update()
-            
+
     def remove_mesh_canvas(self):
         """Удаляет canvas с сеткой"""
-        # Создаем новый список controls без canvas элементов
-        self.stack.controls = [control for control in self.stack.controls 
-                               if not isinstance(control, canv.Canvas)]
-        self.stack.update()
\ No newline at end of file
+        self._mesh_canvas = None
+        self.stack.controls = self._layer_controls()
+        self.stack.update()
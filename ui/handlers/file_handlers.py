@@ -3,7 +3,6 @@ from ..utils.file_utils import save_points_to_json, load_points_from_json
 from ..components.image_display import ImageDisplay
 from ..components.control_panel_component import ControlPanelComponent
 from ..state.app_state import AppState
-import numpy as np
 
 def handle_image_upload(state: AppState, image_display: ImageDisplay,
                         control_panel: ControlPanelComponent, page: ft.Page):
@@ -21,11 +20,27 @@ def handle_image_upload(state: AppState, image_display: ImageDisplay,
     """
     def on_file_result(e):
         if e.files and e.files[0].path:
-            image_display.process_new_image(e.files[0].path)
+            try:
+                image_display.process_new_image(e.files[0].path)
+            except ValueError as ex:
+                state.result_image = None
+                state.warp_field = None
+                control_panel.show_grid_checkbox.value = False
+                control_panel.update_coords_text()
+                control_panel.update_button_states()
+                page.snack_bar = ft.SnackBar(
+                    content=ft.Text(str(ex)),
+                    bgcolor=ft.colors.RED
+                )
+                page.snack_bar.open = True
+                page.update()
+                return
             # Сбрасываем флаги и обновляем чекбокс
             state.show_grid = False
             state.grid_built = False
             state.mesh_canvas = None
+            state.result_image = None
+            state.warp_field = None
             state.current_image_path = e.files[0].path
             state.clear_points()
             image_display.clear()
@@ -50,7 +65,8 @@ def handle_save_points(state: AppState, page: ft.Page):
         def on_save_result(e):
             if e.path:
                 try:
-                    save_points_to_json(state.edge_points_lists, state.current_image_path, e.path)
+                    save_points_to_json(state.edge_points_lists, state.current_image_path, e.path,
+                                        regions=state.regions)
                 except Exception as e:
                     raise e
 
@@ -77,20 +93,42 @@ def handle_load_points(state: AppState, image_display: ImageDisplay,
                 try:
                     load_data = load_points_from_json(e.files[0].path)
                     
+                    # Файл с несколькими областями: последняя область становится текущей
+                    from core.regions import regions_from_data
+                    regions = [points for _, points in regions_from_data(load_data)]
+                    
                     # Проверяем наличие необходимых данных
-                    for edge_name in state.edge_points_lists.keys():
-                        if edge_name not in load_data["points"].keys():
-                            print(" !! Некорректный формат файла!")
-                            return
+                    for region_points in regions:
+                        for edge_name in state.edge_points_lists.keys():
+                            if edge_name not in region_points.keys():
+                                print(" !! Некорректный формат файла!")
+                                return
                     
-                    image_display.process_new_image(load_data["image_path"])
+                    try:
+                        image_display.process_new_image(load_data["image_path"])
+                    except ValueError as ex:
+                        control_panel.update_coords_text()
+                        control_panel.update_button_states()
+                        page.snack_bar = ft.SnackBar(
+                            content=ft.Text(str(ex)),
+                            bgcolor=ft.colors.RED
+                        )
+                        page.snack_bar.open = True
+                        page.update()
+                        return
+                    state.regions.extend(
+                        {border: [tuple(p) for p in region_points[border]] for border in state.border_names}
+                        for region_points in regions[:-1]
+                    )
                     
                     # Загружаем точки
-                    for border, points in load_data["points"].items():
+                    for border, points in regions[-1].items():
                         state.edge_points_lists[border].extend(points)
-                        temp_points = np.array(points, dtype=int) / state.ratio
-                        state.points_lists[border].extend(temp_points.tolist())
-                        image_display.add_points(temp_points, color=state.colors[border])
+                        state.points_lists[border].extend(
+                            [int(x) / state.ratio, int(y) / state.ratio] for x, y in points
+                        )
+                    state.touch_edges()
+                    image_display.refresh_points()
                         
                     # Обновляем состояние
                     control_panel.update_coords_text()
@@ -118,13 +156,16 @@ def handle_clear(state: AppState, image_display: ImageDisplay,
         Функция-обработчик для кнопки очистки
     """
     def on_clear(_):
-        # Очищаем точки в состоянии
+        # Очищаем точки и области в состоянии
         state.clear_points()
+        state.clear_regions()
         
         # Сбрасываем флаги
         state.grid_built = False
         state.show_grid = False
         state.current_image_path = None
+        state.result_image = None
+        state.warp_field = None
 
         # Удаляем сетку, если она отображается
         if state.mesh_canvas:
@@ -142,4 +183,42 @@ def handle_clear(state: AppState, image_display: ImageDisplay,
         control_panel.update_button_states()
         page.update()
     
-    return on_clear 
\ No newline at end of file
+    return on_clear 
+
+def handle_new_region(state: AppState, image_display: ImageDisplay,
+                      control_panel: ControlPanelComponent, page: ft.Page):
+    """
+    Обработчик завершения текущей области и начала новой.
+    
+    Args:
+        state: Объект состояния приложения
+        image_display: Компонент отображения изображения
+        control_panel: Панель управления
+        page: Объект страницы
+    
+    Returns:
+        Функция-обработчик для кнопки новой области
+    """
+    def on_new_region(_):
+        if not state.add_region():
+            return
+        
+        # Сетка относится к завершенной области
+        state.grid_built = False
+        state.show_grid = False
+        state.result_image = None
+        state.warp_field = None
+        if state.mesh_canvas:
+            image_display.remove_mesh_canvas()
+            state.mesh_canvas = None
+        
+        # Точки завершенной области переходят в общий слой областей
+        image_display.refresh_points()
+        image_display.stack.update()
+        
+        control_panel.show_grid_checkbox.value = False
+        control_panel.update_coords_text()
+        control_panel.update_button_states()
+        page.update()
+    
+    return on_new_region
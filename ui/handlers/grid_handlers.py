@@ -1,30 +1,53 @@
 import flet as ft
 from flet import canvas as canv
-import numpy as np
+import threading
+import time
 from ..state.app_state import AppState
-from core.utils import build_mesh_function, preprocess_edges
 
-def build_grid(state: AppState) -> tuple[canv.Canvas, canv.Canvas]:
-    """Строит сетку на основе точек"""
-    # Получаем границы
-    edge_top, edge_bottom, edge_left, edge_right = preprocess_edges(**state.points_lists)
-    mesh_func = build_mesh_function(edge_top, edge_bottom, edge_left, edge_right)
+def build_grid(state: AppState, offset: tuple[float, float] = (0.0, 0.0),
+               scale: float = None) -> tuple[canv.Canvas, canv.Canvas]:
+    """
+    Строит сетку на основе точек.
+    
+    Args:
+        state: Объект состояния приложения
+        offset: Координаты левого верхнего угла области просмотра в пикселях исходного изображения
+        scale: Экранных пикселей на пиксель исходного изображения (по умолчанию 1 / state.ratio)
+    """
+    # NumPy и функции сетки импортируются при первом построении, а не при запуске
+    import numpy as np
+    from core.grid_utils import (
+        build_fast_mesh_function, preprocess_edges, sample_grid_lines, simplify_polyline, EdgeSampleCache
+    )
+    
+    # Сплайны неизменившихся границ берутся из кэша (при перетаскивании меняется одна граница)
+    if state.edge_sample_cache is None:
+        state.edge_sample_cache = EdgeSampleCache()
+    
+    if scale is None:
+        scale = 1 / state.ratio
+    
+    def to_view(points):
+        # Плотные границы упрощаются до полупикселя экрана, чтобы не передавать лишние точки
+        view_points = (np.asarray(points, dtype=float) - offset) * scale
+        return simplify_polyline(view_points, tolerance=0.5).tolist()
+    
+    # Получаем границы в координатах исходного изображения
+    edges = state.cached("edges", lambda: preprocess_edges(**state.edge_points_lists))
+    edge_top, edge_bottom, edge_left, edge_right = edges
+    mesh_func = state.cached("mesh", lambda: build_fast_mesh_function(*edges, edge_cache=state.edge_sample_cache))
     
     # Параметры сетки
     n_points = 10
-    s_values = np.linspace(0, 1, n_points)
-    t_values = np.linspace(0, 1, n_points)
     
-    # Создаем сетку параметров
-    s_grid, t_grid = np.meshgrid(s_values, t_values)
-
-    # Векторизуем функцию mesh_point
-    vectorized_mesh = np.vectorize(lambda s, t: mesh_func(s, t), signature='(),()->(n)')
-
-    # Применяем к сетке параметров
-    grid_points: np.ndarray = vectorized_mesh(s_grid, t_grid)
-    grid_hlines = grid_points.tolist()
-    grid_vlines = grid_points.swapaxes(0, 1).tolist()
+    # Все линии сетки вычисляются одним вызовом функции меша; при неизменной разметке
+    # (смена масштаба просмотра, повторное включение сетки) берутся из кэша состояния
+    s_lines, t_lines = state.cached("grid_lines", lambda: sample_grid_lines(mesh_func, n_points), n_points)
+    grid_vlines = ((s_lines - offset) * scale).tolist()
+    grid_hlines = ((t_lines - offset) * scale).tolist()
+    
+    # Переводим границы в координаты отображения
+    edge_top, edge_bottom, edge_left, edge_right = map(to_view, (edge_top, edge_bottom, edge_left, edge_right))
     
     # Создание холста для отображения сетки
     edge_width = 3
@@ -75,6 +98,11 @@ def build_grid(state: AppState) -> tuple[canv.Canvas, canv.Canvas]:
     
     return mesh_canvas, mesh_canvas_left
 
+def _grid_canvas_key(state, image_display):
+    """Ключ холста сетки: версии разметки и текущий вид (сдвиг, масштаб, размер)"""
+    return state.derived_key(image_display.offset_x, image_display.offset_y, image_display.scale,
+                             image_display.image.width, image_display.image.height)
+
 def update_grid_if_needed(state, image_display, page):
     """
     Обновляет сетку при необходимости (добавление новых точек).
@@ -89,23 +117,31 @@ def update_grid_if_needed(state, image_display, page):
     """
     # Если сетка отображается и чекбокс включен, перестраиваем сетку
     if state.show_grid and state.check_points():
+        key = _grid_canvas_key(state, image_display)
+        if state.mesh_canvas is not None and state.get_derived("grid_canvas", key) is image_display.mesh_canvas:
+            # Разметка и вид не изменились с последнего построения
+            return True
         try:
-            # Удаляем старую сетку
-            if state.mesh_canvas:
-                image_display.remove_mesh_canvas()
-            
             # Строим новую сетку
-            mesh_canvas, mesh_canvas_left = build_grid(state)
+            mesh_canvas, mesh_canvas_left = build_grid(
+                state, (image_display.offset_x, image_display.offset_y), image_display.scale
+            )
             
             # Устанавливаем размеры canvas
             mesh_canvas.width = image_display.image.width
             mesh_canvas.height = image_display.image.height
             
-            # Сохраняем canvas в состояние
-            state.mesh_canvas = mesh_canvas
-            
-            # Показываем новую сетку
-            image_display.add_mesh_canvas(mesh_canvas)
+            if state.mesh_canvas is not None and state.mesh_canvas is image_display.mesh_canvas:
+                # Показанная сетка обновляется на месте: передается только изменение холста
+                state.mesh_canvas.shapes = mesh_canvas.shapes
+                state.mesh_canvas.width = mesh_canvas.width
+                state.mesh_canvas.height = mesh_canvas.height
+                state.mesh_canvas.update()
+            else:
+                # Сохраняем canvas в состояние и показываем новую сетку
+                state.mesh_canvas = mesh_canvas
+                image_display.add_mesh_canvas(mesh_canvas)
+            state.set_derived("grid_canvas", key, state.mesh_canvas)
             
             return True
         
@@ -117,6 +153,69 @@ def update_grid_if_needed(state, image_display, page):
     
     return False
 
+class GridUpdateThrottle:
+    """
+    Объединяет частые запросы перестроения сетки при перетаскивании точки.
+    
+    Сетка перестраивается не чаще одного раза за кадр (interval). Запросы,
+    пришедшие во время перестроения или раньше следующего кадра, объединяются
+    в одно перестроение с последним положением точки.
+    """
+    
+    def __init__(self, update, interval=1 / 60):
+        """
+        Args:
+            update: Функция перестроения сетки
+            interval: Минимальный интервал между перестроениями в секундах
+        """
+        self._update = update
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+        self._last = 0.0
+    
+    def request(self, force=False):
+        """Запрашивает перестроение; force - без ожидания кадра (например, по окончании перетаскивания)"""
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            wait = self.interval - (time.monotonic() - self._last)
+            if wait > 0 and not force:
+                # Отложенное перестроение с последним положением точки
+                if not self._pending:
+                    self._pending = True
+                    threading.Timer(wait, self._flush).start()
+                return
+            self._running = True
+            self._pending = False
+        self._run()
+    
+    def _flush(self):
+        with self._lock:
+            if self._running or not self._pending:
+                return
+            self._running = True
+            self._pending = False
+        self._run()
+    
+    def _run(self):
+        while True:
+            try:
+                self._update()
+            except Exception:
+                with self._lock:
+                    self._running = self._pending = False
+                raise
+            with self._lock:
+                self._last = time.monotonic()
+                again = self._pending
+                self._pending = False
+                self._running = again
+            if not again:
+                return
+
 def handle_grid_toggle(e, state, image_display, page):
     """
     Обработчик переключения отображения сетки.
@@ -145,12 +244,18 @@ def handle_grid_toggle(e, state, image_display, page):
             if state.mesh_canvas:
                 image_display.remove_mesh_canvas()
             
-            # Строим новую сетку
-            mesh_canvas, mesh_canvas_left = build_grid(state)
-            
-            # Устанавливаем размеры canvas
-            mesh_canvas.width = image_display.image.width
-            mesh_canvas.height = image_display.image.height
+            # Холст сетки строится заново, только если изменились разметка или вид
+            key = _grid_canvas_key(state, image_display)
+            mesh_canvas = state.get_derived("grid_canvas", key)
+            if mesh_canvas is None:
+                mesh_canvas, mesh_canvas_left = build_grid(
+                    state, (image_display.offset_x, image_display.offset_y), image_display.scale
+                )
+                
+                # Устанавливаем размеры canvas
+                mesh_canvas.width = image_display.image.width
+                mesh_canvas.height = image_display.image.height
+                state.set_derived("grid_canvas", key, mesh_canvas)
             
             # Сохраняем canvas в состояние
             state.mesh_canvas = mesh_canvas
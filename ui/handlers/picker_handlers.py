@@ -4,7 +4,7 @@ from .file_handlers import handle_image_upload, handle_save_points, handle_load_
 from ..components.image_display import ImageDisplay
 from ..components.control_panel_component import ControlPanelComponent
 from ..state.app_state import AppState
-from ..utils.image_processor import handle_save_image
+from ..utils.image_processor import handle_save_image, handle_save_warp_field
 
 def setup_file_picker_handlers(
         picker_manager: FilePickerManager,
@@ -71,7 +71,9 @@ def create_image_upload_handler(
     """
     def handle_upload_click(_):
         picker_manager.pick_image(
-            handle_image_upload(state, image_display, control_panel, page)
+            handle_image_upload(state, image_display, control_panel, page),
+            upload_subdir=state.upload_subdir,
+            upload_dir=state.storage_dir
         )
     
     return handle_upload_click
@@ -127,22 +129,22 @@ def create_load_points_handler(
 def create_save_image_handler(
         picker_manager: FilePickerManager,
         page: ft.Page,
-        image_control: ft.Image):
+        state: AppState):
     """
     Создает обработчик для сохранения изображения.
     
     Args:
         picker_manager: Менеджер FilePicker'ов
         page: Объект страницы
-        image_control: Контрол изображения
+        state: Состояние приложения с результатом выравнивания
         
     Returns:
         function: Обработчик для кнопки сохранения изображения
     """
     def handle_save_image_click(_):
-        if hasattr(image_control, 'src') and image_control.src:
+        if state.result_image is not None:
             picker_manager.save_image(
-                handle_save_image(page, image_control)(_)
+                handle_save_image(page, state)(_)
             )
         else:
             # Показываем уведомление об ошибке
@@ -153,4 +155,33 @@ def create_save_image_handler(
             page.snack_bar.open = True
             page.update()
     
-    return handle_save_image_click 
\ No newline at end of file
+    return handle_save_image_click
+
+def create_save_warp_field_handler(
+        picker_manager: FilePickerManager,
+        page: ft.Page,
+        state: AppState):
+    """
+    Создает обработчик для экспорта поля деформации.
+    
+    Args:
+        picker_manager: Менеджер FilePicker'ов
+        page: Объект страницы
+        state: Состояние приложения с полем деформации результата
+        
+    Returns:
+        function: Обработчик для кнопки сохранения поля деформации
+    """
+    def handle_save_warp_field_click(_):
+        if state.warp_field is not None:
+            picker_manager.save_warp_field(handle_save_warp_field(page, state))
+        else:
+            # Показываем уведомление об ошибке
+            page.snack_bar = ft.SnackBar(
+                content=ft.Text("Нет деформации для сохранения"),
+                bgcolor=ft.colors.RED
+            )
+            page.snack_bar.open = True
+            page.update()
+    
+    return handle_save_warp_field_click
@@ -3,13 +3,13 @@ from .state.app_state import AppState
 from .components.image_display import ImageDisplay
 from .components.control_panel_component import ControlPanelComponent
 from .components.file_pickers import FilePickerManager
-from .handlers.file_handlers import handle_clear
+from .handlers.file_handlers import handle_clear, handle_new_region
 from .handlers.picker_handlers import (
     create_image_upload_handler,
     create_save_points_handler,
     create_load_points_handler
 )
-from .handlers.grid_handlers import update_grid_if_needed, handle_grid_toggle
+from .handlers.grid_handlers import update_grid_if_needed, handle_grid_toggle, GridUpdateThrottle
 
 def create_main_page_content(page: ft.Page, state: AppState):
     """
@@ -48,6 +48,21 @@ def create_main_page_content(page: ft.Page, state: AppState):
     # Устанавливаем обработчик добавления точки
     image_display.on_point_added = handle_point_added
     
+    # При масштабировании и сдвиге изображения сетка перестраивается под новый вид
+    image_display.on_view_changed = lambda: update_grid_if_needed(state, image_display, page)
+    
+    # При перетаскивании точки сетка перестраивается не чаще частоты кадров,
+    # по окончании перетаскивания - сразу
+    grid_throttle = GridUpdateThrottle(lambda: update_grid_if_needed(state, image_display, page))
+    
+    def handle_point_moved(border, final):
+        grid_throttle.request(force=final)
+        if final:
+            control_panel.update_coords_text()
+            page.update()
+    
+    image_display.on_point_moved = handle_point_moved
+    
     # Создаем обработчики для FilePicker операций
     upload_handler = create_image_upload_handler(
         picker_manager, state, image_display, control_panel, page
@@ -70,7 +85,8 @@ def create_main_page_content(page: ft.Page, state: AppState):
         on_clear=clear_handler,
         on_save=save_handler,
         on_load=load_handler,
-        on_grid_toggle=lambda e: handle_grid_toggle(e, state, image_display, page)
+        on_grid_toggle=lambda e: handle_grid_toggle(e, state, image_display, page),
+        on_new_region=handle_new_region(state, image_display, control_panel, page)
     )
 
     # Основной контент
@@ -95,7 +111,10 @@ def create_main_page_content(page: ft.Page, state: AppState):
                 control_panel.save_button,
                 control_panel.load_button
             ], spacing=10, wrap=True),
-            control_panel.show_grid_checkbox,
+            ft.Row([
+                control_panel.new_region_button,
+                control_panel.show_grid_checkbox
+            ], spacing=10, wrap=True),
             ft.Text("Координаты точек:", size=16),
             control_panel.coords_container,
         ],
@@ -1,8 +1,32 @@
 import flet as ft
-from typing import Dict, List, Tuple, Optional
+import os
+import shutil
+import uuid
+from typing import Any, Callable, Dict, List, Tuple, Optional
+
+# Корень хранилища: сюда загружаются файлы в web-режиме, у каждой сессии свой подкаталог
+STORAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "storage")
+
+# Общее для всех сессий хранилище результатов с адресацией по содержимому
+RESULT_STORE_ROOT = os.path.join(STORAGE_ROOT, "results")
+
+# Лимит памяти на обработку в одной сессии (МБ), переменная окружения
+SESSION_MEMORY_ENV = "TEXT_IMAGE_TOOL_SESSION_MEMORY_MB"
+DEFAULT_SESSION_MEMORY_MB = 2048
 
 class AppState:
-    def __init__(self):
+    def __init__(self, session_id: Optional[str] = None, memory_limit: Optional[int] = None):
+        """
+        Args:
+            session_id: Идентификатор сессии (page.session_id), по умолчанию генерируется
+            memory_limit: Лимит памяти на обработку в байтах, по умолчанию из TEXT_IMAGE_TOOL_SESSION_MEMORY_MB
+        """
+        # Идентификатор сессии и лимит памяти на обработку
+        self.session_id = session_id or uuid.uuid4().hex
+        if memory_limit is None:
+            memory_limit = int(os.environ.get(SESSION_MEMORY_ENV, DEFAULT_SESSION_MEMORY_MB)) * 1024 ** 2
+        self.memory_limit = memory_limit
+
         # Названия границ
         self.border_names = ["edge_top", "edge_bottom", "edge_left", "edge_right"]
 
@@ -21,31 +45,195 @@ class AppState:
         # Текущая выбранная граница
         self.current_border = "edge_top"
 
+        # Завершенные области изображения (колонки, страницы разворота): у каждой
+        # свои четыре границы в формате edge_points_lists; текущая область - edge_points_lists
+        self.regions: List[Dict[str, List[Tuple[int, int]]]] = []
+
+        # Раскладка результатов нескольких областей: "horizontal" или "vertical" (см. core.regions)
+        self.region_layout: str = "horizontal"
+
         # Флаг для отслеживания успешного построения сетки
         self.grid_built = False
         # Флаг для отображения сетки
         self.show_grid = False
 
+        # Счетчики версий изображения и границ (всех областей): увеличиваются при каждом
+        # изменении, производные результаты (сетка, наложение, выравнивание) кэшируются по ним
+        self.image_version = 0
+        self.edges_version = 0
+        self._derived: Dict[str, Tuple[tuple, Any]] = {}
+
         # Путь к текущему изображению
-        self.current_image_path: Optional[str] = None
+        self._current_image_path: Optional[str] = None
         
         # Масштаб изображения
         self.ratio: Optional[float] = None
+
+        # Пирамида тайлов текущего изображения (строится один раз при загрузке)
+        self.tile_pyramid = None
+
+        # Путь, размер и время изменения файла, по которому построена пирамида тайлов
+        self.tile_pyramid_source: Optional[Tuple[str, int, int]] = None
         
         # Canvas для сетки
         self.mesh_canvas = None
 
+        # Кэш сплайнов границ для сетки (core.grid_utils.EdgeSampleCache, создается при первом построении)
+        self.edge_sample_cache = None
+
+        # Результат выравнивания (хранится в памяти, на диск пишется только при сохранении)
+        self.result_image = None
+
+        # Компактное поле деформации результата (core.warp_field.WarpField) для экспорта
+        self.warp_field = None
+
+        # Масштаб результата относительно исходного изображения
+        # (например, 0.5 для 300 dpi из скана 600 dpi, см. core.grid_utils.resolve_output_size)
+        self.output_scale: float = 1.0
+
+        # Режим результата: "color", "gray" или "binary" (см. core.ocr_output)
+        self.output_mode: str = "color"
+
+        # Модель деформации: "coons", "tps", "rbf" или "piecewise_affine" (см. core.warp_models)
+        self.warp_model: str = "coons"
+
+        # Параметры сохранения результата (см. core.image_io.export_params)
+        self.export_options: Dict[str, object] = {}
+
+    @property
+    def current_image_path(self) -> Optional[str]:
+        return self._current_image_path
+
+    @current_image_path.setter
+    def current_image_path(self, path: Optional[str]):
+        """Смена изображения делает недействительными все производные результаты"""
+        if path != self._current_image_path:
+            self._current_image_path = path
+            self.touch_image()
+
+    def touch_image(self):
+        """Отмечает изменение изображения"""
+        self.image_version += 1
+        self._derived.clear()
+
+    def touch_edges(self):
+        """Отмечает изменение точек границ или списка областей"""
+        self.edges_version += 1
+        self._derived.clear()
+
+    def derived_key(self, *params) -> tuple:
+        """Ключ производного результата: версии изображения и границ и параметры вычисления"""
+        return (self.image_version, self.edges_version) + params
+
+    def get_derived(self, name: str, key: tuple) -> Any:
+        """Производный результат name, вычисленный с ключом key, или None"""
+        entry = self._derived.get(name)
+        return entry[1] if entry is not None and entry[0] == key else None
+
+    def set_derived(self, name: str, key: tuple, value: Any):
+        """Запоминает производный результат; результат, вычисленный до изменения разметки, отбрасывается"""
+        if key[:2] == (self.image_version, self.edges_version):
+            self._derived[name] = (key, value)
+
+    def cached(self, name: str, compute: Callable[[], Any], *params) -> Any:
+        """Возвращает производный результат name при текущих версиях и параметрах, вычисляя его при необходимости"""
+        key = self.derived_key(*params)
+        value = self.get_derived(name, key)
+        if value is None:
+            value = compute()
+            self.set_derived(name, key, value)
+        return value
+
+    def mesh_issues(self) -> List[str]:
+        """
+        Быстрая проверка сетки выбранной модели для каждой области на грубой решетке.
+        Результат кэшируется до следующего изменения разметки или модели.
+        """
+        def find_issues():
+            from core.grid_utils import preprocess_edges
+            from core.mesh_validation import validate_mesh
+            regions = self.region_points()
+            issues = []
+            for index, edge_points in enumerate(regions):
+                report = validate_mesh(*preprocess_edges(**edge_points), model=self.warp_model)
+                prefix = f"Область {index + 1}: " if len(regions) > 1 else ""
+                issues.extend(prefix + issue for issue in report.issues)
+            return issues
+        return self.cached("mesh_issues", find_issues, self.warp_model)
+
     def clear_points(self):
         """Очищает все точки"""
         for border in self.points_lists:
             self.points_lists[border].clear()
             self.edge_points_lists[border].clear()
+        self.touch_edges()
+
+    def clear_regions(self):
+        """Удаляет завершенные области"""
+        self.regions.clear()
+        self.touch_edges()
             
     def check_points(self) -> bool:
         """Проверяет наличие достаточного количества точек"""
         return all(len(points) >= 2 for points in self.points_lists.values())
 
+    def has_points(self) -> bool:
+        """Есть ли точки в текущей области"""
+        return any(self.edge_points_lists.values())
+
+    def add_region(self) -> bool:
+        """Завершает текущую область и начинает новую; False, если точек недостаточно"""
+        if not self.check_points():
+            return False
+        self.regions.append({border: list(points) for border, points in self.edge_points_lists.items()})
+        self.clear_points()
+        return True
+
+    def region_points(self) -> List[Dict[str, List[Tuple[int, int]]]]:
+        """Границы всех областей для выравнивания: завершенные и текущая, если она размечена"""
+        current = [dict(self.edge_points_lists)] if self.check_points() else []
+        return self.regions + current
+
+    def can_align(self) -> bool:
+        """Разметка готова к выравниванию: текущая область размечена или пуста при завершенных областях"""
+        return self.check_points() or (bool(self.regions) and not self.has_points())
+
     def add_point(self, x: float, y: float):
         """Добавляет точку в текущую границу"""
         self.points_lists[self.current_border].append((x, y))
-        self.edge_points_lists[self.current_border].append((int(x * self.ratio), int(y * self.ratio)))
\ No newline at end of file
+        self.edge_points_lists[self.current_border].append((int(x * self.ratio), int(y * self.ratio)))
+        self.touch_edges()
+
+    def add_image_point(self, x: float, y: float):
+        """Добавляет точку в текущую границу по координатам исходного изображения"""
+        self.points_lists[self.current_border].append((x / self.ratio, y / self.ratio))
+        self.edge_points_lists[self.current_border].append((int(round(x)), int(round(y))))
+        self.touch_edges()
+
+    def move_image_point(self, border: str, index: int, x: float, y: float):
+        """Перемещает точку границы в координаты исходного изображения"""
+        self.points_lists[border][index] = (x / self.ratio, y / self.ratio)
+        self.edge_points_lists[border][index] = (int(round(x)), int(round(y)))
+        self.touch_edges()
+
+    @property
+    def upload_subdir(self) -> str:
+        """Каталог сессии относительно STORAGE_ROOT (для page.get_upload_url)"""
+        return f"sessions/{self.session_id}"
+
+    @property
+    def storage_dir(self) -> str:
+        """Изолированный каталог сессии, создается при первом обращении"""
+        path = os.path.join(STORAGE_ROOT, "sessions", self.session_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def release(self):
+        """Освобождает ресурсы сессии: изображения в памяти и каталог сессии"""
+        self.result_image = None
+        self.tile_pyramid = None
+        self.tile_pyramid_source = None
+        self.mesh_canvas = None
+        self.edge_sample_cache = None
+        self._derived.clear()
+        shutil.rmtree(os.path.join(STORAGE_ROOT, "sessions", self.session_id), ignore_errors=True)
@@ -1,14 +1,23 @@
 import json
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-def save_points_to_json(points: Dict[str, List[Tuple[int, int]]], image_path: str, file_path: str) -> None:
-    """Сохраняет точки в JSON файл"""
+def save_points_to_json(points: Dict[str, List[Tuple[int, int]]], image_path: str, file_path: str,
+                        regions: Optional[List[Dict[str, List[Tuple[int, int]]]]] = None) -> None:
+    """
+    Сохраняет точки в JSON файл.
+    Если заданы завершенные области, все области (и текущая, если в ней есть точки)
+    записываются списком "regions" (см. core.regions.regions_from_data).
+    """
     save_data = {
         "points": points,
         "image_path": image_path,
         "timestamp": datetime.now().isoformat()
     }
+    if regions:
+        all_regions = list(regions) + ([points] if any(points.values()) else [])
+        save_data["regions"] = [{"name": f"region_{index + 1}", "points": region_points}
+                                for index, region_points in enumerate(all_regions)]
     
     with open(file_path, 'w', encoding='utf-8') as f:
         json.dump(save_data, f, indent=2)
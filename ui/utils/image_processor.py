@@ -1,14 +1,14 @@
 import flet as ft
-import shutil
+from ..state.app_state import AppState
 
 
-def handle_save_image(page: ft.Page, image_control: ft.Image):
+def handle_save_image(page: ft.Page, state: AppState):
     """
     Создает обработчик для сохранения изображения.
     
     Args:
         page: Объект страницы
-        image_control: Контрол изображения с изображением для сохранения
+        state: Состояние приложения с результатом выравнивания в памяти
         
     Returns:
         function: Обработчик для диалога сохранения
@@ -17,30 +17,47 @@ def handle_save_image(page: ft.Page, image_control: ft.Image):
         def on_save_result(e):
             if e.path:
                 try:
-                    # Получаем путь к исходному изображению
-                    src_path = image_control.src
-                    
-                    # Если путь начинается с 'data:', значит это встроенное изображение
-                    if src_path.startswith('data:'):
+                    if state.result_image is None:
                         # Показываем уведомление об ошибке
                         page.snack_bar = ft.SnackBar(
-                            content=ft.Text("Невозможно сохранить встроенное изображение"),
+                            content=ft.Text("Нет изображения для сохранения"),
                             bgcolor=ft.colors.RED
                         )
                         page.snack_bar.open = True
                         page.update()
                         return
                     
-                    # Копируем файл в указанное место
-                    shutil.copy2(src_path, e.path)
+                    # Полноразмерный результат кодируется в выбранный формат
+                    # в фоновом потоке, чтобы не блокировать интерфейс
+                    save_path = e.path
                     
-                    # Показываем уведомление об успешном сохранении
-                    page.snack_bar = ft.SnackBar(
-                        content=ft.Text(f"Изображение сохранено в {e.path}"),
-                        bgcolor=ft.colors.GREEN
-                    )
+                    def on_done(error):
+                        if error is None:
+                            # Показываем уведомление об успешном сохранении
+                            page.snack_bar = ft.SnackBar(
+                                content=ft.Text(f"Изображение сохранено в {save_path}"),
+                                bgcolor=ft.colors.GREEN
+                            )
+                        else:
+                            # Показываем уведомление об ошибке
+                            page.snack_bar = ft.SnackBar(
+                                content=ft.Text(f"Ошибка при сохранении изображения: {str(error)}"),
+                                bgcolor=ft.colors.RED
+                            )
+                        page.snack_bar.open = True
+                        page.update()
+                    
+                    # Показываем уведомление о начале сохранения
+                    page.snack_bar = ft.SnackBar(content=ft.Text("Сохранение изображения..."))
                     page.snack_bar.open = True
                     page.update()
+                    
+                    from core.image_io import write_image_async
+                    # Бинарный результат сохраняется в PNG с 1 битом на пиксель; признак определяется
+                    # по сохраняемому изображению, а не по режиму, в котором было построено предыдущее
+                    bilevel = state.result_image.ndim == 2 and state.output_mode == "binary"
+                    write_image_async(save_path, state.result_image, on_done,
+                                      **{**state.export_options, "png_bilevel": bilevel})
                 except Exception as ex:
                     # Показываем уведомление об ошибке
                     page.snack_bar = ft.SnackBar(
@@ -52,4 +69,35 @@ def handle_save_image(page: ft.Page, image_control: ft.Image):
         
         return on_save_result
     
-    return on_save_click 
\ No newline at end of file
+    return on_save_click
+
+
+def handle_save_warp_field(page: ft.Page, state: AppState):
+    """
+    Создает обработчик диалога сохранения поля деформации.
+    
+    Args:
+        page: Объект страницы
+        state: Состояние приложения с полем деформации результата
+        
+    Returns:
+        function: Обработчик для диалога сохранения
+    """
+    def on_save_result(e):
+        if not e.path:
+            return
+        try:
+            state.warp_field.save(e.path)
+            page.snack_bar = ft.SnackBar(
+                content=ft.Text(f"Деформация сохранена в {e.path}"),
+                bgcolor=ft.colors.GREEN
+            )
+        except Exception as ex:
+            page.snack_bar = ft.SnackBar(
+                content=ft.Text(f"Ошибка при сохранении деформации: {str(ex)}"),
+                bgcolor=ft.colors.RED
+            )
+        page.snack_bar.open = True
+        page.update()
+    
+    return on_save_result
@@ -1,16 +1,20 @@
 import flet as ft
 from .components.file_pickers import FilePickerManager
-from .handlers.picker_handlers import create_save_image_handler
-from .state.app_state import AppState
-import cv2
-from core.grid_utils import (
-    create_coordinate_grid, normalize_grid_coordinates, compute_remap_maps, 
-    apply_remap, visualize_grid, visualize_boundary_points,
-    preprocess_edges, build_fast_mesh_function, CvColors
-)
-import numpy as np
-import os
-import time
+from .handlers.picker_handlers import create_save_image_handler, create_save_warp_field_handler
+from .state.app_state import AppState, RESULT_STORE_ROOT
+from core.pipeline import build_alignment_graph, build_regions_graph
+from core.result_store import get_result_store
+from core.workers import get_shared_executor
+from core.warp_models import WARP_MODELS
+from core.image_io import DEFAULT_EXPORT_OPTIONS, TIFF_COMPRESSION
+
+# Подписи моделей деформации; модель без подписи показывается своим именем
+WARP_MODEL_LABELS = {
+    "coons": "Кунс",
+    "tps": "Тонкая пластина",
+    "rbf": "RBF",
+    "piecewise_affine": "Кусочно-аффинная",
+}
 
 def create_loading_overlay():
     """Creates a loading animation overlay for image stacks."""
@@ -34,8 +38,24 @@ def create_loading_overlay():
 
 def process_on_tab_change(page:ft.Page, image_stack_left:ft.Stack,
                           image_stack_right:ft.Stack, state:AppState):
-    image_stack_left.controls[0].src = state.current_image_path
-    image_stack_right.controls[0].src = state.current_image_path
+    # Изображения передаются в UI из памяти в разрешении отображения,
+    # полноразмерный результат записывается на диск только при сохранении
+    display_height = int(image_stack_left.height) if image_stack_left.height else None
+    
+    # Без изменений изображения, разметки и параметров результат берется из кэша состояния
+    regions = state.region_points()
+    layout = state.region_layout if len(regions) > 1 else None
+    key = state.derived_key(state.output_mode, state.output_scale, state.warp_model, layout, display_height)
+    cached = state.get_derived("alignment", key)
+    if cached is not None:
+        image_stack_left.controls[0].src = None
+        image_stack_left.controls[0].src_base64 = cached["overlay"]
+        image_stack_right.controls[0].src = None
+        image_stack_right.controls[0].src_base64 = cached["result_preview"]
+        state.result_image = cached["result"]
+        state.warp_field = cached["warp_field"]
+        page.update()
+        return
     
     loading_overlay_left = create_loading_overlay()
     loading_overlay_right = create_loading_overlay()
@@ -45,47 +65,75 @@ def process_on_tab_change(page:ft.Page, image_stack_left:ft.Stack,
     
     page.update()
     
-    image = cv2.imread(state.current_image_path)
-    script_dir = os.path.dirname(os.path.dirname(__file__))
-    output_image_path = os.path.join(script_dir, "storage", "output_image.png")
-    visualization_path = os.path.join(script_dir, "storage", "visualization.png")
+    def remove_loading_overlay(image_stack, overlay):
+        if overlay in image_stack.controls:
+            image_stack.controls.remove(overlay)
     
-    height, width = image.shape[:2]
-    grid = create_coordinate_grid(height, width)
-
-    normalized_grid = normalize_grid_coordinates(grid, width, height)
+    # Результаты этапов показываются по мере готовности; наложение сетки
+    # и выравнивание выполняются одновременно (см. core.pipeline)
+    def on_stage_done(name, value):
+        if name == "preview":
+            for image_stack in (image_stack_left, image_stack_right):
+                image_stack.controls[0].src = None
+                image_stack.controls[0].src_base64 = value
+        elif name == "overlay":
+            image_stack_left.controls[0].src_base64 = value
+            remove_loading_overlay(image_stack_left, loading_overlay_left)
+        elif name == "result_preview":
+            image_stack_right.controls[0].src_base64 = value
+            remove_loading_overlay(image_stack_right, loading_overlay_right)
+        else:
+            return
+        page.update()
     
-    prep_edge_top, prep_edge_bottom, prep_edge_left, prep_edge_right = preprocess_edges(**state.edge_points_lists)
-    mesh_func = build_fast_mesh_function(prep_edge_top, prep_edge_bottom, prep_edge_left, prep_edge_right)
-
-    visualization = visualize_grid(
-        image, 
-        mesh_func, 
-        n_points=10, 
-        color_horizontal=CvColors.RED, 
-        color_vertical=CvColors.BLUE
+    # Тяжелое выравнивание выполняется в общем для всех сессий ограниченном пуле,
+    # карты вычисляются сразу в размере результата
+    options = dict(
+        mode=state.output_mode,
+        scale=state.output_scale,
+        display_height=display_height,
+        memory_budget=state.memory_limit,
+        warp_executor=get_shared_executor(),
+        warp_timeout=60,
+        model=state.warp_model,
+        # Повторная обработка того же изображения с той же разметкой берет результат из хранилища
+        store=get_result_store(RESULT_STORE_ROOT)
     )
-
-    edge_points = [prep_edge_top, prep_edge_bottom, prep_edge_left, prep_edge_right]
-    colors = [CvColors.RED, CvColors.BLUE, CvColors.GREEN, CvColors.ORANGE]
-    visualization = visualize_boundary_points(visualization, edge_points, colors)
-    
-    cv2.imwrite(visualization_path, visualization)
-    image_stack_left.controls[0].src = visualization_path
-    page.update()
-    if len(image_stack_left.controls) > 1:
-        image_stack_left.controls.pop()
-    page.update()
-    
-    map_x, map_y = compute_remap_maps(mesh_func, normalized_grid)
-    result = apply_remap(image, map_x, map_y)
-
-    cv2.imwrite(output_image_path, result)
-    image_stack_right.controls[0].src = output_image_path
-    page.update()
-    if len(image_stack_right.controls) > 1:
-        image_stack_right.controls.pop()
-    page.update()
+    if len(regions) > 1:
+        # Несколько областей: изображение загружается один раз, области выравниваются
+        # параллельно и складываются в одно изображение
+        names = [f"region_{index + 1}" for index in range(len(regions))]
+        graph = build_regions_graph(names, layout=state.region_layout, **options)
+        inputs = {"image_path": state.current_image_path, "regions": dict(zip(names, regions))}
+    else:
+        graph = build_alignment_graph(**options)
+        inputs = {"image_path": state.current_image_path, "edge_points": regions[0]}
+    try:
+        results = graph.run(inputs, on_stage_done=on_stage_done)
+    except Exception as ex:
+        # StageGraph.run() пробрасывает ошибку любого этапа (cv2.error, OSError, ...)
+        state.result_image = None
+        state.warp_field = None
+        page.snack_bar = ft.SnackBar(
+            content=ft.Text(f"Ошибка при выравнивании: {str(ex)}"),
+            bgcolor=ft.colors.RED
+        )
+        page.snack_bar.open = True
+    else:
+        state.result_image = results["result"]
+        # Поле деформации занимает O(H + W) и позволяет повторить то же выравнивание без точек;
+        # для нескольких областей и моделей кроме Кунса оно не строится
+        state.warp_field = results.get("warp_field")
+        state.set_derived("alignment", key, {
+            "overlay": results.get("overlay"),
+            "result_preview": results.get("result_preview"),
+            "result": state.result_image,
+            "warp_field": state.warp_field,
+        })
+    finally:
+        remove_loading_overlay(image_stack_left, loading_overlay_left)
+        remove_loading_overlay(image_stack_right, loading_overlay_right)
+        page.update()
 
 def create_view_page_content(page: ft.Page, image_stack_left:ft.Stack,
                              image_stack_right:ft.Stack, state: AppState):
@@ -108,12 +156,8 @@ def create_view_page_content(page: ft.Page, image_stack_left:ft.Stack,
     picker_manager = FilePickerManager(page)
 
     # Создаем обработчик для сохранения изображения
-    image_control = None
-    if len(image_stack_right.controls) > 0:
-        image_control = image_stack_right.controls[0]
-    
     save_image_handler = create_save_image_handler(
-        picker_manager, page, image_control
+        picker_manager, page, state
     )
 
     # Создаем кнопку сохранения изображения
@@ -122,11 +166,142 @@ def create_view_page_content(page: ft.Page, image_stack_left:ft.Stack,
         on_click=save_image_handler
     )
 
+    # Создаем кнопку экспорта поля деформации
+    save_warp_field_button = ft.ElevatedButton(
+        "Сохранить деформацию",
+        on_click=create_save_warp_field_handler(picker_manager, page, state)
+    )
+
+    # Разрешение результата: при изменении выравнивание пересчитывается
+    def on_output_scale_change(e):
+        state.output_scale = float(e.control.value)
+        if state.result_image is not None:
+            process_on_tab_change(page, image_stack_left, image_stack_right, state)
+
+    # Режим результата: цветной или подготовленный для OCR
+    def on_output_mode_change(e):
+        state.output_mode = e.control.value
+        if state.result_image is not None:
+            process_on_tab_change(page, image_stack_left, image_stack_right, state)
+
+    # Модель деформации: при изменении выравнивание пересчитывается, если сетка новой модели корректна
+    def on_warp_model_change(e):
+        previous_model = state.warp_model
+        state.warp_model = e.control.value
+        if state.result_image is None:
+            return
+        issues = state.mesh_issues()
+        if issues:
+            # Показанный результат остается построенным предыдущей моделью
+            state.warp_model = previous_model
+            e.control.value = previous_model
+            page.snack_bar = ft.SnackBar(
+                content=ft.Text("Некорректная разметка для выбранной модели:\n" + "\n".join(issues)),
+                bgcolor=ft.colors.RED
+            )
+            page.snack_bar.open = True
+            page.update()
+            return
+        process_on_tab_change(page, image_stack_left, image_stack_right, state)
+
+    warp_model_dropdown = ft.Dropdown(
+        label="Модель",
+        value=state.warp_model,
+        options=[ft.dropdown.Option(model, WARP_MODEL_LABELS.get(model, model)) for model in WARP_MODELS],
+        width=180,
+        on_change=on_warp_model_change
+    )
+
+    # Раскладка областей: при изменении результат пересобирается
+    def on_region_layout_change(e):
+        state.region_layout = e.control.value
+        if state.result_image is not None and len(state.region_points()) > 1:
+            process_on_tab_change(page, image_stack_left, image_stack_right, state)
+
+    region_layout_dropdown = ft.Dropdown(
+        label="Области",
+        value=state.region_layout,
+        options=[
+            ft.dropdown.Option("horizontal", "Рядом"),
+            ft.dropdown.Option("vertical", "Друг под другом"),
+        ],
+        width=160,
+        on_change=on_region_layout_change
+    )
+
+    output_mode_dropdown = ft.Dropdown(
+        label="Режим",
+        value=state.output_mode,
+        options=[
+            ft.dropdown.Option("color", "Цветной"),
+            ft.dropdown.Option("gray", "Серый"),
+            ft.dropdown.Option("binary", "Ч/Б (OCR)"),
+        ],
+        width=140,
+        on_change=on_output_mode_change
+    )
+
+    output_scale_dropdown = ft.Dropdown(
+        label="Разрешение",
+        value="1.0",
+        options=[
+            ft.dropdown.Option("1.0", "100%"),
+            ft.dropdown.Option("0.5", "50%"),
+            ft.dropdown.Option("0.3333", "33%"),
+            ft.dropdown.Option("0.25", "25%"),
+        ],
+        width=120,
+        on_change=on_output_scale_change
+    )
+
+    # Параметры сохранения: формат выбирается по расширению файла в диалоге
+    def on_quality_change(e):
+        state.export_options["jpeg_quality"] = int(e.control.value)
+        state.export_options["webp_quality"] = int(e.control.value)
+    
+    def on_png_compression_change(e):
+        state.export_options["png_compression"] = int(e.control.value)
+    
+    def on_tiff_compression_change(e):
+        state.export_options["tiff_compression"] = e.control.value
+    
+    quality_slider = ft.Slider(
+        min=10, max=100, divisions=18,
+        value=DEFAULT_EXPORT_OPTIONS["jpeg_quality"],
+        label="JPEG/WebP: {value}",
+        width=180,
+        on_change=on_quality_change
+    )
+    png_compression_slider = ft.Slider(
+        min=0, max=9, divisions=9,
+        value=DEFAULT_EXPORT_OPTIONS["png_compression"],
+        label="PNG: {value}",
+        width=140,
+        on_change=on_png_compression_change
+    )
+    tiff_compression_dropdown = ft.Dropdown(
+        label="Сжатие TIFF",
+        value=DEFAULT_EXPORT_OPTIONS["tiff_compression"],
+        options=[ft.dropdown.Option(name) for name in TIFF_COMPRESSION],
+        width=140,
+        on_change=on_tiff_compression_change
+    )
+
     # Кнопки управления - размещаем в том же месте для консистентности
     controls_row = ft.Row([
         ft.Container(width=page.width * 0.45), # Пустой контейнер для выравнивания
         ft.Row([
+            output_mode_dropdown,
+            output_scale_dropdown,
+            warp_model_dropdown,
+            region_layout_dropdown,
+            ft.Text("Качество:"),
+            quality_slider,
+            ft.Text("Сжатие PNG:"),
+            png_compression_slider,
+            tiff_compression_dropdown,
             save_image_button,
+            save_warp_field_button,
         ], spacing=10)
     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
     